@@ -0,0 +1,148 @@
+"""
+Benchmark the CPU acceleration techniques of SAM and YOLO against the default eager path.
+
+Each configuration loads a fresh processor, warms it up and times the SAM image encoder,
+the mask decoder and YOLO on the same images. The masks are compared with those of the
+default configuration; a configuration whose lowest IoU is below ``--min-iou`` is marked
+as failing. The torch thread count is swept on the default configuration.
+
+Configurations: default, inference_mode, bf16, channels_last, compile and all of them
+together. Results are printed and saved as JSON.
+
+Usage:
+    python benchmarks/acceleration_bench.py [--sam-checkpoints vit_b=sam_vit_b_01ec64.pth] [--tier vit_b]
+        [--sizes 1024x768 1920x1080] [--repeat 5] [--threads 1 2 4 8] [--min-iou 0.95]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline_bench import RESULTS_DIR, synthetic_image  # noqa: E402
+
+CONFIGURATIONS = {
+    "default": (),
+    "inference_mode": ("inference_mode",),
+    "bf16": ("bf16",),
+    "channels_last": ("channels_last",),
+    "compile": ("compile",),
+    "all": ("inference_mode", "bf16", "channels_last", "compile"),
+}
+
+
+def median_ms(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(times)), result
+
+
+def run_configuration(args, techniques, images, threads=0):
+    """
+    Load a processor with the given techniques and time its models on the images.
+
+    :returns: Tuple of (timings, masks per image).
+    """
+    import torch
+    from sticker import StickerProcessor
+    from sticker_acceleration import InferenceAccelerator
+
+    if threads:
+        torch.set_num_threads(threads)
+    sam_checkpoints = dict(entry.split("=", 1) for entry in args.sam_checkpoints.split(",") if entry)
+    processor = StickerProcessor(
+        args.yolo, None, args.tier, "unused", sam_checkpoints=sam_checkpoints,
+        accelerator=InferenceAccelerator(techniques, args.min_iou)
+    )
+    model_type = processor.sam_model_type
+    warmup = processor.warmup()
+
+    encode, decode, detect, masks = [], [], [], []
+    for image, bbox in images:
+        encode_ms, embedding = median_ms(lambda: processor._encode_batch([image], model_type)[0], args.repeat)
+        decode_ms, mask = median_ms(lambda: processor._decode_mask(embedding, bbox, model_type), args.repeat)
+        detect_ms, _ = median_ms(lambda: processor._detect_batch([image]), args.repeat)
+        encode.append(encode_ms)
+        decode.append(decode_ms)
+        detect.append(detect_ms)
+        masks.append(mask)
+
+    timings = {
+        "sam_encode_ms": round(float(np.mean(encode)), 2),
+        "sam_decode_ms": round(float(np.mean(decode)), 2),
+        "yolo_ms": round(float(np.mean(detect)), 2),
+        "sam_warmup_ms": warmup.get(f"sam_{model_type}_warmup_ms"),
+        "torch_threads": torch.get_num_threads(),
+    }
+    processor.fetcher.close()
+    del processor
+    gc.collect()
+    return timings, masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sam-checkpoints", default="vit_h=sam_vit_h_4b8939.pth",
+                        help="comma-separated model_type=checkpoint pairs, as in SAM_CHECKPOINTS")
+    parser.add_argument("--tier", default="vit_h", help="tier or SAM model type to benchmark")
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "768x1024"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", nargs="*", type=int, default=[], help="torch thread counts to sweep")
+    parser.add_argument("--min-iou", type=float, default=0.95)
+    parser.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument("--output", help="results file (default benchmarks/results/acceleration-<timestamp>.json)")
+    args = parser.parse_args()
+
+    from sticker import StickerProcessor
+    from sticker_acceleration import InferenceAccelerator
+
+    images = []
+    for n, size in enumerate(args.sizes):
+        width, height = (int(v) for v in size.split("x"))
+        data, relative_bbox = synthetic_image(width, height, seed=n)
+        image = StickerProcessor.decode_image(data)
+        bbox = [v * side for v, side in zip(relative_bbox, (width, height, width, height))]
+        images.append((image, bbox))
+
+    runs = [(name, CONFIGURATIONS[name], 0) for name in dict.fromkeys(["default", *args.configurations])]
+    runs += [(f"default@{threads}_threads", (), threads) for threads in args.threads]
+
+    results = {}
+    reference_masks = None
+    baseline = None
+    print(f"{'configuration':>24} {'sam_encode_ms':>14} {'speedup':>8} {'yolo_ms':>9} {'speedup':>8} {'min_iou':>8} passed")
+    for name, techniques, threads in runs:
+        timings, masks = run_configuration(args, techniques, images, threads)
+        if reference_masks is None:
+            reference_masks, baseline = masks, timings
+        ious = [InferenceAccelerator.mask_iou(mask, ref) for mask, ref in zip(masks, reference_masks)]
+        result = {
+            "techniques": list(techniques),
+            **timings,
+            "sam_encode_speedup": round(baseline["sam_encode_ms"] / timings["sam_encode_ms"], 3),
+            "yolo_speedup": round(baseline["yolo_ms"] / timings["yolo_ms"], 3),
+            "min_iou": round(min(ious), 4),
+            "mean_iou": round(float(np.mean(ious)), 4),
+            "passed": min(ious) >= args.min_iou,
+        }
+        results[name] = result
+        print(f"{name:>24} {result['sam_encode_ms']:>14.2f} {result['sam_encode_speedup']:>7.2f}x "
+              f"{result['yolo_ms']:>9.2f} {result['yolo_speedup']:>7.2f}x {result['min_iou']:>8.4f} {result['passed']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"acceleration-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"args": vars(args), "min_iou": args.min_iou, "configurations": results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Check the onnx inference backend against the torch backend and compare their latency.
+
+Both backends run YOLO, the SAM image encoder and the mask decoder on the same images.
+The top YOLO box of each image is compared by IoU and class, and the SAM masks of the
+reference boxes by mask IoU. A backbone whose lowest mask IoU is below ``--min-iou``
+fails the check and the script exits with status 1. The per-operation latency of each
+backend is printed and saved as JSON.
+
+Build the ONNX artifacts first with ``python sticker_export.py``.
+
+Usage:
+    python benchmarks/onnx_parity.py [--sam-checkpoints vit_b=sam_vit_b_01ec64.pth] [--onnx-dir onnx]
+        [--sizes 1024x768 768x1024] [--images DIR] [--repeat 5] [--threads 4] [--min-iou 0.95]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline_bench import RESULTS_DIR, synthetic_image  # noqa: E402
+
+
+def box_iou(a, b):
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 1.0
+
+
+def median_ms(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(times)), result
+
+
+def run_backend(backend, images, repeat):
+    """
+    Time a backend on the images.
+
+    :returns: Tuple of (timings, detections, masks); detections and masks are keyed by SAM model type where relevant.
+    """
+    timings = {"detect_ms": []}
+    detections = []
+    masks = {model_type: [] for model_type in backend.sam_model_types}
+    for image, bbox in images:
+        backend.detect([image])
+        detect_ms, result = median_ms(lambda: backend.detect([image])[0], repeat)
+        timings["detect_ms"].append(detect_ms)
+        detections.append(result)
+        for model_type in backend.sam_model_types:
+            backend.decode(backend.encode([image], model_type)[0], [bbox], model_type)
+            encode_ms, embedding = median_ms(lambda: backend.encode([image], model_type)[0], repeat)
+            decode_ms, mask = median_ms(lambda: backend.decode(embedding, [bbox], model_type)[0], repeat)
+            timings.setdefault(f"sam_{model_type}_encode_ms", []).append(encode_ms)
+            timings.setdefault(f"sam_{model_type}_decode_ms", []).append(decode_ms)
+            masks[model_type].append(mask)
+    return {stage: round(float(np.mean(values)), 2) for stage, values in timings.items()}, detections, masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sam-checkpoints", default="vit_h=sam_vit_h_4b8939.pth",
+                        help="comma-separated model_type=checkpoint pairs, as in SAM_CHECKPOINTS")
+    parser.add_argument("--onnx-dir", default="onnx")
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "768x1024"])
+    parser.add_argument("--images", help="directory of images to check in addition to the synthetic ones")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="torch and ONNX Runtime intra-op threads")
+    parser.add_argument("--min-iou", type=float, default=0.95)
+    parser.add_argument("--output", help="results file (default benchmarks/results/onnx-parity-<timestamp>.json)")
+    args = parser.parse_args()
+
+    import torch
+    from sticker import StickerProcessor
+    from sticker_acceleration import InferenceAccelerator
+    from sticker_backends import OnnxBackend, TorchBackend
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    sam_checkpoints = dict(entry.split("=", 1) for entry in args.sam_checkpoints.split(",") if entry)
+
+    images = []
+    for n, size in enumerate(args.sizes):
+        width, height = (int(v) for v in size.split("x"))
+        data, relative_bbox = synthetic_image(width, height, seed=n)
+        images.append((StickerProcessor.decode_image(data), [v * side for v, side in zip(relative_bbox, (width, height) * 2)]))
+
+    torch_backend = TorchBackend(args.yolo, sam_checkpoints)
+    if args.images:
+        for name in sorted(os.listdir(args.images)):
+            with open(os.path.join(args.images, name), "rb") as f:
+                image = StickerProcessor.decode_image(f.read())
+            if image is None:
+                continue
+            # Real images are prompted with the box the torch YOLO finds, or the whole frame
+            detections = torch_backend.detect([image])[0]
+            height, width = image.shape[:2]
+            images.append((image, detections.xyxy[0] if detections.xyxy else [0, 0, width, height]))
+    onnx_backend = OnnxBackend(args.onnx_dir, list(sam_checkpoints), intra_op_threads=args.threads)
+
+    torch_timings, torch_detections, torch_masks = run_backend(torch_backend, images, args.repeat)
+    onnx_timings, onnx_detections, onnx_masks = run_backend(onnx_backend, images, args.repeat)
+
+    detection_parity = []
+    for reference, detections in zip(torch_detections, onnx_detections):
+        if not reference.xyxy or not detections.xyxy:
+            detection_parity.append({"both_empty": not reference.xyxy and not detections.xyxy})
+            continue
+        detection_parity.append({
+            "box_iou": round(box_iou(reference.xyxy[0], detections.xyxy[0]), 4),
+            "same_class": reference.class_id[0] == detections.class_id[0],
+            "confidence_diff": round(abs(reference.confidence[0] - detections.confidence[0]), 4),
+        })
+
+    mask_parity = {}
+    for model_type in sam_checkpoints:
+        ious = [
+            InferenceAccelerator.mask_iou(mask, reference)
+            for mask, reference in zip(onnx_masks[model_type], torch_masks[model_type])
+        ]
+        mask_parity[model_type] = {
+            "min_iou": round(min(ious), 4),
+            "mean_iou": round(float(np.mean(ious)), 4),
+            "passed": min(ious) >= args.min_iou,
+        }
+
+    print(f"{'operation':>24} {'torch_ms':>10} {'onnx_ms':>10} {'speedup':>8}")
+    for stage, torch_ms in torch_timings.items():
+        onnx_ms = onnx_timings[stage]
+        print(f"{stage:>24} {torch_ms:>10.2f} {onnx_ms:>10.2f} {torch_ms / onnx_ms:>7.2f}x")
+    for model_type, parity in mask_parity.items():
+        print(f"{model_type}: mask IoU min {parity['min_iou']:.4f} mean {parity['mean_iou']:.4f} passed {parity['passed']}")
+    print(f"YOLO: {detection_parity}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"onnx-parity-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "args": vars(args),
+            "latency": {"torch": torch_timings, "onnx": onnx_timings},
+            "masks": mask_parity,
+            "detections": detection_parity,
+        }, f, indent=2)
+    print(f"Results saved to {output}")
+    sys.exit(0 if all(parity["passed"] for parity in mask_parity.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,433 @@
+"""
+Benchmark the sticker pipeline stage by stage, offline.
+
+Synthetic images of several resolutions are served by a local HTTP server and the
+outputs are uploaded to a local S3 stand-in (``moto``'s server unless ``--s3-endpoint``
+points at another S3-compatible endpoint such as MinIO), so no network access or AWS
+account is needed. Every request runs the stages of the pipeline one by one:
+
+    download, decode, yolo, sam_encode, sam_decode, upscale, morphology, encode, upload
+
+The embedding and result caches are disabled so every request does the full work. The
+suite reports the latency distribution of each stage per resolution, the throughput and
+end-to-end latency at each concurrency level, and the peak resident memory, and saves the
+results as JSON. ``--compare`` prints the change of every median against an earlier run.
+
+YOLO may not detect anything in a synthetic image; the box of the drawn object is then
+used for SAM and the miss is counted. ``--images`` benchmarks real photos instead.
+
+Usage:
+    python benchmarks/pipeline_bench.py [--sizes 640x480 1920x1080 4000x3000] [--requests 20]
+        [--concurrency 1 2 4] [--tier fast] [--images DIR] [--output FILE] [--compare FILE]
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import cv2
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STAGES = (
+    "download", "decode", "yolo", "sam_encode", "sam_decode", "upscale", "morphology", "encode", "upload"
+)
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def synthetic_image(width, height, seed=0):
+    """
+    Build a JPEG of a smooth background with a textured object, and the object's box relative to the image size.
+    """
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 200, width, dtype=np.float32)[None, :, None]
+    image = np.broadcast_to(gradient, (height, width, 3)).astype(np.uint8)
+    image = cv2.add(image, rng.integers(0, 20, (height, width, 3), dtype=np.uint8))
+    center = (int(width * 0.5), int(height * 0.55))
+    axes = (int(width * 0.2), int(height * 0.3))
+    object_mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.ellipse(object_mask, center, axes, 0, 0, 360, 1, thickness=-1)
+    texture = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    image[object_mask == 1] = (texture[object_mask == 1] // 4 + [40, 60, 160]).astype(np.uint8)
+    bbox = [0.3, 0.25, 0.7, 0.85]
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError(f"Could not encode a {width}x{height} synthetic image")
+    return encoded.tobytes(), bbox
+
+
+def load_images(directory):
+    """
+    Read the JPEG and PNG files of a directory, grouped by their resolution.
+    """
+    images = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if decoded is None:
+            continue
+        height, width = decoded.shape[:2]
+        # Without a known object, fall back to the central half of the image
+        images.setdefault(f"{width}x{height}", []).append((data, [0.25, 0.25, 0.75, 0.75]))
+    return images
+
+
+def start_image_server(images):
+    """
+    Serve in-memory images over HTTP on a free local port.
+
+    :param images: Mapping of path to JPEG or PNG bytes.
+    :returns: Tuple of (server, base URL).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            data = images.get(self.path)
+            if data is None:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png" if data[:4] == b"\x89PNG" else "image/jpeg")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="bench-image-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_s3(endpoint, bucket):
+    """
+    Point the shared S3 client at a local endpoint, starting moto's server if none is given, and create the bucket.
+
+    Must run before the first S3 call, since the client is created once per process.
+
+    :returns: The moto server to stop at the end, or None.
+    """
+    server = None
+    if not endpoint:
+        try:
+            from moto.server import ThreadedMotoServer
+        except ImportError:
+            sys.exit("No --s3-endpoint given and moto is not installed (pip install 'moto[server]')")
+        port = free_port()
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+        server.start()
+        endpoint = f"http://127.0.0.1:{port}"
+
+    os.environ["AWS_S3_ENDPOINT_URL"] = endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    os.environ.setdefault("AWS_REGION", "us-east-1")
+
+    from sticker_file_operation import StickerManager
+    client = StickerManager.get_s3_client()
+    existing = {entry["Name"] for entry in client.list_buckets().get("Buckets", [])}
+    if bucket not in existing:
+        client.create_bucket(Bucket=bucket)
+    return server
+
+
+class MemorySampler:
+    """
+    Sample the resident set size of this process on a background thread and keep the peak.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="bench-memory-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def peak_mb(self):
+        return round(self.peak / (1024 * 1024), 1)
+
+
+def run_request(processor, image_url, fallback_bbox, sam_model_type):
+    """
+    Run one request through every stage of the sticker pipeline, timing each stage.
+
+    :returns: Tuple of (stage durations in milliseconds, whether YOLO missed the object).
+    """
+    from sticker import stage_timer
+    from sticker_file_operation import StickerManager
+
+    timings = {}
+    with stage_timer(timings, "download"):
+        data = processor.fetcher.fetch(image_url)
+    if isinstance(data, dict):
+        raise RuntimeError(data)
+    with stage_timer(timings, "decode"):
+        image = processor.load_image(data)
+    if isinstance(image, dict):
+        raise RuntimeError(image)
+
+    with stage_timer(timings, "yolo"):
+        bbox = processor.predict(image.working)
+    missed = isinstance(bbox, dict)
+    if missed:
+        height, width = image.working.shape[:2]
+        bbox = [v * side for v, side in zip(fallback_bbox, (width, height, width, height))]
+
+    with stage_timer(timings, "sam_encode"):
+        embedding = processor._get_embedding(image.working, sam_model_type)
+    with stage_timer(timings, "sam_decode"):
+        mask = processor._decode_mask(embedding, bbox, sam_model_type)
+    with stage_timer(timings, "upscale"):
+        mask = processor.upscale_mask(mask, image.output.shape[:2])
+    with stage_timer(timings, "morphology"):
+        rgba_image = processor._sticker_rgba(image.output, mask, **processor.STICKER_PARAMS)
+    with stage_timer(timings, "encode"):
+        encoded = processor.encoder.encode(rgba_image)
+    with stage_timer(timings, "upload"):
+        error = StickerManager.upload_bytes_to_s3(
+            encoded, processor.s3_bucket_name, f"bench/{uuid.uuid4().hex}.{processor.encoder.extension}",
+            processor.encoder.content_type
+        )
+    if error:
+        raise RuntimeError(error)
+    return timings, missed
+
+
+def distribution(values):
+    """
+    Summarize latencies in milliseconds.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return {"count": 0}
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def bench_stages(processor, urls, sam_model_type):
+    """
+    Run the requests one at a time and collect the latency distribution of each stage.
+    """
+    samples = {stage: [] for stage in STAGES}
+    misses = 0
+    with MemorySampler() as memory:
+        for image_url, bbox in urls:
+            timings, missed = run_request(processor, image_url, bbox, sam_model_type)
+            misses += missed
+            for stage in STAGES:
+                samples[stage].append(timings[f"{stage}_ms"])
+    return {
+        "stages": {stage: distribution(values) for stage, values in samples.items()},
+        "yolo_misses": misses,
+        "peak_rss_mb": memory.peak_mb,
+    }
+
+
+def bench_throughput(processor, urls, sam_model_type, concurrency):
+    """
+    Run the requests from ``concurrency`` threads and measure throughput and end-to-end latency.
+    """
+    def timed(entry):
+        start = time.perf_counter()
+        run_request(processor, entry[0], entry[1], sam_model_type)
+        return (time.perf_counter() - start) * 1000.0
+
+    with MemorySampler() as memory:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, urls))
+        wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(urls),
+        "wall_s": round(wall, 3),
+        "requests_per_s": round(len(urls) / wall, 3),
+        "latency_ms": distribution(latencies),
+        "peak_rss_mb": memory.peak_mb,
+    }
+
+
+def environment(processor, args):
+    import torch
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "label": args.label,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "cuda": torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+        "sam_model_type": processor.sam_model_type,
+        "max_working_side": processor.max_working_side,
+        "max_output_side": processor.max_output_side,
+        "encoder": processor.encoder.params(),
+    }
+
+
+def compare(results, baseline_path):
+    """
+    Print the relative change of every median against an earlier run.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange of the median against {baseline_path} ({baseline['environment'].get('commit')}):")
+    for size, current in results["sizes"].items():
+        previous = baseline["sizes"].get(size)
+        if previous is None:
+            continue
+        for stage, stats in current["stages"].items():
+            before = previous["stages"].get(stage, {}).get("p50")
+            if before:
+                print(f"{size:>10} {stage:>12} {before:>9.2f} -> {stats['p50']:>9.2f} ms "
+                      f"({(stats['p50'] - before) / before * 100:+.1f}%)")
+        previous_runs = {run["concurrency"]: run for run in previous["throughput"]}
+        for run in current["throughput"]:
+            before = previous_runs.get(run["concurrency"], {}).get("requests_per_s")
+            if before:
+                print(f"{size:>10} {'c=' + str(run['concurrency']):>12} {before:>9.3f} -> "
+                      f"{run['requests_per_s']:>9.3f} req/s ({(run['requests_per_s'] - before) / before * 100:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4000x3000"])
+    parser.add_argument("--images", help="directory of real photos to use instead of synthetic images")
+    parser.add_argument("--requests", type=int, default=20, help="requests per size and concurrency level")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sam-checkpoints", default="vit_h=sam_vit_h_4b8939.pth",
+                        help="comma-separated model_type=checkpoint pairs, as in SAM_CHECKPOINTS")
+    parser.add_argument("--tier", default="vit_h", help="tier or SAM model type to benchmark")
+    parser.add_argument("--max-working-side", type=int, default=1024)
+    parser.add_argument("--max-output-side", type=int, default=0)
+    parser.add_argument("--s3-endpoint", help="S3-compatible endpoint; moto's server is started if omitted")
+    parser.add_argument("--bucket", default="sticker-bench")
+    parser.add_argument("--label", default="", help="free-form description stored with the results")
+    parser.add_argument("--output", help="results file (default benchmarks/results/pipeline-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare the medians against")
+    args = parser.parse_args()
+
+    moto_server = start_s3(args.s3_endpoint, args.bucket)
+
+    if args.images:
+        cases = load_images(args.images)
+    else:
+        cases = {}
+        for size in args.sizes:
+            width, height = (int(v) for v in size.split("x"))
+            cases[size] = [synthetic_image(width, height, seed) for seed in range(4)]
+
+    served = {}
+    for size, images in cases.items():
+        for n, (data, _) in enumerate(images):
+            served[f"/{size}/{n}"] = data
+    image_server, base_url = start_image_server(served)
+
+    from sticker import StickerProcessor
+    from sticker_cache import EmbeddingCache, ResultCache
+
+    sam_checkpoints = dict(entry.split("=", 1) for entry in args.sam_checkpoints.split(",") if entry)
+    with MemorySampler() as load_memory:
+        processor = StickerProcessor(
+            args.yolo, None, args.tier, args.bucket,
+            sam_checkpoints=sam_checkpoints,
+            embedding_cache=EmbeddingCache(max_bytes=0),
+            result_cache=ResultCache(max_entries=0),
+            max_working_side=args.max_working_side,
+            max_output_side=args.max_output_side,
+        )
+        processor.warmup()
+    sam_model_type = processor.sam_model_type
+
+    results = {
+        "environment": environment(processor, args),
+        "startup": {**processor.load_timings, "peak_rss_mb": load_memory.peak_mb},
+        "sizes": {},
+    }
+    try:
+        for size, images in cases.items():
+            urls = [
+                (f"{base_url}/{size}/{n % len(images)}", images[n % len(images)][1])
+                for n in range(args.requests)
+            ]
+            print(f"{size}: {len(urls)} requests per run")
+            size_results = bench_stages(processor, urls, sam_model_type)
+            for stage, stats in size_results["stages"].items():
+                print(f"{size:>10} {stage:>12} p50 {stats['p50']:>9.2f} ms  p90 {stats['p90']:>9.2f} ms  "
+                      f"max {stats['max']:>9.2f} ms")
+            size_results["throughput"] = []
+            for concurrency in args.concurrency:
+                run = bench_throughput(processor, urls, sam_model_type, concurrency)
+                size_results["throughput"].append(run)
+                print(f"{size:>10} {'c=' + str(concurrency):>12} {run['requests_per_s']:>9.3f} req/s  "
+                      f"p50 {run['latency_ms']['p50']:>9.2f} ms  peak RSS {run['peak_rss_mb']} MB")
+            results["sizes"][size] = size_results
+    finally:
+        image_server.shutdown()
+        processor.fetcher.close()
+        if moto_server is not None:
+            moto_server.stop()
+
+    results["stats"] = processor.stats()
+    output = args.output or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark the sticker and background-removal post-processing.
+
+Compares the full-frame implementation the pipeline used before post-processing was
+restricted to the mask's region of interest against the current one, checks that both
+produce identical pixels and reports the time per call.
+
+Usage:
+    python benchmarks/postprocess_bench.py [--sizes 1024x768 4000x3000] [--repeat 10]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sticker import StickerProcessor  # noqa: E402
+
+
+def full_frame_sticker_rgba(image, mask, border_thickness=10):
+    binary_mask = (mask > 0.5).astype(np.uint8)
+    rgba_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    rgba_image[:, :, 3] = (mask * 255).astype(np.uint8)
+    kernel = np.ones((border_thickness, border_thickness), np.uint8)
+    dilated_mask = cv2.dilate(binary_mask, kernel, iterations=1)
+    border_mask = dilated_mask - binary_mask
+    rgba_image[border_mask == 1] = [255, 255, 255, 255]
+    return rgba_image
+
+
+def full_frame_background_removed_rgba(image, mask, edge_smooth_radius=2, dilation_kernel_size=10):
+    binary_mask = (mask > 0.5).astype(np.uint8)
+    edges = cv2.Canny(binary_mask * 255, 100, 200)
+    kernel = np.ones((dilation_kernel_size, dilation_kernel_size), np.uint8)
+    dilated_edges = cv2.dilate(edges, kernel, iterations=1)
+    blurred_edges = cv2.GaussianBlur(dilated_edges, (0, 0), edge_smooth_radius)
+    normalized_edges = np.clip(blurred_edges, 0, 255).astype(np.uint8)
+    rgba_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+    rgba_image[:, :, 3] = binary_mask * 255
+    rgba_image[:, :, 3] = np.maximum(rgba_image[:, :, 3], normalized_edges)
+    return rgba_image
+
+
+def synthetic_case(width, height, seed=0):
+    """
+    Build a noisy photo-like image and an irregular object mask covering part of it.
+    """
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    center = (int(width * 0.55), int(height * 0.45))
+    axes = (int(width * 0.18), int(height * 0.22))
+    cv2.ellipse(mask, center, axes, 30, 0, 360, 1, thickness=-1)
+    cv2.circle(mask, (center[0] + axes[0], center[1]), max(axes) // 3, 1, thickness=-1)
+    return image, mask.astype(bool)
+
+
+def edge_case(width, height):
+    """
+    An object touching the image border, where the region of interest is clipped.
+    """
+    image = np.full((height, width, 3), 128, dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=bool)
+    mask[: height // 3, : width // 4] = True
+    return image, mask
+
+
+def time_call(func, repeat):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "4000x3000", "8000x6000"])
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    sticker_params = StickerProcessor.STICKER_PARAMS
+    bg_params = StickerProcessor.BACKGROUND_REMOVAL_PARAMS
+    stages = (
+        ("sticker", full_frame_sticker_rgba, StickerProcessor._sticker_rgba, sticker_params),
+        ("bg_removed", full_frame_background_removed_rgba, StickerProcessor._background_removed_rgba, bg_params),
+    )
+
+    print(f"{'size':>10} {'case':>8} {'stage':>10} {'full_ms':>9} {'roi_ms':>9} {'speedup':>8} identical")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.split("x"))
+        for case_name, (image, mask) in (("object", synthetic_case(width, height)), ("border", edge_case(width, height))):
+            for stage, reference, current, params in stages:
+                identical = np.array_equal(reference(image, mask, **params), current(image, mask, **params))
+                full_ms = time_call(lambda: reference(image, mask, **params), args.repeat)
+                roi_ms = time_call(lambda: current(image, mask, **params), args.repeat)
+                print(f"{size:>10} {case_name:>8} {stage:>10} {full_ms:>9.2f} {roi_ms:>9.2f} "
+                      f"{full_ms / roi_ms:>7.2f}x {identical}")
+                if not identical:
+                    sys.exit(f"{stage} output differs from the full-frame reference for {size} ({case_name})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Measure the mask quality, latency and memory of the int8 SAM image encoder against float32.
+
+Each configuration loads its backend in a fresh process, so the memory figures do not
+mix. It reports:
+ - the private memory (USS) and resident memory (RSS) added by loading the models
+ - the median SAM encoder and mask decoder latency per image
+
+The masks of every fixture image are compared by IoU with the float32 masks of the same
+backend. A quantized configuration whose lowest IoU is below ``--min-iou`` is marked as
+failing. The fixture set is a few synthetic images plus the files of ``--images``,
+prompted with the central half of the frame.
+
+The int8 torch model is built next to the checkpoint on first use; run
+``python sticker_export.py --quantize int8`` first for the onnx configurations.
+
+Usage:
+    python benchmarks/quantization_bench.py [--sam-checkpoints vit_b=sam_vit_b_01ec64.pth] [--images DIR]
+        [--onnx-dir onnx] [--sizes 1024x768 768x1024] [--repeat 3] [--threads 4] [--min-iou 0.9]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline_bench import RESULTS_DIR, load_images, synthetic_image  # noqa: E402
+
+
+def fixture_set(args):
+    """
+    Return the fixture images as (name, encoded bytes, relative bounding box) triples.
+    """
+    fixtures = []
+    for n, size in enumerate(args.sizes):
+        width, height = (int(v) for v in size.split("x"))
+        data, bbox = synthetic_image(width, height, seed=n)
+        fixtures.append((f"synthetic-{size}", data, bbox))
+    if args.images:
+        for size, cases in load_images(args.images).items():
+            fixtures += [(f"{size}-{i}", data, bbox) for i, (data, bbox) in enumerate(cases)]
+    return fixtures
+
+
+def memory_mb(process):
+    info = process.memory_full_info()
+    return info.uss / 2 ** 20, info.rss / 2 ** 20
+
+
+def run_configuration(args, backend_name, quantization, fixtures):
+    """
+    Load one backend, then time its SAM encoder and mask decoder on every fixture image.
+
+    Runs in a worker process; returns the timings, the memory added by loading and the masks.
+    """
+    import psutil
+    import torch
+    from sticker import StickerProcessor
+    from sticker_backends import InferenceBackend
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    process = psutil.Process()
+    uss_before, rss_before = memory_mb(process)
+
+    sam_checkpoints = dict(entry.split("=", 1) for entry in args.sam_checkpoints.split(",") if entry)
+    model_type = next(iter(sam_checkpoints))
+    if backend_name == "torch":
+        backend = InferenceBackend.create(
+            "torch", yolo_model_path=args.yolo, sam_checkpoints={model_type: sam_checkpoints[model_type]},
+            quantization=quantization
+        )
+    else:
+        backend = InferenceBackend.create(
+            "onnx", model_dir=args.onnx_dir, sam_model_types=[model_type], intra_op_threads=args.threads,
+            quantization=quantization
+        )
+    load_ms = sum(value for phase, value in backend.load_timings.items() if phase.startswith("sam_"))
+
+    encode, decode, masks = [], [], []
+    for _, data, relative_bbox in fixtures:
+        image = StickerProcessor.decode_image(data)
+        height, width = image.shape[:2]
+        bbox = [v * side for v, side in zip(relative_bbox, (width, height, width, height))]
+        # The first pass absorbs lazy initialization
+        backend.decode(backend.encode([image], model_type)[0], [bbox], model_type)
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            embedding = backend.encode([image], model_type)[0]
+            times.append((time.perf_counter() - start) * 1000.0)
+        encode.append(float(np.median(times)))
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            mask = backend.decode(embedding, [bbox], model_type)[0]
+            times.append((time.perf_counter() - start) * 1000.0)
+        decode.append(float(np.median(times)))
+        masks.append(np.asarray(mask, dtype=bool))
+
+    uss_after, rss_after = memory_mb(process)
+    return {
+        "sam_model_type": model_type,
+        "sam_load_ms": round(load_ms, 2),
+        "sam_encode_ms": round(float(np.mean(encode)), 2),
+        "sam_decode_ms": round(float(np.mean(decode)), 2),
+        "uss_added_mb": round(uss_after - uss_before, 1),
+        "rss_added_mb": round(rss_after - rss_before, 1),
+    }, masks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sam-checkpoints", default="vit_h=sam_vit_h_4b8939.pth",
+                        help="model_type=checkpoint of the backbone to measure, as in SAM_CHECKPOINTS")
+    parser.add_argument("--onnx-dir", help="directory of the ONNX artifacts, to also measure the onnx backend")
+    parser.add_argument("--images", help="directory of fixture images in addition to the synthetic ones")
+    parser.add_argument("--sizes", nargs="+", default=["1024x768", "768x1024"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="torch and ONNX Runtime intra-op threads")
+    parser.add_argument("--min-iou", type=float, default=0.9)
+    parser.add_argument("--output", help="results file (default benchmarks/results/quantization-<timestamp>.json)")
+    args = parser.parse_args()
+
+    from sticker_acceleration import InferenceAccelerator
+
+    fixtures = fixture_set(args)
+    backends = ["torch"] + (["onnx"] if args.onnx_dir else [])
+    context = multiprocessing.get_context("spawn")
+
+    results = {}
+    print(f"{'configuration':>12} {'encode_ms':>10} {'speedup':>8} {'decode_ms':>10} {'uss_mb':>9} {'rss_mb':>9} "
+          f"{'min_iou':>8} passed")
+    for backend_name in backends:
+        reference = None
+        for quantization in (None, "int8"):
+            with context.Pool(1) as pool:
+                result, masks = pool.apply(run_configuration, (args, backend_name, quantization, fixtures))
+            if reference is None:
+                reference = result, masks
+            ious = [InferenceAccelerator.mask_iou(mask, ref) for mask, ref in zip(masks, reference[1])]
+            result.update({
+                "sam_encode_speedup": round(reference[0]["sam_encode_ms"] / result["sam_encode_ms"], 3),
+                "uss_saved_mb": round(reference[0]["uss_added_mb"] - result["uss_added_mb"], 1),
+                "iou": {name: round(iou, 4) for (name, _, _), iou in zip(fixtures, ious)},
+                "min_iou": round(min(ious), 4),
+                "mean_iou": round(float(np.mean(ious)), 4),
+                "passed": min(ious) >= args.min_iou,
+            })
+            name = f"{backend_name}-{quantization or 'fp32'}"
+            results[name] = result
+            print(f"{name:>12} {result['sam_encode_ms']:>10.2f} {result['sam_encode_speedup']:>7.2f}x "
+                  f"{result['sam_decode_ms']:>10.2f} {result['uss_added_mb']:>9.1f} {result['rss_added_mb']:>9.1f} "
+                  f"{result['min_iou']:>8.4f} {result['passed']}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"quantization-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"args": vars(args), "fixtures": [name for name, _, _ in fixtures], "configurations": results},
+                  f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
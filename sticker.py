@@ -283,309 +283,1767 @@
 
 
 
-import os
+import io
+import time
+import functools
+import uuid
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 import numpy as np
 import cv2
-from ultralytics import YOLO
-from segment_anything import sam_model_registry, SamPredictor
 from PIL import Image
 from sticker_file_operation import StickerManager
+from sticker_batching import MicroBatcher
+from sticker_cache import EmbeddingCache, ResultCache
+from sticker_fetcher import ImageFetcher
+from sticker_encoding import StickerEncoder
+from sticker_backends import SamEmbedding, TorchBackend
+
+# A decoded image at the working resolution fed to YOLO and SAM and at the output
+# resolution the stickers are composed at; both may be the same array
+IngestedImage = namedtuple("IngestedImage", ["working", "output"])
+
+# JPEG decoding at 1/2, 1/4 and 1/8 scale, largest reduction first
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+@contextmanager
+def stage_timer(timings, stage):
+    """
+    Record the wall time of a pipeline stage in milliseconds.
+
+    :param timings: Dictionary collecting the stage timings of one request, or None to time nothing.
+    :type timings: dict or None
+    :param stage: Name of the stage; stored as ``<stage>_ms``.
+    :type stage: str
+    """
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[f"{stage}_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+
 
 class StickerProcessor:
     """
     A class to handle sticker processing including object detection, background removal,
     and sticker generation using YOLO and SAM models.
 
+    Images are kept in memory from download to upload: the downloaded bytes are decoded
+    once into a BGR array that is handed to both YOLO and SAM, and the outputs are
+    encoded to PNG in memory and uploaded from there.
+
     :param yolo_model_path: Path to the YOLO model file.
     :type yolo_model_path: str
-    :param sam_checkpoint_path: Path to the SAM model checkpoint file.
-    :type sam_checkpoint_path: str
-    :param sam_model_type: Type of the SAM model to use.
+    :param sam_checkpoint_path: Path to the checkpoint of the default SAM model, None if listed in ``sam_checkpoints``.
+    :type sam_checkpoint_path: str or None
+    :param sam_model_type: Type of the default SAM model, or a tier name from ``SAM_TIERS``.
     :type sam_model_type: str
     :param s3_bucket_name: Name of the S3 bucket for storing and retrieving images.
     :type s3_bucket_name: str
+    :param batch_max_size: Maximum number of concurrent requests run in one YOLO or SAM encoder pass.
+    :type batch_max_size: int
+    :param batch_max_wait_ms: Maximum time a request waits for others to join its batch.
+    :type batch_max_wait_ms: float
+    :param embedding_cache: Cache of SAM image embeddings, None to build a default in-memory cache.
+    :type embedding_cache: EmbeddingCache or None
+    :param fetcher: Pooled image fetcher, None to build one with default limits.
+    :type fetcher: ImageFetcher or None
+    :param result_cache: Cache of finished results, None to build a default in-memory cache.
+    :type result_cache: ResultCache or None
+    :param bulk_chunk_size: Number of images per YOLO and SAM encoder pass in the batch pipeline.
+    :type bulk_chunk_size: int
+    :param mmap_weights: Whether to memory-map the SAM checkpoint instead of copying it into process memory.
+    :type mmap_weights: bool
+    :param sam_checkpoints: Checkpoint path of every further SAM model to load, keyed by model type.
+    :type sam_checkpoints: dict or None
+    :param max_working_side: Longest side of the image YOLO and SAM run on, 0 for the original resolution.
+    :type max_working_side: int
+    :param max_output_side: Longest side of the output images, 0 for the original resolution.
+    :type max_output_side: int
+    :param max_pixels: Largest accepted image in pixels, checked from the header before decoding, 0 for no limit.
+    :type max_pixels: int
+    :param encoder: Output encoder, None to encode full-frame PNGs.
+    :type encoder: StickerEncoder or None
+    :param accelerator: CPU execution techniques of SAM and YOLO, None for the stock eager path.
+    :type accelerator: InferenceAccelerator or None
+    :param backend: Engine running YOLO and SAM, None to load the PyTorch models from the given paths.
+    :type backend: InferenceBackend or None
+    :param sam_quantization: Weight quantization of the SAM image encoders loaded by the default backend, ``int8``
+        or None for float32.
+    :type sam_quantization: str or None
+    :param predictor_pool_size: SamPredictors per backbone of the default backend, i.e. mask decodes of one backbone
+        run at once.
+    :type predictor_pool_size: int
     """
-    
-    def __init__(self, yolo_model_path, sam_checkpoint_path, sam_model_type, s3_bucket_name):
+
+    # Quality/latency tiers a request can ask for and the SAM backbone serving each
+    SAM_TIERS = {"fast": "vit_b", "balanced": "vit_l", "quality": "vit_h"}
+
+    # Processing parameters of each output; they are part of the result cache key
+    STICKER_PARAMS = {"border_thickness": 10}
+    BACKGROUND_REMOVAL_PARAMS = {"edge_smooth_radius": 2, "dilation_kernel_size": 10}
+
+    # Outputs that can be requested from the batch pipeline and the file name suffix of each;
+    # the extension follows the output format
+    BATCH_OPERATIONS = ("sticker", "bg_removed")
+    OUTPUT_SUFFIXES = {"sticker": "masked_area_sticker", "bg_removed": "background_removed"}
+
+    # How single-output pipelines return their image: a presigned S3 URL, or the encoded bytes themselves
+    RESPONSE_MODES = ("url", "binary")
+
+    def __init__(self, yolo_model_path, sam_checkpoint_path, sam_model_type, s3_bucket_name,
+                 batch_max_size=4, batch_max_wait_ms=5.0, embedding_cache=None, fetcher=None,
+                 result_cache=None, bulk_chunk_size=8, mmap_weights=True, sam_checkpoints=None,
+                 max_working_side=1024, max_output_side=0, max_pixels=100_000_000, encoder=None,
+                 accelerator=None, backend=None, sam_quantization=None, predictor_pool_size=2):
         """
         Initialize the StickerProcessor with the paths to the models and the S3 bucket name.
 
         :param yolo_model_path: Path to the YOLO model file.
         :type yolo_model_path: str
-        :param sam_checkpoint_path: Path to the SAM model checkpoint file.
-        :type sam_checkpoint_path: str
-        :param sam_model_type: Type of the SAM model to use.
+        :param sam_checkpoint_path: Path to the checkpoint of the default SAM model, None if listed in ``sam_checkpoints``.
+        :type sam_checkpoint_path: str or None
+        :param sam_model_type: Type of the default SAM model, or a tier name from ``SAM_TIERS``.
         :type sam_model_type: str
         :param s3_bucket_name: Name of the S3 bucket for storing and retrieving images.
         :type s3_bucket_name: str
+        :param batch_max_size: Maximum number of concurrent requests run in one YOLO or SAM encoder pass.
+        :type batch_max_size: int
+        :param batch_max_wait_ms: Maximum time a request waits for others to join its batch.
+        :type batch_max_wait_ms: float
+        :param embedding_cache: Cache of SAM image embeddings, None to build a default in-memory cache.
+        :type embedding_cache: EmbeddingCache or None
+        :param fetcher: Pooled image fetcher, None to build one with default limits.
+        :type fetcher: ImageFetcher or None
+        :param result_cache: Cache of finished results, None to build a default in-memory cache.
+        :type result_cache: ResultCache or None
+        :param bulk_chunk_size: Number of images per YOLO and SAM encoder pass in the batch pipeline.
+        :type bulk_chunk_size: int
+        :param mmap_weights: Whether to memory-map the SAM checkpoint instead of copying it into process memory.
+        :type mmap_weights: bool
+        :param sam_checkpoints: Checkpoint path of every further SAM model to load, keyed by model type.
+        :type sam_checkpoints: dict or None
+        :param max_working_side: Longest side of the image YOLO and SAM run on, 0 for the original resolution.
+        :type max_working_side: int
+        :param max_output_side: Longest side of the output images, 0 for the original resolution.
+        :type max_output_side: int
+        :param max_pixels: Largest accepted image in pixels, checked from the header before decoding, 0 for no limit.
+        :type max_pixels: int
+        :param encoder: Output encoder, None to encode full-frame PNGs.
+        :type encoder: StickerEncoder or None
+        :param accelerator: CPU execution techniques of SAM and YOLO, None for the stock eager path.
+        :type accelerator: InferenceAccelerator or None
+        :param backend: Engine running YOLO and SAM, None to load the PyTorch models from the given paths.
+        :type backend: InferenceBackend or None
+        :param sam_quantization: Weight quantization of the SAM image encoders loaded by the default backend, ``int8``
+            or None for float32.
+        :type sam_quantization: str or None
+        :param predictor_pool_size: SamPredictors per backbone of the default backend, i.e. mask decodes of one
+            backbone run at once.
+        :type predictor_pool_size: int
         """
         print("Initializing StickerProcessor...")
         self.yolo_model_path = yolo_model_path
-        self.sam_checkpoint_path = sam_checkpoint_path
-        self.sam_model_type = sam_model_type
+        self.sam_model_type = self.SAM_TIERS.get(sam_model_type, sam_model_type)
+        self.sam_checkpoints = dict(sam_checkpoints or {})
+        if sam_checkpoint_path:
+            self.sam_checkpoints[self.sam_model_type] = sam_checkpoint_path
+        if backend is None and self.sam_model_type not in self.sam_checkpoints:
+            raise ValueError(f"No checkpoint given for the default SAM model {self.sam_model_type}")
+        self.sam_checkpoint_path = self.sam_checkpoints.get(self.sam_model_type)
         self.s3_bucket_name = s3_bucket_name
+        self.max_working_side = max_working_side
+        self.max_output_side = max_output_side
+        self.max_pixels = max_pixels
+
+        # YOLO and every SAM backbone; requests pick a backbone by tier, see resolve_sam_model_type
+        if backend is None:
+            backend = TorchBackend(
+                yolo_model_path, self.sam_checkpoints, mmap_weights, accelerator, sam_quantization, predictor_pool_size
+            )
+        elif accelerator is not None and accelerator.techniques:
+            print({
+                "error_type": "Acceleration_Config_Error",
+                "details": f"Acceleration applies to the torch backend only, ignored by the {backend.name} backend"
+            })
+        if self.sam_model_type not in backend.sam_model_types:
+            raise ValueError(f"The {backend.name} backend has no default SAM model {self.sam_model_type}")
+        self.backend = backend
+        self.sam_model_types = list(backend.sam_model_types)
+
+        # Time spent loading each model, in milliseconds
+        self.load_timings = dict(backend.load_timings)
+
+        # Inference mode, reduced precision, memory layout and compilation of the torch backend
+        self.accelerator = backend.accelerator
+        self.acceleration_check = {}
+
+        # Concurrent requests are gathered into batched YOLO and SAM encoder passes,
+        # one encoder batcher per backbone
+        self._detect_batcher = MicroBatcher(self._detect_batch, batch_max_size, batch_max_wait_ms, name="yolo-batcher")
+        self._encode_batchers = {
+            model_type: MicroBatcher(
+                functools.partial(self._encode_batch, sam_model_type=model_type),
+                batch_max_size, batch_max_wait_ms, name=f"sam-{model_type}-encoder-batcher"
+            )
+            for model_type in self.sam_model_types
+        }
+
+        # End-to-end request latency of each backbone
+        self._latency_lock = threading.Lock()
+        self._latency = {model_type: {"requests": 0, "total_ms": 0.0, "max_ms": 0.0} for model_type in self.sam_model_types}
+
+        # Image embeddings are reused across endpoints and resubmissions of the same pixels
+        self.embedding_cache = embedding_cache if embedding_cache is not None else EmbeddingCache()
+
+        # Downloads share one keep-alive connection pool
+        self.fetcher = fetcher if fetcher is not None else ImageFetcher()
+
+        # Identical requests reuse finished results and share in-flight computations
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.bulk_chunk_size = bulk_chunk_size
+
+        # Output format, compression and cropping
+        self.encoder = encoder if encoder is not None else StickerEncoder()
+
+    def resolve_sam_model_type(self, tier=None):
+        """
+        Map a requested tier to a loaded SAM backbone.
 
-        # Load YOLO model
-        self.model = YOLO(yolo_model_path)
+        :param tier: Tier name from ``SAM_TIERS``, a SAM model type, or None for the default backbone.
+        :type tier: str or None
+        :returns: The SAM model type, or an error dictionary if the tier is unknown or its backbone is not loaded.
+        :rtype: str or dict
+        """
+        if tier is None:
+            return self.sam_model_type
+        model_type = self.SAM_TIERS.get(tier, tier)
+        if model_type not in self.sam_model_types:
+            available = [name for name, backbone in self.SAM_TIERS.items() if backbone in self.sam_model_types]
+            return {
+                "error_type": "invalid_tier",
+                "details": f"Tier {tier!r} is not available, expected one of {available + self.sam_model_types}."
+            }
+        return model_type
+
+    @staticmethod
+    def decode_image(data, flags=cv2.IMREAD_COLOR):
+        """
+        Decode downloaded image bytes into a BGR array.
+
+        :param data: Encoded image bytes.
+        :type data: bytes
+        :param flags: OpenCV decode flags, e.g. ``cv2.IMREAD_REDUCED_COLOR_2`` to decode a JPEG at half size.
+        :type flags: int
+        :returns: BGR image as an HxWx3 uint8 array or an error dictionary.
+        :rtype: numpy.ndarray or dict
+        """
+        try:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+            if image is None:
+                raise Exception("The downloaded content could not be decoded as an image")
+            return image
+        except Exception as e:
+            return {"error_type": "Decode_Error", "details": str(e)}
+
+    @staticmethod
+    def _fit(image, max_side):
+        height, width = image.shape[:2]
+        if not max_side or max(height, width) <= max_side:
+            return image
+        scale = max_side / max(height, width)
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def load_image(self, data):
+        """
+        Decode downloaded image bytes once at the resolutions the pipeline needs.
+
+        The dimensions are read from the header first, so an image above ``max_pixels``, or
+        above the decompression bomb limit of PIL, is rejected before any pixel buffer is
+        allocated; so is content whose header cannot be read. A JPEG much larger than needed
+        is decoded at 1/2, 1/4 or 1/8 scale by the codec itself. The decoded image is
+        then downscaled to ``max_output_side`` for composing the outputs and to
+        ``max_working_side`` for YOLO and SAM.
+
+        :param data: Encoded image bytes.
+        :type data: bytes
+        :returns: The image at working and output resolution, or an error dictionary.
+        :rtype: IngestedImage or dict
+        """
+        try:
+            with Image.open(io.BytesIO(data)) as header:
+                width, height = header.size
+                is_jpeg = header.format == "JPEG"
+        except Image.DecompressionBombError as e:
+            return {"error_type": "image_too_many_pixels", "details": str(e)}
+        except Exception as e:
+            # Without the dimensions the pixel limit cannot be enforced, so the content is not handed to OpenCV
+            return {"error_type": "invalid_image", "details": f"The image header could not be read: {e}"}
+
+        if self.max_pixels and width * height > self.max_pixels:
+            return {
+                "error_type": "image_too_many_pixels",
+                "details": f"The image has {width}x{height} pixels, more than the maximum of {self.max_pixels}."
+            }
+
+        # The decode has to cover the larger of the two target resolutions
+        needed_side = max(self.max_output_side or max(width, height), self.max_working_side or max(width, height))
+        flags = cv2.IMREAD_COLOR
+        if is_jpeg:
+            for factor, reduced_flags in REDUCED_DECODE_FLAGS:
+                if max(width, height) // factor >= needed_side:
+                    flags = reduced_flags
+                    break
+
+        image = self.decode_image(data, flags)
+        if isinstance(image, dict):
+            return image
+        output = self._fit(image, self.max_output_side)
+        return IngestedImage(self._fit(output, self.max_working_side), output)
+
+    @staticmethod
+    def scale_bbox(bbox, from_size, to_size):
+        """
+        Map a bounding box between two resolutions of the same image.
 
-        # Load SAM model
-        sam = sam_model_registry[sam_model_type](checkpoint=sam_checkpoint_path)
-        self.predictor = SamPredictor(sam)
+        :param bbox: Bounding box as [x1, y1, x2, y2].
+        :type bbox: list
+        :param from_size: Height and width of the image the box is given in.
+        :type from_size: tuple
+        :param to_size: Height and width of the image to map the box to.
+        :type to_size: tuple
+        :returns: The box in ``to_size`` coordinates, rounded to one decimal.
+        :rtype: list
+        """
+        scale_y, scale_x = to_size[0] / from_size[0], to_size[1] / from_size[1]
+        x1, y1, x2, y2 = bbox
+        return [round(x1 * scale_x, 1), round(y1 * scale_y, 1), round(x2 * scale_x, 1), round(y2 * scale_y, 1)]
 
-        # Define root directory for saving images and stickers
-        self.root_dir = os.path.dirname(os.path.abspath(__file__))
-        self.img_folder = os.path.join(self.root_dir, "img")
-        self.sticker_folder = os.path.join(self.root_dir, "sticker")
-        self.bg_removed_folder = os.path.join(self.root_dir, "bg_removed")
+    @staticmethod
+    def upscale_mask(mask, output_size):
+        """
+        Map a mask computed at working resolution to output resolution.
 
+        Only the bounding rectangle of the mask is resized; the rest of the output mask is
+        left empty without being interpolated.
 
-        try:
-            print("inside try...")
-            # Ensure base directories exist
-            os.makedirs(self.img_folder, exist_ok=True)
-            os.makedirs(self.sticker_folder, exist_ok=True)
-            os.makedirs(self.bg_removed_folder, exist_ok=True)
-        except Exception as e:
-            return {"error_type": "file_making_error", "details": str(e)}
+        :param mask: Boolean mask at working resolution.
+        :type mask: numpy.ndarray
+        :param output_size: Height and width of the output image.
+        :type output_size: tuple
+        :returns: Boolean mask with the output height and width.
+        :rtype: numpy.ndarray
+        """
+        height, width = mask.shape[:2]
+        out_height, out_width = output_size
+        if (height, width) == (out_height, out_width):
+            return mask
+
+        upscaled = np.zeros((out_height, out_width), dtype=bool)
+        x, y, w, h = cv2.boundingRect(mask.astype(np.uint8))
+        if w == 0 or h == 0:
+            return upscaled
+
+        # One pixel of context on each side keeps the interpolation at the ROI edge exact
+        x0, y0 = max(x - 1, 0), max(y - 1, 0)
+        x1, y1 = min(x + w + 1, width), min(y + h + 1, height)
+        scale_x, scale_y = out_width / width, out_height / height
+        out_x0, out_y0 = int(x0 * scale_x), int(y0 * scale_y)
+        out_x1, out_y1 = min(int(np.ceil(x1 * scale_x)), out_width), min(int(np.ceil(y1 * scale_y)), out_height)
+
+        roi = cv2.resize(
+            mask[y0:y1, x0:x1].astype(np.float32),
+            (out_x1 - out_x0, out_y1 - out_y0),
+            interpolation=cv2.INTER_LINEAR
+        )
+        upscaled[out_y0:out_y1, out_x0:out_x1] = roi > 0.5
+        return upscaled
+
+    def _output_mask(self, image, bbox, sam_model_type, report=None):
+        """
+        Compute the SAM mask at working resolution and map it to output resolution.
 
-    def _ensure_directories(self, *dirs):
+        :param image: The ingested image.
+        :type image: IngestedImage
+        :param bbox: Bounding box of the object at working resolution.
+        :type bbox: list
+        :param sam_model_type: SAM backbone computing the mask.
+        :type sam_model_type: str
+        :param report: Dictionary collecting the ``sam_encode`` and ``sam_decode`` stage timings, or None.
+        :type report: dict or None
+        :returns: Boolean mask with the output height and width.
+        :rtype: numpy.ndarray
         """
-        Ensure that specified directories exist.
+        with stage_timer(report, "sam_encode"):
+            embedding = self._get_embedding(image.working, sam_model_type)
+        with stage_timer(report, "sam_decode"):
+            mask = self._decode_mask(embedding, bbox, sam_model_type)
+            return self.upscale_mask(mask, image.output.shape[:2])
 
-        :param dirs: Directories to be checked and created if necessary.
-        :type dirs: str
+    def _encode(self, rgba_image, name, report):
         """
-        for dir_path in dirs:
-            if not os.path.exists(dir_path):
-                os.makedirs(dir_path)
+        Encode an output image, recording the encode time and size.
+
+        :param rgba_image: RGBA image as an HxWx4 uint8 array.
+        :type rgba_image: numpy.ndarray
+        :param name: Output name, e.g. ``sticker``.
+        :type name: str
+        :param report: Dictionary collecting ``encode_ms`` and ``encoded_bytes`` per output, or None.
+        :type report: dict or None
+        :returns: The encoded image.
+        :rtype: bytes
+        """
+        start = time.perf_counter()
+        data = self.encoder.encode(rgba_image)
+        if report is not None:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            report["encode_ms"] = round(report.get("encode_ms", 0.0) + elapsed_ms, 2)
+            report.setdefault("encoded_bytes", {})[name] = len(data)
+        return data
+
+    def _new_output_key(self, name):
+        """
+        Build a unique S3 key for an output, with the extension of the output format.
 
-    def predict(self, image_path):
+        :param name: Output name, ``sticker`` or ``bg_removed``.
+        :type name: str
+        :returns: S3 key of the output.
+        :rtype: str
+        """
+        return self._output_key(name, f"{self.OUTPUT_SUFFIXES[name]}.{self.encoder.extension}")
+
+    @staticmethod
+    def _output_key(folder, suffix):
+        """
+        Build a unique S3 key for an output image.
+
+        :param folder: Key prefix, e.g. ``sticker``.
+        :type folder: str
+        :param suffix: File name suffix, e.g. ``masked_area_sticker.png``.
+        :type suffix: str
+        :returns: S3 key of the form ``<folder>/<timestamp>_<id>_<suffix>``.
+        :rtype: str
+        """
+        return f"{folder}/{StickerManager.get_timestamp()}_{uuid.uuid4().hex[:8]}_{suffix}"
+
+    def predict(self, image):
         """
         Predict the bounding box of objects in the given image using YOLO.
 
-        :param image_path: Path to the image file.
-        :type image_path: str
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
         :returns: List of bounding boxes for detected objects or an error dictionary.
         :rtype: list or dict
         """
         try:
-            results = self.model.predict(image_path, save=False, verbose=False)
-            if not results:
-                raise Exception(f"No prediction result from the model for {image_path}")
-
-            for result in results:
-                boxes = result.boxes
-            bbox = boxes.xyxy.tolist()[0]
-            return bbox
+            return self._detect_batcher.run(image)
         except Exception as e:
             return {"error_type": "error", "details": str(e)}
 
-    def process_img(self, image_path, bbox, output_path_segmented, border_thickness=10):
+    def _detect_batch(self, images):
+        """
+        Run one batched YOLO pass and return the first bounding box of each image.
+
+        :param images: BGR images as HxWx3 uint8 arrays.
+        :type images: list
+        :returns: One bounding box per image, or an exception for images without a detection.
+        :rtype: list
+        """
+        bboxes = []
+        for detections in self.backend.detect(images):
+            if detections.xyxy:
+                bboxes.append(detections.xyxy[0])
+            else:
+                bboxes.append(Exception("No object detected in the image"))
+        return bboxes
+
+    def _encode_batch(self, images, sam_model_type=None, reference=False):
+        """
+        Run one batched SAM image encoder pass.
+
+        :param images: BGR images as HxWx3 uint8 arrays.
+        :type images: list
+        :param sam_model_type: SAM backbone to run, None for the default.
+        :type sam_model_type: str or None
+        :param reference: Whether to bypass the accelerator and run the eager float32 encoder.
+        :type reference: bool
+        :returns: One embedding per image.
+        :rtype: list[SamEmbedding]
+        """
+        return self.backend.encode(images, sam_model_type or self.sam_model_type, reference)
+
+    def _get_embedding(self, image, sam_model_type):
+        """
+        Return the SAM embedding of an image, from the cache when possible.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
+        :param sam_model_type: SAM backbone computing the embedding.
+        :type sam_model_type: str
+        :returns: The image embedding.
+        :rtype: SamEmbedding
+        """
+        key = EmbeddingCache.image_key(image, self.backend.embedding_model_id(sam_model_type))
+        embedding = self._cached_embedding(key, sam_model_type)
+        if embedding is not None:
+            return embedding
+
+        embedding = self._encode_batchers[sam_model_type].run(image)
+        self._cache_embedding(key, embedding)
+        return embedding
+
+    def _cached_embedding(self, key, sam_model_type):
+        """
+        Look up an embedding in the embedding cache.
+
+        :param key: Key built by ``EmbeddingCache.image_key``.
+        :type key: str
+        :param sam_model_type: SAM backbone the embedding belongs to.
+        :type sam_model_type: str
+        :returns: The cached embedding, or None on a miss.
+        :rtype: SamEmbedding or None
+        """
+        cached = self.embedding_cache.get(key)
+        if cached is None:
+            return None
+        features, original_size, input_size = cached
+        return SamEmbedding(self.backend.features_from_numpy(features, sam_model_type), original_size, input_size)
+
+    def _cache_embedding(self, key, embedding):
+        """
+        Store an embedding in the embedding cache.
+
+        :param key: Key built by ``EmbeddingCache.image_key``.
+        :type key: str
+        :param embedding: The embedding to store.
+        :type embedding: SamEmbedding
+        """
+        self.embedding_cache.put(
+            key, self.backend.features_to_numpy(embedding.features), embedding.original_size, embedding.input_size
+        )
+
+    def _segment(self, image, bbox, sam_model_type=None):
+        """
+        Compute the SAM mask of the object inside the bounding box.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
+        :param bbox: Bounding box coordinates for the object.
+        :type bbox: list
+        :param sam_model_type: SAM backbone to use, None for the default.
+        :type sam_model_type: str or None
+        :returns: Boolean mask with the same height and width as the image.
+        :rtype: numpy.ndarray
+        """
+        sam_model_type = sam_model_type or self.sam_model_type
+        return self._decode_mask(self._get_embedding(image, sam_model_type), bbox, sam_model_type)
+
+    def _decode_mask(self, embedding, bbox, sam_model_type=None):
+        """
+        Run the SAM prompt encoder and mask decoder for a box on a precomputed embedding.
+
+        :param embedding: SAM embedding of the image.
+        :type embedding: SamEmbedding
+        :param bbox: Bounding box coordinates for the object.
+        :type bbox: list
+        :param sam_model_type: SAM backbone the embedding was computed with, None for the default.
+        :type sam_model_type: str or None
+        :returns: Boolean mask with the same height and width as the image.
+        :rtype: numpy.ndarray
+        """
+        return self.backend.decode(embedding, [bbox], sam_model_type or self.sam_model_type)[0]
+
+    def detect_objects(self, image, max_objects=5, class_ids=None, min_confidence=0.25):
+        """
+        Detect up to ``max_objects`` objects with YOLO, most confident first.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
+        :param max_objects: Maximum number of detections to return.
+        :type max_objects: int
+        :param class_ids: YOLO class ids to keep, None for all classes.
+        :type class_ids: list or None
+        :param min_confidence: Minimum detection confidence.
+        :type min_confidence: float
+        :returns: Detections as dictionaries with ``bbox``, ``class_name`` and ``confidence``.
+        :rtype: list
+        """
+        detections = self.backend.detect([image], min_confidence, class_ids, max_objects)[0]
+        return [
+            {
+                "bbox": [round(v, 1) for v in bbox],
+                "class_name": self.backend.class_names[class_id],
+                "confidence": round(confidence, 4),
+            }
+            for bbox, confidence, class_id in list(zip(*detections))[:max_objects]
+        ]
+
+    def class_ids(self, class_names):
+        """
+        Map YOLO class names to class ids.
+
+        :param class_names: Class names, e.g. ``["person", "dog"]``.
+        :type class_names: list
+        :returns: The class ids, or an error dictionary naming the unknown classes.
+        :rtype: list or dict
+        """
+        ids = {name: class_id for class_id, name in self.backend.class_names.items()}
+        unknown = [name for name in class_names if name not in ids]
+        if unknown:
+            return {
+                "error_type": "invalid_class",
+                "details": f"Unknown classes {unknown}, expected names from {sorted(ids)}."
+            }
+        return [ids[name] for name in class_names]
+
+    def _decode_masks(self, embedding, bboxes, sam_model_type=None):
+        """
+        Decode the masks of several boxes on one embedding in a single batched prompt pass.
+
+        :param embedding: SAM embedding of the image.
+        :type embedding: SamEmbedding
+        :param bboxes: Bounding boxes of the objects.
+        :type bboxes: list
+        :param sam_model_type: SAM backbone the embedding was computed with, None for the default.
+        :type sam_model_type: str or None
+        :returns: One boolean mask per box, with the height and width of the image.
+        :rtype: list
+        """
+        return self.backend.decode(embedding, bboxes, sam_model_type or self.sam_model_type)
+
+    @staticmethod
+    def _synthetic_image(size):
+        """
+        Build a gradient image with a filled rectangle and the box around it.
+
+        :param size: Height and width of the image.
+        :type size: int
+        :returns: Tuple of (BGR image, bounding box of the rectangle).
+        :rtype: tuple
+        """
+        image = np.zeros((size, size, 3), dtype=np.uint8)
+        image[:] = np.linspace(0, 255, size, dtype=np.uint8)[:, None, None]
+        bbox = [size // 4, size // 4, 3 * size // 4, 3 * size // 4]
+        cv2.rectangle(image, tuple(bbox[:2]), tuple(bbox[2:]), (40, 160, 220), thickness=-1)
+        return image, bbox
+
+    def verify_acceleration(self, size=512, images=None):
+        """
+        Check the masks of the accelerated path against the eager float32 path.
+
+        Every SAM backbone computes the mask of each image twice, with and without the
+        accelerator. If the IoU of any pair is below ``accelerator.min_iou``, the
+        accelerator is disabled and requests take the default path.
+
+        :param size: Height and width of the synthetic image used when no images are given.
+        :type size: int
+        :param images: (BGR image, bounding box) pairs to check, None for a synthetic image.
+        :type images: list or None
+        :returns: Dictionary with the lowest IoU of each backbone, the tolerance and whether the accelerator is kept.
+        :rtype: dict
+        """
+        if self.accelerator is None:
+            return {}
+        images = images or [self._synthetic_image(size)]
+        ious = {}
+        for model_type in self.sam_model_types:
+            ious[model_type] = min(
+                self.accelerator.mask_iou(
+                    self._decode_mask(self._encode_batch([image], model_type)[0], bbox, model_type),
+                    self._decode_mask(self._encode_batch([image], model_type, reference=True)[0], bbox, model_type)
+                )
+                for image, bbox in images
+            )
+
+        passed = all(iou >= self.accelerator.min_iou for iou in ious.values())
+        if not passed:
+            print({
+                "error_type": "Acceleration_Check_Error",
+                "details": f"Mask IoU {ious} below {self.accelerator.min_iou}, falling back to the default path"
+            })
+            self.accelerator.disable()
+        self.acceleration_check = {"iou": ious, "min_iou": self.accelerator.min_iou, "passed": passed}
+        return self.acceleration_check
+
+    def warmup(self, size=512):
+        """
+        Run YOLO and the image encoder and mask decoder of every SAM backbone once on a synthetic image.
+
+        The first call of each model pays for lazy initialization, kernel selection and
+        memory allocation; running it before serving keeps that off the first request.
+        Nothing is cached or uploaded.
+
+        :param size: Height and width of the synthetic image.
+        :type size: int
+        :returns: Dictionary with the warmup time of each model in milliseconds.
+        :rtype: dict
+        """
+        image, bbox = self._synthetic_image(size)
+
+        timings = {}
+        with stage_timer(timings, "yolo_warmup"):
+            # The synthetic image need not contain a detectable object
+            self._detect_batch([image])
+        for model_type in self.sam_model_types:
+            with stage_timer(timings, f"sam_{model_type}_warmup"):
+                embedding = self._encode_batch([image], model_type)[0]
+                self._decode_mask(embedding, bbox, model_type)
+        return timings
+
+    def stats(self):
+        """
+        Return fetch, batching and cache metrics.
+
+        :returns: Dictionary with fetch latency, per-batcher size and wait-time metrics, per-backbone request latency,
+            embedding and result cache counters, the inference backend with its per-operation latency and the
+            acceleration techniques in use.
+        :rtype: dict
+        """
+        stats = {
+            "fetch": self.fetcher.stats(),
+            "yolo_batching": self._detect_batcher.stats(),
+            "sam_encoder_batching": {
+                model_type: batcher.stats() for model_type, batcher in self._encode_batchers.items()
+            },
+            "sam_backbones": self._latency_stats(),
+            "embedding_cache": self.embedding_cache.stats(),
+            "result_cache": self.result_cache.stats(),
+            "backend": self.backend.stats(),
+        }
+        if self.accelerator is not None:
+            stats["acceleration"] = {
+                "techniques": sorted(self.accelerator.techniques),
+                "active": self.accelerator.active,
+                **self.acceleration_check,
+            }
+        return stats
+
+    def _record_latency(self, sam_model_type, elapsed_ms):
+        with self._latency_lock:
+            latency = self._latency[sam_model_type]
+            latency["requests"] += 1
+            latency["total_ms"] += elapsed_ms
+            latency["max_ms"] = max(latency["max_ms"], elapsed_ms)
+
+    def _latency_stats(self):
+        with self._latency_lock:
+            return {
+                model_type: {
+                    "tiers": [tier for tier, backbone in self.SAM_TIERS.items() if backbone == model_type],
+                    "default": model_type == self.sam_model_type,
+                    "requests": latency["requests"],
+                    "avg_ms": latency["total_ms"] / latency["requests"] if latency["requests"] else 0.0,
+                    "max_ms": latency["max_ms"],
+                }
+                for model_type, latency in self._latency.items()
+            }
+
+    def process_img(self, image, bbox, border_thickness=10, mask=None, sam_model_type=None, report=None):
         """
         Process the image to create a sticker by applying the mask to the image.
 
-        :param image_path: Path to the input image file.
-        :type image_path: str
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
         :param bbox: Bounding box coordinates for the object.
         :type bbox: list
-        :param output_path_segmented: Path to save the output sticker image.
-        :type output_path_segmented: str
         :param border_thickness: Thickness of the border around the object.
         :type border_thickness: int
-        :returns: None if successful, otherwise an error dictionary.
-        :rtype: None or dict
+        :param mask: Precomputed SAM mask of the object, computed from ``bbox`` if None.
+        :type mask: numpy.ndarray or None
+        :param sam_model_type: SAM backbone computing the mask if ``mask`` is None, None for the default.
+        :type sam_model_type: str or None
+        :param report: Dictionary collecting the encode time and size, or None.
+        :type report: dict or None
+        :returns: Encoded sticker if successful, otherwise an error dictionary.
+        :rtype: bytes or dict
         """
         try:
-            print("Bro, inside process image")
-            self._ensure_directories(os.path.dirname(output_path_segmented))
-
-            image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
-            self.predictor.set_image(image)
-            input_box = np.array(bbox)
-            masks, _, _ = self.predictor.predict(box=input_box[None, :], multimask_output=False)
-            mask = masks[0]
-            # Convert mask to binary format
-            binary_mask = (mask > 0.5).astype(np.uint8)
-            rgba_image = cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
-            rgba_image[:, :, 3] = (mask * 255).astype(np.uint8)
-
-            # Dilate the mask to create a border around the object
-            kernel = np.ones((border_thickness, border_thickness), np.uint8)
-            dilated_mask = cv2.dilate(binary_mask, kernel, iterations=1)
-            
-            # Create the border by subtracting the original mask from the dilated mask
-            border_mask = dilated_mask - binary_mask
-
-            # Apply white border where the border_mask is set
-            rgba_image[border_mask == 1] = [255, 255, 255, 255]  # White color with full opacity
-
-            pil_image = Image.fromarray(rgba_image)
-            pil_image.save(output_path_segmented)
-            return None  # Return None if successful
+            if mask is None:
+                mask = self._segment(image, bbox, sam_model_type)
+            rgba_image = self._sticker_rgba(image, mask, border_thickness)
+            return self._encode(rgba_image, "sticker", report)
         except Exception as e:
             return {"error_type": "Sticker Generation Error", "details": str(e)}
 
-    def remove_background_and_save(self, image_path, bbox, output_path_background_removed, edge_smooth_radius=2, dilation_kernel_size=10):
+    @staticmethod
+    def _mask_roi(mask, margin):
         """
-        Remove the background from the image, apply edge smoothing, and save the result.
+        Return the slices of the bounding rectangle of a mask's non-zero pixels, expanded by a margin.
+
+        :param mask: Mask with the height and width of the image.
+        :type mask: numpy.ndarray
+        :param margin: Pixels added on each side, clipped to the image.
+        :type margin: int
+        :returns: Tuple of (row slice, column slice), or None for an empty mask.
+        :rtype: tuple or None
+        """
+        rows = np.flatnonzero(mask.any(axis=1))
+        if not rows.size:
+            return None
+        cols = np.flatnonzero(mask.any(axis=0))
+        height, width = mask.shape[:2]
+        return (
+            slice(max(rows[0] - margin, 0), min(rows[-1] + 1 + margin, height)),
+            slice(max(cols[0] - margin, 0), min(cols[-1] + 1 + margin, width)),
+        )
+
+    @staticmethod
+    def _sticker_rgba(image, mask, border_thickness=10):
+        """
+        Build the sticker RGBA image: the masked object surrounded by a white border.
 
-        :param image_path: Path to the input image file.
-        :type image_path: str
+        The morphology runs only on the bounding rectangle of the mask, expanded by the
+        border thickness; everything outside it is transparent in the full-frame result
+        as well, so the output is identical.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
+        :param mask: SAM mask of the object.
+        :type mask: numpy.ndarray
+        :param border_thickness: Thickness of the border around the object.
+        :type border_thickness: int
+        :returns: RGBA image as an HxWx4 uint8 array.
+        :rtype: numpy.ndarray
+        """
+        rgba_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+        rgba_image[:, :, 3] = 0
+        roi = StickerProcessor._mask_roi(mask, border_thickness)
+        if roi is None:
+            return rgba_image
+        mask = mask[roi]
+        rgba_roi = rgba_image[roi]
+
+        # Convert mask to binary format
+        binary_mask = (mask > 0.5).astype(np.uint8)
+        rgba_roi[:, :, 3] = (mask * 255).astype(np.uint8)
+
+        # Dilate the mask to create a border around the object
+        kernel = np.ones((border_thickness, border_thickness), np.uint8)
+        dilated_mask = cv2.dilate(binary_mask, kernel, iterations=1)
+
+        # Create the border by subtracting the original mask from the dilated mask
+        border_mask = dilated_mask - binary_mask
+
+        # Apply white border where the border_mask is set
+        rgba_roi[border_mask == 1] = [255, 255, 255, 255]  # White color with full opacity
+        return rgba_image
+
+    def remove_background_and_save(self, image, bbox, edge_smooth_radius=2, dilation_kernel_size=10, mask=None,
+                                   sam_model_type=None, report=None):
+        """
+        Remove the background from the image, apply edge smoothing, and encode the result in memory.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
         :param bbox: Bounding box coordinates for the object.
         :type bbox: list
-        :param output_path_background_removed: Path to save the output image with background removed.
-        :type output_path_background_removed: str
         :param edge_smooth_radius: Radius for the Gaussian blur used for edge smoothing.
         :type edge_smooth_radius: int
         :param dilation_kernel_size: Size of the kernel used for dilation.
         :type dilation_kernel_size: int
-        :returns: None if successful, otherwise an error dictionary.
-        :rtype: None or dict
+        :param mask: Precomputed SAM mask of the object, computed from ``bbox`` if None.
+        :type mask: numpy.ndarray or None
+        :param sam_model_type: SAM backbone computing the mask if ``mask`` is None, None for the default.
+        :type sam_model_type: str or None
+        :param report: Dictionary collecting the encode time and size, or None.
+        :type report: dict or None
+        :returns: Encoded background-removed image if successful, otherwise an error dictionary.
+        :rtype: bytes or dict
         """
         try:
-            self._ensure_directories(os.path.dirname(output_path_background_removed))
-
-            image = cv2.cvtColor(cv2.imread(image_path), cv2.COLOR_BGR2RGB)
-            self.predictor.set_image(image)
-            input_box = np.array(bbox)
-            masks, _, _ = self.predictor.predict(box=input_box[None, :], multimask_output=False)
-            mask = masks[0]
-            # Convert mask to binary format
-            binary_mask = (mask > 0.5).astype(np.uint8)
-
-            # Create an edge mask using Canny edge detection
-            edges = cv2.Canny(binary_mask * 255, 100, 200)
-            
-            # Dilate the edge mask to enhance edges
-            kernel = np.ones((dilation_kernel_size, dilation_kernel_size), np.uint8)
-            dilated_edges = cv2.dilate(edges, kernel, iterations=1)
-            
-            # Create a smooth border by applying Gaussian blur to the dilated edges
-            blurred_edges = cv2.GaussianBlur(dilated_edges, (0, 0), edge_smooth_radius)
-            
-            # Normalize blurred edges to range [0, 255]
-            normalized_edges = np.clip(blurred_edges, 0, 255).astype(np.uint8)
-            
-            # Create an RGBA image (add alpha channel)
-            rgba_image = cv2.cvtColor(image, cv2.COLOR_RGB2RGBA)
-            rgba_image[:, :, 3] = binary_mask * 255
-            
-            # Combine the smoothed edges with the alpha channel
-            rgba_image[:, :, 3] = np.maximum(rgba_image[:, :, 3], normalized_edges)
-
-            # Convert to PIL Image to save with transparency
-            pil_image = Image.fromarray(rgba_image)
-            pil_image.save(output_path_background_removed)
-            
-            return None  # Return None if successful
-
+            if mask is None:
+                mask = self._segment(image, bbox, sam_model_type)
+            rgba_image = self._background_removed_rgba(image, mask, edge_smooth_radius, dilation_kernel_size)
+            return self._encode(rgba_image, "bg_removed", report)
         except Exception as e:
             return {"error_type": "Background Removal Error", "details": str(e)}
 
-    def generate_sticker(self, image_url):
+    @staticmethod
+    def _background_removed_rgba(image, mask, edge_smooth_radius=2, dilation_kernel_size=10):
         """
-        Generate a sticker from the image at the given URL.
+        Build the background-removed RGBA image with smoothed edges.
+
+        Canny, dilation and blur run only on the bounding rectangle of the mask, expanded
+        by the reach of the three filters; the result is identical to filtering the full
+        frame, whose values outside that rectangle are all zero.
+
+        :param image: BGR image as an HxWx3 uint8 array.
+        :type image: numpy.ndarray
+        :param mask: SAM mask of the object.
+        :type mask: numpy.ndarray
+        :param edge_smooth_radius: Radius for the Gaussian blur used for edge smoothing.
+        :type edge_smooth_radius: int
+        :param dilation_kernel_size: Size of the kernel used for dilation.
+        :type dilation_kernel_size: int
+        :returns: RGBA image as an HxWx4 uint8 array.
+        :rtype: numpy.ndarray
+        """
+        rgba_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+        rgba_image[:, :, 3] = 0
+        # Gaussian kernel radius OpenCV derives from sigma for 8-bit images
+        blur_radius = (int(round(edge_smooth_radius * 6 + 1)) | 1) // 2
+        # Canny reaches 2 pixels (Sobel aperture and non-maximum suppression), the dilation
+        # one kernel size; the blur needs zeros for twice its radius since it reflects at the ROI edge
+        margin = 2 + dilation_kernel_size + 2 * blur_radius + 1
+        roi = StickerProcessor._mask_roi(mask > 0.5, margin)
+        if roi is None:
+            return rgba_image
+
+        # Convert mask to binary format
+        binary_mask = (mask[roi] > 0.5).astype(np.uint8)
+
+        # Create an edge mask using Canny edge detection
+        edges = cv2.Canny(binary_mask * 255, 100, 200)
+
+        # Dilate the edge mask to enhance edges
+        kernel = np.ones((dilation_kernel_size, dilation_kernel_size), np.uint8)
+        dilated_edges = cv2.dilate(edges, kernel, iterations=1)
+
+        # Create a smooth border by applying Gaussian blur to the dilated edges
+        blurred_edges = cv2.GaussianBlur(dilated_edges, (0, 0), edge_smooth_radius)
+
+        # Normalize blurred edges to range [0, 255]
+        normalized_edges = np.clip(blurred_edges, 0, 255).astype(np.uint8)
+
+        # Set the alpha channel of the ROI
+        rgba_roi = rgba_image[roi]
+        rgba_roi[:, :, 3] = binary_mask * 255
+
+        # Combine the smoothed edges with the alpha channel
+        rgba_roi[:, :, 3] = np.maximum(rgba_roi[:, :, 3], normalized_edges)
+        return rgba_image
+
+    def _fetch(self, image_url, timings):
+        """
+        Download the image at the given URL.
 
         :param image_url: URL of the image to be processed.
         :type image_url: str
-        :returns: Dictionary containing the sticker URL or an error dictionary.
+        :param timings: Dictionary collecting the stage timings of the request.
+        :type timings: dict
+        :returns: The downloaded bytes or an error dictionary.
+        :rtype: bytes or dict
+        """
+        with stage_timer(timings, "fetch"):
+            return self.fetcher.fetch(image_url)
+
+    def _detect(self, data, report=None):
+        """
+        Decode downloaded image bytes and predict the bounding box of the object.
+
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param report: Dictionary collecting the ``decode`` and ``detect`` stage timings, or None.
+        :type report: dict or None
+        :returns: Tuple of (ingested image, bounding box at working resolution) or an error dictionary.
+        :rtype: tuple or dict
+        """
+        with stage_timer(report, "decode"):
+            image = self.load_image(data)
+        if isinstance(image, dict):
+            return image
+
+        with stage_timer(report, "detect"):
+            bbox = self.predict(image.working)
+        if isinstance(bbox, dict):
+            return bbox
+        return image, bbox
+
+    def _upload_outputs(self, outputs, report=None):
+        """
+        Upload encoded output images to S3 concurrently.
+
+        :param outputs: Mapping of output name to (encoded image, S3 key).
+        :type outputs: dict
+        :param report: Dictionary collecting the ``upload`` stage timing, or None.
+        :type report: dict or None
+        :returns: Mapping of output name to S3 key, or the first error dictionary.
+        :rtype: dict
+        """
+        with stage_timer(report, "upload"):
+            upload_results = StickerManager.upload_many_to_s3(
+                [(data, s3_key, self.encoder.content_type) for data, s3_key in outputs.values()],
+                self.s3_bucket_name
+            )
+        for upload_result in upload_results:
+            if isinstance(upload_result, dict):
+                return upload_result
+        return {name: s3_key for name, (_, s3_key) in outputs.items()}
+
+    def _presign(self, s3_keys):
+        """
+        Generate presigned URLs for uploaded outputs.
+
+        :param s3_keys: Mapping of output name to S3 key.
+        :type s3_keys: dict
+        :returns: Mapping of ``<name>_url`` to presigned URL, or the first error dictionary.
+        :rtype: dict
+        """
+        urls = {}
+        for name, s3_key in s3_keys.items():
+            url = StickerManager.generate_presigned_url(self.s3_bucket_name, s3_key)
+            if isinstance(url, dict):
+                return url
+            urls[f"{name}_url"] = url
+        return urls
+
+    def _check_response_mode(self, response_mode):
+        """
+        Validate a requested response mode.
+
+        :param response_mode: Mode from ``RESPONSE_MODES``.
+        :type response_mode: str
+        :returns: None if the mode is valid, otherwise an error dictionary.
+        :rtype: dict or None
+        """
+        if response_mode not in self.RESPONSE_MODES:
+            return {
+                "error_type": "invalid_response_mode",
+                "details": f"Unknown response mode {response_mode!r}, expected one of {list(self.RESPONSE_MODES)}."
+            }
+        return None
+
+    def _run_binary(self, image_url, sam_model_type, compute):
+        """
+        Run a single-output pipeline and return the encoded image instead of uploading it.
+
+        The result cache holds S3 keys, so it is neither read nor filled in this mode; the
+        embedding cache still applies, so a repeated image skips the SAM image encoder.
+
+        :param image_url: URL of the image to be processed.
+        :type image_url: str
+        :param sam_model_type: SAM backbone computing the mask.
+        :type sam_model_type: str
+        :param compute: Callable taking the downloaded bytes and a report dictionary, and returning a mapping of the
+            output name to its encoded bytes.
+        :type compute: callable
+        :returns: Dictionary with the output name, the encoded image and its content type, the SAM backbone, the
+            encoded size and the stage timings, or an error dictionary.
         :rtype: dict
         """
+        start = time.perf_counter()
+        timings = {}
+        data = self._fetch(image_url, timings)
+        if isinstance(data, dict):
+            return data
+
+        report = {}
+        outputs = compute(data, report)
+        if "error_type" in outputs:
+            return outputs
+        (name, content), = outputs.items()
+
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self._record_latency(sam_model_type, elapsed_ms)
+        encoded_bytes = self._merge_report(timings, report)
+        timings["total_ms"] = round(elapsed_ms, 2)
+        return {
+            "output": name,
+            "content": content,
+            "content_type": self.encoder.content_type,
+            "sam_model_type": sam_model_type,
+            **encoded_bytes,
+            "timings": timings,
+            "cache": "bypass",
+        }
+
+    def _run_cached(self, image_url, operation, params, compute, presign=None):
+        """
+        Run a pipeline through the result cache.
+
+        The image is downloaded and its content hashed; a cached or in-flight result for
+        the same content, operation and parameters is reused, otherwise ``compute`` runs
+        and uploads the outputs. Presigned URLs are generated fresh for every request.
+
+        :param image_url: URL of the image to be processed.
+        :type image_url: str
+        :param operation: Name of the pipeline used in the cache key.
+        :type operation: str
+        :param params: Processing parameters used in the cache key, including ``sam_model_type``.
+        :type params: dict
+        :param compute: Callable taking the downloaded bytes and a report dictionary for the stage timings and encoded
+            sizes, and returning a mapping of output name to S3 key.
+        :type compute: callable
+        :param presign: Callable turning the result of ``compute`` into output URLs, ``_presign`` if None.
+        :type presign: callable or None
+        :returns: Dictionary of output URLs, the SAM backbone, the stage timings, the encoded sizes if this request
+            computed the outputs, and the cache outcome, or an error dictionary.
+        :rtype: dict
+        """
+        sam_model_type = params["sam_model_type"]
+        start = time.perf_counter()
+        result = self._run_cached_pipeline(image_url, operation, params, compute, presign or self._presign)
+        if "error_type" not in result:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            self._record_latency(sam_model_type, elapsed_ms)
+            result["sam_model_type"] = sam_model_type
+            result["timings"]["total_ms"] = round(elapsed_ms, 2)
+        return result
+
+    def _run_cached_pipeline(self, image_url, operation, params, compute, presign):
+        timings = {}
+        data = self._fetch(image_url, timings)
+        if isinstance(data, dict):
+            return data
+
+        key = ResultCache.make_key(data, operation, params)
+        report = {}
+        s3_keys, outcome = self.result_cache.get_or_compute(key, lambda: compute(data, report))
+        if isinstance(s3_keys, dict) and "error_type" in s3_keys:
+            return s3_keys
+
+        urls = presign(s3_keys)
+        if "error_type" in urls:
+            return urls
+        return {**urls, **self._merge_report(timings, report), "timings": timings, "cache": outcome}
+
+    @staticmethod
+    def _merge_report(timings, report):
+        """
+        Move the stage timings of a report into the timings and return the encoded sizes.
+
+        :param timings: Stage timings of the request, updated in place.
+        :type timings: dict
+        :param report: Report filled while computing the outputs; empty if they came from the cache.
+        :type report: dict
+        :returns: ``{"encoded_bytes": {name: size}}``, or an empty dictionary.
+        :rtype: dict
+        """
+        timings.update((stage, value) for stage, value in report.items() if stage.endswith("_ms"))
+        if "encoded_bytes" not in report:
+            return {}
+        return {"encoded_bytes": report["encoded_bytes"]}
+
+    def _cache_params(self, sam_model_type, **params):
+        """
+        Build the processing parameters of a cache key, including the SAM model type, the resolution caps and the encoding.
+
+        :param sam_model_type: SAM backbone computing the result.
+        :type sam_model_type: str
+        :returns: Parameter dictionary.
+        :rtype: dict
+        """
+        return {
+            "sam_model_type": sam_model_type,
+            "max_working_side": self.max_working_side,
+            "max_output_side": self.max_output_side,
+            **self.encoder.params(),
+            **self.backend.params(),
+            **params
+        }
+
+    def _sticker_outputs(self, data, sam_model_type, report=None, upload=True):
+        """
+        Build and upload the sticker for downloaded image bytes.
+
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param sam_model_type: SAM backbone computing the mask.
+        :type sam_model_type: str
+        :param report: Dictionary collecting the stage timings and encoded sizes, or None.
+        :type report: dict or None
+        :param upload: Whether to upload the sticker, or return its encoded bytes.
+        :type upload: bool
+        :returns: Mapping of output name to S3 key, or to the encoded bytes without upload, or an error dictionary.
+        :rtype: dict
+        """
+        detection = self._detect(data, report)
+        if isinstance(detection, dict):
+            return detection
+        image, bbox = detection
+
+        # Process image for sticker
         try:
+            mask = self._output_mask(image, bbox, sam_model_type, report)
+        except Exception as e:
+            return {"error_type": "Sticker Generation Error", "details": str(e)}
+        with stage_timer(report, "compose"):
+            sticker_data = self.process_img(image.output, bbox, mask=mask, report=report, **self.STICKER_PARAMS)
+        if isinstance(sticker_data, dict):
+            return sticker_data
 
-            print("inside gen sticker try block")
-            timestamp = StickerManager.get_timestamp()
-            image_path = os.path.join(self.img_folder, f"{timestamp}_image.jpg")
-            output_path_sticker = os.path.join(self.sticker_folder, f"{timestamp}_masked_area_sticker.png")
+        if not upload:
+            return {"sticker": sticker_data}
 
-            # Download the image
-            download_result = StickerManager.download_image(image_url, self.img_folder)
-            if isinstance(download_result, dict):
-                return download_result
+        # Upload sticker to S3
+        return self._upload_outputs({"sticker": (sticker_data, self._new_output_key("sticker"))}, report)
 
-            image_path = download_result
+    def _bg_removed_outputs(self, data, sam_model_type, report=None, upload=True):
+        """
+        Build and upload the background-removed image for downloaded image bytes.
 
-            # Predict bounding box
-            bbox = self.predict(image_path)
-            if isinstance(bbox, dict):
-                return bbox
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param sam_model_type: SAM backbone computing the mask.
+        :type sam_model_type: str
+        :param report: Dictionary collecting the stage timings and encoded sizes, or None.
+        :type report: dict or None
+        :param upload: Whether to upload the image, or return its encoded bytes.
+        :type upload: bool
+        :returns: Mapping of output name to S3 key, or to the encoded bytes without upload, or an error dictionary.
+        :rtype: dict
+        """
+        detection = self._detect(data, report)
+        if isinstance(detection, dict):
+            return detection
+        image, bbox = detection
 
-            # Ensure sticker folder exists
-            self._ensure_directories(self.sticker_folder)
+        # Remove background
+        try:
+            mask = self._output_mask(image, bbox, sam_model_type, report)
+        except Exception as e:
+            return {"error_type": "Background Removal Error", "details": str(e)}
+        with stage_timer(report, "compose"):
+            bg_removed_data = self.remove_background_and_save(
+                image.output, bbox, mask=mask, report=report, **self.BACKGROUND_REMOVAL_PARAMS
+            )
+        if isinstance(bg_removed_data, dict):
+            return bg_removed_data
 
-            # Process image for sticker
-            sticker_result = self.process_img(image_path, bbox, output_path_sticker)
-            if isinstance(sticker_result, dict):
-                return sticker_result
+        if not upload:
+            return {"bg_removed": bg_removed_data}
 
-            # Upload sticker to S3
-            StickerManager.upload_to_s3(output_path_sticker, self.s3_bucket_name, f"sticker/{timestamp}_masked_area_sticker.png", content_type='image/png')
+        # Upload the background-removed image to S3
+        return self._upload_outputs({"bg_removed": (bg_removed_data, self._new_output_key("bg_removed"))}, report)
 
-            # Generate presigned URL for sticker
-            sticker_url = StickerManager.generate_presigned_url(self.s3_bucket_name, f"sticker/{timestamp}_masked_area_sticker.png")
-            if isinstance(sticker_url, dict):
-                return sticker_url
+    def _sticker_and_bg_removed_outputs(self, data, sam_model_type, report=None):
+        """
+        Build and upload both outputs for downloaded image bytes from a single mask.
 
-            # Clean up local files
-            try:
-                StickerManager.clean_local_files(image_path, output_path_sticker)
-            except Exception as e:
-                print(f"Error cleaning local files: {str(e)}")
+        The individual sticker and background-removal results are cached as well, so a
+        later single-output request for the same image is a cache hit.
 
-            return {"sticker_url": sticker_url}
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param sam_model_type: SAM backbone computing the mask.
+        :type sam_model_type: str
+        :param report: Dictionary collecting the stage timings and encoded sizes, or None.
+        :type report: dict or None
+        :returns: Mapping of output name to S3 key or an error dictionary.
+        :rtype: dict
+        """
+        detection = self._detect(data, report)
+        if isinstance(detection, dict):
+            return detection
+        image, bbox = detection
 
+        # Segment once and build both outputs from the same mask
+        try:
+            mask = self._output_mask(image, bbox, sam_model_type, report)
+        except Exception as e:
+            return {"error_type": "Segmentation Error", "details": str(e)}
+
+        with stage_timer(report, "compose"):
+            sticker_data = self.process_img(image.output, bbox, mask=mask, report=report, **self.STICKER_PARAMS)
+            if isinstance(sticker_data, dict):
+                return sticker_data
+
+            bg_removed_data = self.remove_background_and_save(
+                image.output, bbox, mask=mask, report=report, **self.BACKGROUND_REMOVAL_PARAMS
+            )
+            if isinstance(bg_removed_data, dict):
+                return bg_removed_data
+
+        # Upload both outputs to S3 concurrently
+        s3_keys = self._upload_outputs({
+            "sticker": (sticker_data, self._new_output_key("sticker")),
+            "bg_removed": (bg_removed_data, self._new_output_key("bg_removed")),
+        }, report)
+        if "error_type" in s3_keys:
+            return s3_keys
+
+        self._seed_single_results(data, s3_keys, sam_model_type)
+        return s3_keys
+
+    def _seed_single_results(self, data, s3_keys, sam_model_type):
+        """
+        Cache each output of a combined run under its single-output key.
+
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param s3_keys: Mapping of output name to S3 key.
+        :type s3_keys: dict
+        :param sam_model_type: SAM backbone that computed the outputs.
+        :type sam_model_type: str
+        """
+        for operation, params in (("sticker", self.STICKER_PARAMS), ("bg_removed", self.BACKGROUND_REMOVAL_PARAMS)):
+            self.result_cache.put(
+                ResultCache.make_key(data, operation, self._cache_params(sam_model_type, **params)),
+                {operation: s3_keys[operation]}
+            )
+
+    def generate_sticker(self, image_url, tier=None, response_mode="url"):
+        """
+        Generate a sticker from the image at the given URL.
+
+        :param image_url: URL of the image to be processed.
+        :type image_url: str
+        :param tier: Quality/latency tier or SAM model type, None for the default backbone.
+        :type tier: str or None
+        :param response_mode: ``url`` to upload the sticker and return a presigned URL, ``binary`` to return the
+            encoded image without touching S3.
+        :type response_mode: str
+        :returns: Dictionary containing the sticker URL (or the encoded sticker), the SAM backbone, the stage timings and the cache outcome or an error dictionary.
+        :rtype: dict
+        """
+        try:
+            sam_model_type = self.resolve_sam_model_type(tier)
+            if isinstance(sam_model_type, dict):
+                return sam_model_type
+            error = self._check_response_mode(response_mode)
+            if error:
+                return error
+            if response_mode == "binary":
+                return self._run_binary(
+                    image_url, sam_model_type,
+                    lambda data, report: self._sticker_outputs(data, sam_model_type, report, upload=False)
+                )
+            return self._run_cached(
+                image_url, "sticker", self._cache_params(sam_model_type, **self.STICKER_PARAMS),
+                lambda data, report: self._sticker_outputs(data, sam_model_type, report)
+            )
         except Exception as e:
             return {"error_type": "StickerGenerationError", "details": str(e)}
 
-    def remove_background(self, image_url):
+    def remove_background(self, image_url, tier=None, response_mode="url"):
         """
         Remove the background from the image at the given URL.
 
         :param image_url: URL of the image to be processed.
         :type image_url: str
-        :returns: Dictionary containing the URL of the background-removed image or an error dictionary.
+        :param tier: Quality/latency tier or SAM model type, None for the default backbone.
+        :type tier: str or None
+        :param response_mode: ``url`` to upload the image and return a presigned URL, ``binary`` to return the
+            encoded image without touching S3.
+        :type response_mode: str
+        :returns: Dictionary containing the URL of the background-removed image (or the encoded image), the SAM backbone, the stage timings and the cache outcome or an error dictionary.
         :rtype: dict
         """
         try:
-            timestamp = StickerManager.get_timestamp()
-            image_path = os.path.join(self.img_folder, f"{timestamp}_image.jpg")
-            output_path_background_removed = os.path.join(self.bg_removed_folder, f"{timestamp}_background_removed.png")
+            sam_model_type = self.resolve_sam_model_type(tier)
+            if isinstance(sam_model_type, dict):
+                return sam_model_type
+            error = self._check_response_mode(response_mode)
+            if error:
+                return error
+            if response_mode == "binary":
+                return self._run_binary(
+                    image_url, sam_model_type,
+                    lambda data, report: self._bg_removed_outputs(data, sam_model_type, report, upload=False)
+                )
+            return self._run_cached(
+                image_url, "bg_removed", self._cache_params(sam_model_type, **self.BACKGROUND_REMOVAL_PARAMS),
+                lambda data, report: self._bg_removed_outputs(data, sam_model_type, report)
+            )
+        except Exception as e:
+            return {"error_type": "BackgroundRemovalError", "details": str(e)}
 
-            # Download the image
-            download_result = StickerManager.download_image(image_url, self.img_folder)
-            if isinstance(download_result, dict):
-                return download_result
+    def generate_sticker_and_remove_background(self, image_url, tier=None):
+        """
+        Generate both the sticker and the background-removed image from the image at the given URL.
 
-            image_path = download_result
+        The image is downloaded, detected and segmented once; both outputs are built from
+        the same SAM mask.
 
-            # Predict bounding box
-            bbox = self.predict(image_path)
-            if isinstance(bbox, dict):
-                return bbox
+        :param image_url: URL of the image to be processed.
+        :type image_url: str
+        :param tier: Quality/latency tier or SAM model type, None for the default backbone.
+        :type tier: str or None
+        :returns: Dictionary containing the sticker URL, the background-removed URL, the SAM backbone, the stage timings and the cache outcome or an error dictionary.
+        :rtype: dict
+        """
+        try:
+            sam_model_type = self.resolve_sam_model_type(tier)
+            if isinstance(sam_model_type, dict):
+                return sam_model_type
+            params = self._cache_params(sam_model_type, **self.STICKER_PARAMS, **self.BACKGROUND_REMOVAL_PARAMS)
+            return self._run_cached(
+                image_url, "sticker_and_bg_removed", params,
+                lambda data, report: self._sticker_and_bg_removed_outputs(data, sam_model_type, report)
+            )
+        except Exception as e:
+            return {"error_type": "StickerAndBackgroundRemovalError", "details": str(e)}
 
-            # Ensure bg_removed folder exists
-            self._ensure_directories(self.bg_removed_folder)
+    def _multi_sticker_outputs(self, data, sam_model_type, detect_params, report=None):
+        """
+        Build and upload one sticker per detected object for downloaded image bytes.
 
-            # Remove background
-            bg_remove_result = self.remove_background_and_save(image_path, bbox, output_path_background_removed)
-            if isinstance(bg_remove_result, dict):
-                return bg_remove_result
+        The image is encoded once by SAM and the masks of all objects are decoded from that
+        embedding in one batched prompt pass.
 
-            # Upload background-removed image to S3
-            StickerManager.upload_to_s3(output_path_background_removed, self.s3_bucket_name, f"bg_removed/{timestamp}_background_removed.png", content_type='image/png')
+        :param data: Downloaded image bytes.
+        :type data: bytes
+        :param sam_model_type: SAM backbone computing the masks.
+        :type sam_model_type: str
+        :param detect_params: Keyword arguments of :meth:`detect_objects`.
+        :type detect_params: dict
+        :param report: Dictionary collecting the stage timings and encoded sizes, or None.
+        :type report: dict or None
+        :returns: ``{"objects": [{"s3_key", "bbox", "class_name", "confidence"}, ...]}`` with each box in output image
+            coordinates, or an error dictionary.
+        :rtype: dict
+        """
+        with stage_timer(report, "decode"):
+            image = self.load_image(data)
+        if isinstance(image, dict):
+            return image
 
-            # Generate presigned URL for background-removed image
-            bg_removed_url = StickerManager.generate_presigned_url(self.s3_bucket_name, f"bg_removed/{timestamp}_background_removed.png")
-            if isinstance(bg_removed_url, dict):
-                return bg_removed_url
+        try:
+            with stage_timer(report, "detect"):
+                objects = self.detect_objects(image.working, **detect_params)
+        except Exception as e:
+            return {"error_type": "error", "details": str(e)}
+        if not objects:
+            return {"error_type": "error", "details": "No object detected in the image"}
 
-            # Clean up local files
-            try:
-                StickerManager.clean_local_files(image_path, output_path_background_removed)
-            except Exception as e:
-                print(f"Error cleaning local files: {str(e)}")
+        try:
+            with stage_timer(report, "sam_encode"):
+                embedding = self._get_embedding(image.working, sam_model_type)
+            with stage_timer(report, "sam_decode"):
+                masks = self._decode_masks(embedding, [obj["bbox"] for obj in objects], sam_model_type)
+        except Exception as e:
+            return {"error_type": "Segmentation Error", "details": str(e)}
+
+        outputs = {}
+        try:
+            with stage_timer(report, "compose"):
+                for n, mask in enumerate(masks):
+                    mask = self.upscale_mask(mask, image.output.shape[:2])
+                    rgba_image = self._sticker_rgba(image.output, mask, **self.STICKER_PARAMS)
+                    outputs[n] = (self._encode(rgba_image, f"sticker_{n}", report), self._new_output_key("sticker"))
+        except Exception as e:
+            return {"error_type": "Sticker Generation Error", "details": str(e)}
+
+        # Upload every sticker to S3 concurrently
+        s3_keys = self._upload_outputs(outputs, report)
+        if "error_type" in s3_keys:
+            return s3_keys
+        # Detection ran at working resolution; report the boxes on the image the stickers are composed on
+        return {
+            "objects": [
+                {
+                    "s3_key": s3_keys[n],
+                    **obj,
+                    "bbox": self.scale_bbox(obj["bbox"], image.working.shape[:2], image.output.shape[:2]),
+                }
+                for n, obj in enumerate(objects)
+            ]
+        }
+
+    def _presign_objects(self, result):
+        """
+        Generate presigned URLs for the stickers of a multi-object result.
+
+        :param result: Result of :meth:`_multi_sticker_outputs`.
+        :type result: dict
+        :returns: ``{"stickers": [{"sticker_url", "bbox", "class_name", "confidence"}, ...]}`` or the first error dictionary.
+        :rtype: dict
+        """
+        stickers = []
+        for obj in result["objects"]:
+            url = StickerManager.generate_presigned_url(self.s3_bucket_name, obj["s3_key"])
+            if isinstance(url, dict):
+                return url
+            stickers.append({
+                "sticker_url": url,
+                "bbox": obj["bbox"],
+                "class_name": obj["class_name"],
+                "confidence": obj["confidence"],
+            })
+        return {"stickers": stickers}
+
+    def generate_stickers(self, image_url, max_objects=5, class_names=None, min_confidence=0.25, tier=None):
+        """
+        Generate one sticker per object detected in the image at the given URL.
 
-            return {"bg_removed_url": bg_removed_url}
+        :param image_url: URL of the image to be processed.
+        :type image_url: str
+        :param max_objects: Maximum number of objects, the most confident first.
+        :type max_objects: int
+        :param class_names: YOLO class names to keep, None for all classes.
+        :type class_names: list or None
+        :param min_confidence: Minimum detection confidence.
+        :type min_confidence: float
+        :param tier: Quality/latency tier or SAM model type, None for the default backbone.
+        :type tier: str or None
+        :returns: Dictionary containing one entry per sticker with its URL, box, class and confidence, the SAM
+            backbone, the stage timings and the cache outcome, or an error dictionary.
+        :rtype: dict
+        """
+        try:
+            sam_model_type = self.resolve_sam_model_type(tier)
+            if isinstance(sam_model_type, dict):
+                return sam_model_type
+            class_ids = self.class_ids(class_names) if class_names else None
+            if isinstance(class_ids, dict):
+                return class_ids
+
+            detect_params = {"max_objects": max_objects, "class_ids": class_ids, "min_confidence": min_confidence}
+            params = self._cache_params(
+                sam_model_type, **self.STICKER_PARAMS,
+                **{**detect_params, "class_ids": sorted(class_ids) if class_ids else None}
+            )
+            return self._run_cached(
+                image_url, "stickers", params,
+                lambda data, report: self._multi_sticker_outputs(data, sam_model_type, detect_params, report),
+                presign=self._presign_objects
+            )
+        except Exception as e:
+            return {"error_type": "MultiStickerGenerationError", "details": str(e)}
 
+    def _batch_operation(self, operations, sam_model_type):
+        """
+        Map the requested batch outputs to the result cache operation and parameters.
+
+        :param operations: Requested outputs, a subset of ``BATCH_OPERATIONS``.
+        :type operations: tuple
+        :param sam_model_type: SAM backbone computing the outputs.
+        :type sam_model_type: str
+        :returns: Tuple of (operation name, processing parameters).
+        :rtype: tuple
+        """
+        if operations == ("sticker",):
+            return "sticker", self._cache_params(sam_model_type, **self.STICKER_PARAMS)
+        if operations == ("bg_removed",):
+            return "bg_removed", self._cache_params(sam_model_type, **self.BACKGROUND_REMOVAL_PARAMS)
+        return "sticker_and_bg_removed", self._cache_params(
+            sam_model_type, **self.STICKER_PARAMS, **self.BACKGROUND_REMOVAL_PARAMS
+        )
+
+    def _chunks(self, indexes):
+        for start in range(0, len(indexes), self.bulk_chunk_size):
+            yield indexes[start:start + self.bulk_chunk_size]
+
+    def process_batch(self, image_urls, operations=("sticker",), tier=None):
+        """
+        Run the pipeline for many image URLs at once.
+
+        Images are downloaded concurrently, detected and encoded in batched YOLO and SAM
+        encoder passes of ``bulk_chunk_size`` images, and all outputs are uploaded in
+        parallel. Cached results and duplicate images within the batch are computed once.
+
+        :param image_urls: URLs of the images to be processed.
+        :type image_urls: list
+        :param operations: Outputs to build for every image, any of ``sticker`` and ``bg_removed``.
+        :type operations: list
+        :param tier: Quality/latency tier or SAM model type, None for the default backbone.
+        :type tier: str or None
+        :returns: Dictionary with one result per URL, in order, the SAM backbone and the batch timings, or an error dictionary.
+            Each item is ``{"image_url", "status", "detail"}`` where detail holds the output URLs,
+            the item timings and the cache outcome, or the item's error dictionary.
+        :rtype: dict
+        """
+        try:
+            unknown = [operation for operation in operations if operation not in self.BATCH_OPERATIONS]
+            if unknown or not operations:
+                return {
+                    "error_type": "invalid_operation",
+                    "details": f"Operations must be a non-empty subset of {list(self.BATCH_OPERATIONS)}, got {list(operations)}"
+                }
+            operations = tuple(operation for operation in self.BATCH_OPERATIONS if operation in operations)
+            sam_model_type = self.resolve_sam_model_type(tier)
+            if isinstance(sam_model_type, dict):
+                return sam_model_type
+
+            batch_timings = {}
+            with stage_timer(batch_timings, "total"):
+                items = self._process_batch(list(image_urls), operations, sam_model_type)
+            return {"items": items, "sam_model_type": sam_model_type, "timings": batch_timings}
         except Exception as e:
-            return {"error_type": "BackgroundRemovalError", "details": str(e)}
+            return {"error_type": "BatchProcessingError", "details": str(e)}
+
+    def _process_batch(self, image_urls, operations, sam_model_type):
+        count = len(image_urls)
+        timings = [{} for _ in range(count)]
+        s3_keys = [None] * count
+        outcomes = [None] * count
+        reports = [{} for _ in range(count)]
+        operation, params = self._batch_operation(operations, sam_model_type)
+        if not count:
+            return []
+
+        # Download every image concurrently over the shared connection pool; the batch
+        # waits for the slowest download, so each item reports the wall time of the stage
+        fetch_timings = {}
+        with stage_timer(fetch_timings, "fetch"):
+            contents = self.fetcher.fetch_many(image_urls, max_concurrency=self.fetcher.pool_size)
+        for item_timings in timings:
+            item_timings.update(fetch_timings)
+
+        # Reuse cached results and wait for results being computed by other requests, including
+        # duplicate images within the batch; the images this batch claims are computed once
+        leaders = {}
+        pending = {}
+        for i, data in enumerate(contents):
+            if isinstance(data, dict):
+                s3_keys[i] = data
+                continue
+            key = ResultCache.make_key(data, operation, params)
+            outcomes[i], value = self.result_cache.claim(key)
+            if outcomes[i] == "hit":
+                s3_keys[i] = value
+            elif outcomes[i] == "coalesced":
+                pending[i] = value
+            else:
+                leaders[key] = i
+
+        try:
+            computed = self._compute_batch(
+                list(leaders.values()), contents, operations, timings, sam_model_type, reports
+            )
+        except Exception as e:
+            for key in leaders:
+                self.result_cache.resolve(key, error=e)
+            raise
+        for key, i in leaders.items():
+            s3_keys[i] = computed[i]
+            self.result_cache.resolve(key, computed[i])
+            if len(operations) > 1 and "error_type" not in computed[i]:
+                self._seed_single_results(contents[i], computed[i], sam_model_type)
+        # Waited for only once the claimed keys are resolved, so duplicates within the batch cannot deadlock
+        for i, future in pending.items():
+            try:
+                s3_keys[i] = future.result()
+            except Exception as e:
+                s3_keys[i] = {"error_type": "BatchProcessingError", "details": str(e)}
+
+        items = []
+        for i, image_url in enumerate(image_urls):
+            result = s3_keys[i]
+            if "error_type" not in result:
+                result = self._presign(result)
+            if "error_type" in result:
+                items.append({"image_url": image_url, "status": 0, "detail": result})
+            else:
+                items.append({
+                    "image_url": image_url,
+                    "status": 1,
+                    "detail": {
+                        **result, **self._merge_report(timings[i], reports[i]), "timings": timings[i], "cache": outcomes[i]
+                    }
+                })
+        return items
+
+    def _compute_batch(self, indexes, contents, operations, timings, sam_model_type, reports):
+        """
+        Build and upload the outputs of several downloaded images with batched model passes.
+
+        Timings of a batched pass are attributed to every image that was part of it.
+
+        :param indexes: Positions of the images to compute.
+        :type indexes: list
+        :param contents: Downloaded bytes of every image in the batch.
+        :type contents: list
+        :param operations: Outputs to build.
+        :type operations: tuple
+        :param timings: Per-image stage timings, updated in place.
+        :type timings: list
+        :param sam_model_type: SAM backbone computing the masks.
+        :type sam_model_type: str
+        :param reports: Per-image dictionaries collecting the output encode time and sizes, updated in place.
+        :type reports: list
+        :returns: Mapping of position to a mapping of output name to S3 key, or to an error dictionary.
+        :rtype: dict
+        """
+        results = {}
+        images = {}
+        for i in indexes:
+            with stage_timer(timings[i], "decode"):
+                image = self.load_image(contents[i])
+            if isinstance(image, dict):
+                results[i] = image
+            else:
+                images[i] = image
+
+        # Batched YOLO passes
+        bboxes = {}
+        for chunk in self._chunks(list(images)):
+            chunk_timings = {}
+            try:
+                with stage_timer(chunk_timings, "detect"):
+                    chunk_bboxes = self._detect_batch([images[i].working for i in chunk])
+            except Exception as e:
+                chunk_bboxes = [e] * len(chunk)
+            for i, bbox in zip(chunk, chunk_bboxes):
+                timings[i].update(chunk_timings)
+                if isinstance(bbox, BaseException):
+                    results[i] = {"error_type": "error", "details": str(bbox)}
+                else:
+                    bboxes[i] = bbox
+
+        # Batched SAM encoder passes for images whose embedding is not cached
+        embeddings = {}
+        to_encode = []
+        for i in bboxes:
+            key = EmbeddingCache.image_key(images[i].working, self.backend.embedding_model_id(sam_model_type))
+            embedding = self._cached_embedding(key, sam_model_type)
+            if embedding is None:
+                to_encode.append((i, key))
+            else:
+                embeddings[i] = embedding
+        for chunk in self._chunks(to_encode):
+            chunk_timings = {}
+            try:
+                with stage_timer(chunk_timings, "sam_encode"):
+                    chunk_embeddings = self._encode_batch([images[i].working for i, _ in chunk], sam_model_type)
+            except Exception as e:
+                for i, _ in chunk:
+                    results[i] = {"error_type": "Segmentation Error", "details": str(e)}
+                continue
+            for (i, key), embedding in zip(chunk, chunk_embeddings):
+                timings[i].update(chunk_timings)
+                self._cache_embedding(key, embedding)
+                embeddings[i] = embedding
+
+        # Mask decoding and output composition per image
+        uploads = {}
+        for i, embedding in embeddings.items():
+            try:
+                with stage_timer(timings[i], "sam_decode"):
+                    mask = self._decode_mask(embedding, bboxes[i], sam_model_type)
+                    mask = self.upscale_mask(mask, images[i].output.shape[:2])
+            except Exception as e:
+                results[i] = {"error_type": "Segmentation Error", "details": str(e)}
+                continue
+
+            outputs = {}
+            with stage_timer(timings[i], "compose"):
+                if "sticker" in operations:
+                    outputs["sticker"] = self.process_img(
+                        images[i].output, bboxes[i], mask=mask, report=reports[i], **self.STICKER_PARAMS
+                    )
+                if "bg_removed" in operations:
+                    outputs["bg_removed"] = self.remove_background_and_save(
+                        images[i].output, bboxes[i], mask=mask, report=reports[i], **self.BACKGROUND_REMOVAL_PARAMS
+                    )
+            errors = [output for output in outputs.values() if isinstance(output, dict)]
+            if errors:
+                results[i] = errors[0]
+                continue
+
+            uploads[i] = {
+                name: (data, self._new_output_key(name)) for name, data in outputs.items()
+            }
+
+        # Upload every output of the batch in parallel
+        flat = [(i, name, data, s3_key) for i, outputs in uploads.items() for name, (data, s3_key) in outputs.items()]
+        upload_timings = {}
+        with stage_timer(upload_timings, "upload"):
+            upload_results = StickerManager.upload_many_to_s3(
+                [(data, s3_key, self.encoder.content_type) for _, _, data, s3_key in flat],
+                self.s3_bucket_name
+            )
+        for i in uploads:
+            results[i] = {}
+            timings[i].update(upload_timings)
+        for (i, name, _, s3_key), upload_result in zip(flat, upload_results):
+            if "error_type" in results[i]:
+                continue
+            results[i] = upload_result if isinstance(upload_result, dict) else {**results[i], name: s3_key}
+        return results
@@ -0,0 +1,206 @@
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+# CPU execution techniques of the accelerated mode
+TECHNIQUES = ("inference_mode", "bf16", "channels_last", "compile")
+
+
+class InferenceAccelerator:
+    """
+    CPU execution settings of the SAM image encoder and YOLO.
+
+    The default, without techniques, is the stock eager path: ``torch.no_grad`` and
+    float32. The techniques are:
+
+    - ``inference_mode``: run under ``torch.inference_mode`` instead of ``torch.no_grad``,
+      which also skips view and version-counter tracking
+    - ``bf16``: run the SAM image encoder under bfloat16 autocast; the embedding is cast
+      back to float32 for the mask decoder. Fast on CPUs with AVX512-BF16 or AMX
+    - ``channels_last``: store the convolution weights and inputs of the SAM image encoder
+      and of YOLO in the NHWC layout preferred by oneDNN
+    - ``compile``: compile the SAM image encoder with ``torch.compile``; the first call of
+      each batch size pays for the compilation, which the warmup absorbs
+
+    The eager float32 encoder stays reachable through ``reference=True``, so the
+    accelerated masks can be checked against the default path in the same process; after
+    :meth:`disable` every call takes the default path. torch is imported on first use, so
+    the API process can build the settings without loading it.
+
+    :param techniques: Techniques to enable, any of ``TECHNIQUES``.
+    :type techniques: iterable
+    :param min_iou: Lowest mask IoU against the default path accepted by :meth:`StickerProcessor.verify_acceleration`.
+    :type min_iou: float
+    """
+
+    def __init__(self, techniques=(), min_iou=0.95):
+        """
+        Initialize the accelerator.
+
+        :param techniques: Techniques to enable, any of ``TECHNIQUES``.
+        :type techniques: iterable
+        :param min_iou: Lowest mask IoU against the default path accepted by :meth:`StickerProcessor.verify_acceleration`.
+        :type min_iou: float
+        """
+        techniques = frozenset(techniques)
+        unknown = techniques - set(TECHNIQUES)
+        if unknown:
+            raise ValueError(f"Unknown acceleration techniques {sorted(unknown)}, expected any of {list(TECHNIQUES)}")
+        self.techniques = techniques
+        self.min_iou = min_iou
+        self.active = True
+
+    @classmethod
+    def parse(cls, spec, min_iou=0.95):
+        """
+        Build an accelerator from a comma-separated list of techniques.
+
+        :param spec: e.g. ``inference_mode,bf16``, ``all`` for every technique, or an empty string for none.
+        :type spec: str
+        :param min_iou: Lowest mask IoU against the default path.
+        :type min_iou: float
+        :rtype: InferenceAccelerator
+        """
+        if spec.strip() == "all":
+            return cls(TECHNIQUES, min_iou)
+        return cls((name.strip() for name in spec.split(",") if name.strip()), min_iou)
+
+    def __contains__(self, technique):
+        return self.active and technique in self.techniques
+
+    def disable(self):
+        """
+        Fall back to the default path, e.g. after the masks failed the IoU check.
+        """
+        self.active = False
+
+    def params(self):
+        """
+        Return the techniques in use, for use in cache keys and stats.
+
+        :rtype: dict
+        """
+        return {"acceleration": sorted(self.techniques)} if self.active and self.techniques else {}
+
+    def embedding_model_id(self, sam_model_type):
+        """
+        Return the model id under which embeddings are cached.
+
+        bfloat16 embeddings differ from the float32 ones, so they are cached apart.
+
+        :param sam_model_type: SAM backbone computing the embedding.
+        :type sam_model_type: str
+        :rtype: str
+        """
+        return f"{sam_model_type}+bf16" if "bf16" in self else sam_model_type
+
+    def prepare_sam(self, sam):
+        """
+        Apply the layout and compilation techniques to a loaded SAM model.
+
+        :param sam: SAM model in eval mode.
+        :type sam: segment_anything.modeling.Sam
+        :returns: The same model.
+        :rtype: segment_anything.modeling.Sam
+        """
+        import torch
+
+        if "channels_last" in self:
+            sam.image_encoder.to(memory_format=torch.channels_last)
+        if "compile" in self:
+            # The compiled wrapper keeps the eager module as _orig_mod for the reference path
+            sam.image_encoder = torch.compile(sam.image_encoder)
+        return sam
+
+    def prepare_yolo(self, yolo):
+        """
+        Apply the layout technique to a loaded YOLO model.
+
+        Ultralytics already runs its predictor under ``torch.inference_mode`` with fused
+        convolutions and does not support reduced precision on CPU, so only the memory
+        layout applies.
+
+        :param yolo: Ultralytics YOLO model.
+        :type yolo: ultralytics.YOLO
+        :returns: The same model.
+        :rtype: ultralytics.YOLO
+        """
+        import torch
+
+        if "channels_last" in self:
+            yolo.model.to(memory_format=torch.channels_last)
+        return yolo
+
+    def image_encoder(self, sam, reference=False):
+        """
+        Return the image encoder to run.
+
+        :param sam: SAM model prepared by :meth:`prepare_sam`.
+        :type sam: segment_anything.modeling.Sam
+        :param reference: Whether to return the eager encoder of the default path.
+        :type reference: bool
+        :rtype: torch.nn.Module
+        """
+        if reference or not self.active:
+            return getattr(sam.image_encoder, "_orig_mod", sam.image_encoder)
+        return sam.image_encoder
+
+    def encoder_input(self, batch, reference=False):
+        """
+        Lay out a preprocessed image batch for the image encoder.
+
+        :param batch: Float tensor of shape Bx3xHxW.
+        :type batch: torch.Tensor
+        :param reference: Whether the batch goes through the default path.
+        :type reference: bool
+        :rtype: torch.Tensor
+        """
+        import torch
+
+        if "channels_last" in self and not reference:
+            return batch.contiguous(memory_format=torch.channels_last)
+        return batch
+
+    @contextmanager
+    def encoder_context(self, reference=False):
+        """
+        Context running the SAM image encoder: no autograd and, with ``bf16``, bfloat16 autocast.
+
+        :param reference: Whether to run the default path, ``torch.no_grad`` in float32.
+        :type reference: bool
+        """
+        import torch
+
+        autocast = (
+            torch.autocast("cpu", dtype=torch.bfloat16) if "bf16" in self and not reference else nullcontext()
+        )
+        with self.decoder_context(reference), autocast:
+            yield
+
+    def decoder_context(self, reference=False):
+        """
+        Context running the SAM mask decoder: ``torch.inference_mode`` or ``torch.no_grad``.
+
+        :param reference: Whether to run the default path, ``torch.no_grad``.
+        :type reference: bool
+        """
+        import torch
+
+        if "inference_mode" in self and not reference:
+            return torch.inference_mode()
+        return torch.no_grad()
+
+    @staticmethod
+    def mask_iou(mask, reference):
+        """
+        Intersection over union of two boolean masks; 1.0 if both are empty.
+
+        :param mask: Boolean mask.
+        :type mask: numpy.ndarray
+        :param reference: Boolean mask of the same shape.
+        :type reference: numpy.ndarray
+        :rtype: float
+        """
+        union = np.logical_or(mask, reference).sum()
+        if not union:
+            return 1.0
+        return float(np.logical_and(mask, reference).sum() / union)
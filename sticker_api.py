@@ -1,9 +1,20 @@
-import requests
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Response
+from fastapi.responses import FileResponse
+from typing import List, Optional
 from pydantic import BaseModel
-from sticker import StickerProcessor
+from sticker_executor import StickerExecutor, ExecutorBusyError
+from sticker_workers import call_processor, configure_torch_threads, default_torch_threads, init_worker, load_processor, profile_processor, worker_startup
+from sticker_profiling import ProfileCapture
+from sticker_acceleration import InferenceAccelerator
+from sticker_jobs import JobQueue, QueueFullError
+from sticker_metrics import CONTENT_TYPE, MetricsRegistry, PipelineMetrics, server_timing
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import hmac
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -14,6 +25,98 @@ S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 if not S3_BUCKET_NAME:
     raise ValueError("S3_BUCKET_NAME environment variable not set")
 
+# Size of the worker pool running the blocking pipeline and the number of calls allowed to wait for it
+STICKER_MAX_WORKERS = int(os.getenv("STICKER_MAX_WORKERS", "2"))
+STICKER_MAX_QUEUE = int(os.getenv("STICKER_MAX_QUEUE", "32"))
+
+# Workers are threads sharing one processor, or processes each with its own processor over memory-mapped weights
+STICKER_WORKER_MODE = os.getenv("STICKER_WORKER_MODE", "thread")
+# Torch intra-op threads per worker process (0 = cores split evenly across workers in process mode, torch default in thread mode)
+STICKER_TORCH_THREADS_PER_WORKER = int(os.getenv("STICKER_TORCH_THREADS_PER_WORKER", "0"))
+# Seconds the worker processes have to load their models and report ready before startup fails (process mode)
+STICKER_STARTUP_TIMEOUT = float(os.getenv("STICKER_STARTUP_TIMEOUT", "900"))
+
+# SAM backbones to load as "model_type=checkpoint" pairs, and the tier or model type serving requests without a tier
+SAM_CHECKPOINTS = dict(
+    entry.strip().split("=", 1)
+    for entry in os.getenv("SAM_CHECKPOINTS", "vit_h=sam_vit_h_4b8939.pth").split(",")
+    if entry.strip()
+)
+STICKER_DEFAULT_TIER = os.getenv("STICKER_DEFAULT_TIER", "vit_h")
+
+# Ingest: longest side YOLO and SAM run on, longest side of the outputs (0 = original) and the decompression-bomb pixel limit
+STICKER_MAX_WORKING_SIDE = int(os.getenv("STICKER_MAX_WORKING_SIDE", "1024"))
+STICKER_MAX_OUTPUT_SIDE = int(os.getenv("STICKER_MAX_OUTPUT_SIDE", "0"))
+STICKER_MAX_PIXELS = int(os.getenv("STICKER_MAX_PIXELS", "100000000"))
+
+# Output encoding: format (png or webp), PNG zlib level, WebP mode and quality, and cropping to the object
+STICKER_OUTPUT_FORMAT = os.getenv("STICKER_OUTPUT_FORMAT", "png")
+STICKER_PNG_COMPRESS_LEVEL = int(os.getenv("STICKER_PNG_COMPRESS_LEVEL", "6"))
+STICKER_WEBP_LOSSLESS = os.getenv("STICKER_WEBP_LOSSLESS", "1") not in ("0", "false", "False")
+STICKER_WEBP_QUALITY = int(os.getenv("STICKER_WEBP_QUALITY", "90"))
+STICKER_OUTPUT_CROP = os.getenv("STICKER_OUTPUT_CROP", "0") not in ("0", "false", "False")
+STICKER_OUTPUT_CROP_PADDING = int(os.getenv("STICKER_OUTPUT_CROP_PADDING", "16"))
+
+# CPU acceleration of SAM and YOLO: comma-separated techniques (inference_mode, bf16, channels_last, compile, or all)
+# and the lowest mask IoU against the default path accepted at startup
+STICKER_ACCELERATION = os.getenv("STICKER_ACCELERATION", "")
+STICKER_ACCELERATION_MIN_IOU = float(os.getenv("STICKER_ACCELERATION_MIN_IOU", "0.95"))
+
+# Inference backend (torch, or onnx for the artifacts written by sticker_export.py), the directory of the ONNX
+# artifacts and the intra-op threads of each ONNX Runtime session (0 = ONNX Runtime default)
+STICKER_BACKEND = os.getenv("STICKER_BACKEND", "torch")
+STICKER_ONNX_DIR = os.getenv("STICKER_ONNX_DIR", "onnx")
+STICKER_ONNX_THREADS = int(os.getenv("STICKER_ONNX_THREADS", "0"))
+
+# SamPredictors per SAM backbone sharing its weights, i.e. mask decodes of one backbone run at once
+# (0 = one per worker thread in thread mode, 1 per worker process in process mode)
+STICKER_PREDICTOR_POOL_SIZE = int(os.getenv("STICKER_PREDICTOR_POOL_SIZE", "0"))
+
+# Weight quantization of the SAM image encoder (int8, or empty for float32), for either backend
+STICKER_SAM_QUANTIZATION = os.getenv("STICKER_SAM_QUANTIZATION", "") or None
+
+# Whether to run a warmup inference on a synthetic image before reporting ready
+STICKER_WARMUP = os.getenv("STICKER_WARMUP", "1") not in ("0", "false", "False")
+
+# On-demand profiling: operator token sent in the X-Sticker-Profile header (unset = disabled), fraction of requests
+# profiled at random, artifact directory and retention, and whether torch operators are recorded
+STICKER_PROFILE_TOKEN = os.getenv("STICKER_PROFILE_TOKEN") or None
+STICKER_PROFILE_SAMPLE_RATE = float(os.getenv("STICKER_PROFILE_SAMPLE_RATE", "0"))
+STICKER_PROFILE_DIR = os.getenv("STICKER_PROFILE_DIR", "profiles")
+STICKER_PROFILE_MAX_ARTIFACTS = int(os.getenv("STICKER_PROFILE_MAX_ARTIFACTS", "50"))
+STICKER_PROFILE_TORCH = os.getenv("STICKER_PROFILE_TORCH", "1") not in ("0", "false", "False")
+
+# Micro-batching of concurrent YOLO and SAM encoder calls
+STICKER_BATCH_MAX_SIZE = int(os.getenv("STICKER_BATCH_MAX_SIZE", "4"))
+STICKER_BATCH_MAX_WAIT_MS = float(os.getenv("STICKER_BATCH_MAX_WAIT_MS", "5"))
+
+# SAM image-embedding cache: in-memory LRU budget and optional on-disk tier
+STICKER_EMBEDDING_CACHE_MB = int(os.getenv("STICKER_EMBEDDING_CACHE_MB", "256"))
+STICKER_EMBEDDING_CACHE_DIR = os.getenv("STICKER_EMBEDDING_CACHE_DIR") or None
+STICKER_EMBEDDING_CACHE_DISK_MB = int(os.getenv("STICKER_EMBEDDING_CACHE_DISK_MB", "2048"))
+
+# Image downloads: size cap, timeout and keep-alive pool size
+STICKER_FETCH_MAX_MB = float(os.getenv("STICKER_FETCH_MAX_MB", "20"))
+STICKER_FETCH_TIMEOUT = float(os.getenv("STICKER_FETCH_TIMEOUT", "5"))
+STICKER_FETCH_POOL_SIZE = int(os.getenv("STICKER_FETCH_POOL_SIZE", "20"))
+
+# Result deduplication: number of cached results and their lifetime in seconds (0 = no expiry)
+STICKER_RESULT_CACHE_SIZE = int(os.getenv("STICKER_RESULT_CACHE_SIZE", "10000"))
+STICKER_RESULT_CACHE_TTL = float(os.getenv("STICKER_RESULT_CACHE_TTL", "86400"))
+
+# Batch endpoint: maximum URLs per request and images per batched YOLO/SAM encoder pass
+STICKER_BULK_MAX_ITEMS = int(os.getenv("STICKER_BULK_MAX_ITEMS", "500"))
+STICKER_BULK_CHUNK_SIZE = int(os.getenv("STICKER_BULK_CHUNK_SIZE", "8"))
+
+# Multi-object extraction: maximum number of stickers per image
+STICKER_MAX_OBJECTS = int(os.getenv("STICKER_MAX_OBJECTS", "10"))
+
+# Asynchronous jobs: queue implementation, capacity, workers and how long finished jobs can be polled
+STICKER_JOB_QUEUE = os.getenv("STICKER_JOB_QUEUE", "inprocess")
+STICKER_JOB_MAX_PENDING = int(os.getenv("STICKER_JOB_MAX_PENDING", "100"))
+STICKER_JOB_WORKERS = int(os.getenv("STICKER_JOB_WORKERS", "1"))
+STICKER_JOB_RESULT_TTL = float(os.getenv("STICKER_JOB_RESULT_TTL", "3600"))
+
 
 class ImageRequest(BaseModel):
     """
@@ -21,11 +124,91 @@ class ImageRequest(BaseModel):
 
     **Args:**
         image_url (str): URL of the image to process.
+        tier (str, optional): Quality/latency tier, "fast" (vit_b), "balanced" (vit_l) or "quality" (vit_h), or a SAM model type; the server default if omitted.
 
     **Returns:**
         ImageRequest: An instance of ImageRequest with the provided image URL.
     """
     image_url: str
+    tier: Optional[str] = None
+
+
+class SingleOutputRequest(BaseModel):
+    """
+    Schema for a pipeline returning one image.
+
+    **Args:**
+        image_url (str): URL of the image to process.
+        tier (str, optional): Quality/latency tier or SAM model type; the server default if omitted.
+        response_mode (str): "url" to upload the image to S3 and return a presigned URL, or "binary" to return the encoded PNG/WebP bytes as the response body.
+
+    **Returns:**
+        SingleOutputRequest: An instance of SingleOutputRequest with the provided image URL and response mode.
+    """
+    image_url: str
+    tier: Optional[str] = None
+    response_mode: str = "url"
+
+
+class MultiStickerRequest(BaseModel):
+    """
+    Schema for extracting several objects of one image.
+
+    **Args:**
+        image_url (str): URL of the image to process.
+        tier (str, optional): Quality/latency tier or SAM model type; the server default if omitted.
+        max_objects (int): Maximum number of stickers, the most confident detections first.
+        classes (List[str], optional): YOLO class names to keep, e.g. ["person", "dog"]; all classes if omitted.
+        min_confidence (float): Minimum detection confidence.
+
+    **Returns:**
+        MultiStickerRequest: An instance of MultiStickerRequest with the provided image URL and detection filters.
+    """
+    image_url: str
+    tier: Optional[str] = None
+    max_objects: int = 5
+    classes: Optional[List[str]] = None
+    min_confidence: float = 0.25
+
+
+class BatchRequest(BaseModel):
+    """
+    Schema for a batch of image URLs.
+
+    **Args:**
+        image_urls (List[str]): URLs of the images to process.
+        operations (List[str]): Outputs to build for every image, any of "sticker" and "bg_removed".
+        tier (str, optional): Quality/latency tier or SAM model type for every image; the server default if omitted.
+
+    **Returns:**
+        BatchRequest: An instance of BatchRequest with the provided image URLs and operations.
+    """
+    image_urls: List[str]
+    operations: List[str] = ["sticker"]
+    tier: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    """
+    Schema for an asynchronous job.
+
+    **Args:**
+        operation (str): Pipeline to run: "sticker", "bg_removed", "sticker_and_bg_removed" or "batch".
+        image_url (str, optional): URL of the image to process, for single-image operations.
+        image_urls (List[str], optional): URLs of the images to process, for "batch".
+        operations (List[str], optional): Outputs to build for "batch", any of "sticker" and "bg_removed".
+        tier (str, optional): Quality/latency tier or SAM model type; the server default if omitted.
+        callback_url (str, optional): URL that receives a POST with the job record when the job completes.
+
+    **Returns:**
+        JobRequest: An instance of JobRequest with the provided job parameters.
+    """
+    operation: str = "sticker"
+    image_url: Optional[str] = None
+    image_urls: Optional[List[str]] = None
+    operations: List[str] = ["sticker"]
+    tier: Optional[str] = None
+    callback_url: Optional[str] = None
 
 
 class StickerAPI:
@@ -50,14 +233,99 @@ class StickerAPI:
             None
         """
         self.s3_bucket_name = s3_bucket_name
-        self.processor = StickerProcessor(
-            yolo_model_path="yolov8n.pt",
-            sam_checkpoint_path="sam_vit_h_4b8939.pth",
-            sam_model_type="vit_h",
-            s3_bucket_name=self.s3_bucket_name
+        settings = {
+            "yolo_model_path": "yolov8n.pt",
+            "sam_checkpoint_path": None,
+            "sam_model_type": STICKER_DEFAULT_TIER,
+            "sam_checkpoints": SAM_CHECKPOINTS,
+            "s3_bucket_name": self.s3_bucket_name,
+            "batch_max_size": STICKER_BATCH_MAX_SIZE,
+            "batch_max_wait_ms": STICKER_BATCH_MAX_WAIT_MS,
+            "embedding_cache": {
+                "max_bytes": STICKER_EMBEDDING_CACHE_MB * 1024 * 1024,
+                "disk_dir": STICKER_EMBEDDING_CACHE_DIR,
+                "disk_max_bytes": STICKER_EMBEDDING_CACHE_DISK_MB * 1024 * 1024
+            },
+            "fetcher": {
+                "max_bytes": int(STICKER_FETCH_MAX_MB * 1024 * 1024),
+                "timeout": STICKER_FETCH_TIMEOUT,
+                "pool_size": STICKER_FETCH_POOL_SIZE
+            },
+            "result_cache": {
+                "max_entries": STICKER_RESULT_CACHE_SIZE,
+                "ttl_seconds": STICKER_RESULT_CACHE_TTL
+            },
+            "bulk_chunk_size": STICKER_BULK_CHUNK_SIZE,
+            "max_working_side": STICKER_MAX_WORKING_SIDE,
+            "max_output_side": STICKER_MAX_OUTPUT_SIDE,
+            "max_pixels": STICKER_MAX_PIXELS,
+            "encoder": {
+                "output_format": STICKER_OUTPUT_FORMAT,
+                "png_compress_level": STICKER_PNG_COMPRESS_LEVEL,
+                "webp_lossless": STICKER_WEBP_LOSSLESS,
+                "webp_quality": STICKER_WEBP_QUALITY,
+                "crop": STICKER_OUTPUT_CROP,
+                "crop_padding": STICKER_OUTPUT_CROP_PADDING
+            },
+            "accelerator": {
+                "techniques": sorted(InferenceAccelerator.parse(STICKER_ACCELERATION).techniques),
+                "min_iou": STICKER_ACCELERATION_MIN_IOU
+            },
+            # None loads the PyTorch models from the paths above
+            "backend": {
+                "name": "onnx",
+                "model_dir": STICKER_ONNX_DIR,
+                "sam_model_types": list(SAM_CHECKPOINTS),
+                "intra_op_threads": STICKER_ONNX_THREADS,
+                "quantization": STICKER_SAM_QUANTIZATION
+            } if STICKER_BACKEND == "onnx" else None,
+            "sam_quantization": STICKER_SAM_QUANTIZATION,
+            "predictor_pool_size": STICKER_PREDICTOR_POOL_SIZE or (1 if STICKER_WORKER_MODE == "process" else STICKER_MAX_WORKERS)
+        }
+        self.settings = settings
+        # Models are loaded in the background once the server is up; see load_models
+        self.processor = None
+        self.ready = threading.Event()
+        self.startup = {"state": "loading", "phases": {}, "error": None}
+        if STICKER_WORKER_MODE == "process":
+            # Every worker process loads its own processor; the API process loads no models
+            torch_threads = STICKER_TORCH_THREADS_PER_WORKER or default_torch_threads(STICKER_MAX_WORKERS)
+            self.executor = StickerExecutor(
+                max_workers=STICKER_MAX_WORKERS,
+                max_queue=STICKER_MAX_QUEUE,
+                mode="process",
+                initializer=init_worker,
+                initargs=(settings, torch_threads, STICKER_WARMUP)
+            )
+        else:
+            self.executor = StickerExecutor(max_workers=STICKER_MAX_WORKERS, max_queue=STICKER_MAX_QUEUE)
+        self.job_pipelines = {
+            "sticker": "generate_sticker",
+            "bg_removed": "remove_background",
+            "sticker_and_bg_removed": "generate_sticker_and_remove_background",
+        }
+        self.jobs = JobQueue.load(
+            STICKER_JOB_QUEUE,
+            self.run_job,
+            max_pending=STICKER_JOB_MAX_PENDING,
+            workers=STICKER_JOB_WORKERS,
+            result_ttl=STICKER_JOB_RESULT_TTL
         )
+        self.profile_settings = {
+            "directory": STICKER_PROFILE_DIR,
+            "torch_profiler": STICKER_PROFILE_TORCH,
+            "max_artifacts": STICKER_PROFILE_MAX_ARTIFACTS
+        }
+        self.profiler = ProfileCapture(**self.profile_settings)
+        self.metrics_registry = MetricsRegistry()
+        self.metrics = PipelineMetrics(self.metrics_registry)
+        self.setup_gauges()
         self.app = FastAPI(title="BG Remove & Sticker Generation API")
         self.setup_routes()
+        self.app.on_event("startup")(self.start_loading)
+        self.app.on_event("shutdown")(self.jobs.shutdown)
+        self.app.on_event("shutdown")(self.executor.shutdown)
+        self.app.on_event("shutdown")(self.close_processor)
 
         # Allow all origins (CORS)
         self.app.add_middleware(
@@ -77,111 +345,771 @@ class StickerAPI:
         """
         self.app.post("/generate-sticker/")(self.generate_sticker_api)
         self.app.post("/remove-background/")(self.remove_background_api)
+        self.app.post("/generate-sticker-and-remove-background/")(self.generate_sticker_and_remove_background_api)
+        self.app.post("/generate-stickers/")(self.generate_stickers_api)
+        self.app.post("/batch/")(self.batch_api)
+        self.app.post("/jobs/")(self.submit_job_api)
+        self.app.get("/jobs/{job_id}")(self.job_status_api)
+        self.app.get("/stats/")(self.stats_api)
+        self.app.get("/metrics")(self.metrics_api)
+        self.app.get("/profiles/")(self.profiles_api)
+        self.app.get("/profiles/{file_name}")(self.profile_artifact_api)
+        self.app.get("/healthz")(self.healthz_api)
+        self.app.get("/readyz")(self.readyz_api)
 
-    def is_valid_url(self, url: str) -> bool:
+    def setup_gauges(self):
         """
-        Check the validity of a URL by sending a HEAD request.
+        Register the gauges mirroring the readiness, the executor and job queue depths and, in thread mode, the caches.
 
-        **Args:**
-            url (str): The URL to be checked.
+        The gauges are read from the components when ``GET /metrics`` is scraped.
+
+        **Returns:**
+            None
+        """
+        registry = self.metrics_registry
+        ready = registry.gauge("sticker_ready", "1 once the models are loaded and warmed up.")
+        executor_calls = registry.gauge("sticker_executor_calls", "Pipeline calls running or waiting for a worker.", ("state",))
+        job_queue = registry.gauge("sticker_jobs", "Jobs by state.", ("state",))
+        embedding_cache = registry.gauge("sticker_embedding_cache", "SAM embedding cache usage (thread mode).", ("field",))
+        result_cache = registry.gauge("sticker_result_cache_entries", "Cached pipeline results (thread mode).")
+        batcher_pending = registry.gauge(
+            "sticker_batcher_pending", "Calls waiting for a batched model pass (thread mode).", ("model",)
+        )
+        pool_in_use = registry.gauge(
+            "sticker_predictor_pool_in_use", "SamPredictors checked out of each backbone's pool (thread mode).", ("model",)
+        )
+        pool_wait = registry.gauge(
+            "sticker_predictor_pool_wait_seconds", "Average and maximum wait for a free SamPredictor (thread mode).",
+            ("model", "stat")
+        )
+
+        def collect():
+            ready.set(int(self.ready.is_set()))
+            executor = self.executor.stats()
+            executor_calls.set(executor["in_flight"], state="in_flight")
+            executor_calls.set(executor["queued"], state="queued")
+            jobs = self.jobs.stats()
+            job_queue.set(jobs["pending"], state="pending")
+            for state, count in jobs.get("states", {}).items():
+                job_queue.set(count, state=state)
+            if self.processor is None:
+                return
+            stats = self.processor.stats()
+            for field in ("entries", "bytes", "disk_bytes"):
+                embedding_cache.set(stats["embedding_cache"][field], field=field)
+            result_cache.set(stats["result_cache"]["entries"])
+            batcher_pending.set(stats["yolo_batching"]["pending"], model="yolo")
+            for model_type, batching in stats["sam_encoder_batching"].items():
+                batcher_pending.set(batching["pending"], model=f"sam_{model_type}")
+            for model_type, pool in stats["backend"].get("predictor_pools", {}).items():
+                pool_in_use.set(pool["in_use"], model=f"sam_{model_type}")
+                pool_wait.set(pool["avg_wait_ms"] / 1000.0, model=f"sam_{model_type}", stat="avg")
+                pool_wait.set(pool["max_wait_ms"] / 1000.0, model=f"sam_{model_type}", stat="max")
+
+        registry.add_collector(collect)
+
+    def start_loading(self):
+        """
+        Start loading the models on a background thread so the server accepts connections right away.
 
         **Returns:**
-            bool: True if the URL is reachable, False otherwise.
+            None
+        """
+        threading.Thread(target=self.load_models, name="sticker-model-loader", daemon=True).start()
+
+    def load_models(self):
+        """
+        Load and warm up the models, recording the duration of each startup phase.
+
+        In thread mode the processor of the API process is loaded. In process mode every
+        worker process loads its own processor and the phases of each worker are reported.
+
+        **Returns:**
+            None
         """
+        start = time.perf_counter()
         try:
-            response = requests.head(url, timeout=5)
-            return response.status_code == 200
-        except Exception:
-            return False
+            if self.executor.mode == "process":
+                # A worker process runs its initializer before taking a call, but a worker that
+                # is ready first may answer several calls, so ask until every pid has answered
+                deadline = start + STICKER_STARTUP_TIMEOUT
+                workers = {}
+                while len(workers) < self.executor.max_workers:
+                    if time.perf_counter() >= deadline:
+                        missing = [pid for pid in self.executor.worker_pids() if pid not in workers]
+                        self.startup.update(
+                            state="failed",
+                            error=f"{self.executor.max_workers - len(workers)} of {self.executor.max_workers} worker "
+                                  f"processes did not report ready within {STICKER_STARTUP_TIMEOUT:g}s",
+                            missing_workers=missing
+                        )
+                        print({"error_type": "Model_Load_Error", "details": self.startup["error"], "missing_workers": missing})
+                        return
+                    if workers:
+                        time.sleep(0.5)
+                    futures = [self.executor.submit(worker_startup) for _ in range(self.executor.max_workers)]
+                    for future in futures:
+                        try:
+                            startup = future.result(timeout=max(deadline - time.perf_counter(), 0))
+                        except FutureTimeoutError:
+                            break
+                        workers[startup["pid"]] = startup
+                phases = {"workers": list(workers.values())}
+            else:
+                configure_torch_threads(STICKER_TORCH_THREADS_PER_WORKER)
+                self.processor, phases = load_processor(self.settings, warmup=STICKER_WARMUP)
+        except Exception as e:
+            self.startup.update(state="failed", error=str(e))
+            print({"error_type": "Model_Load_Error", "details": str(e)})
+            return
+        finally:
+            self.startup["time_to_ready_ms"] = (time.perf_counter() - start) * 1000.0
 
-    async def generate_sticker_api(self, image_request: ImageRequest):
+        self.startup.update(state="ready", phases=phases)
+        self.ready.set()
+        print({"startup": self.startup})
+
+    def close_processor(self):
+        """
+        Close the connection pool of the processor, if it was loaded.
+
+        **Returns:**
+            None
+        """
+        if self.processor is not None:
+            self.processor.fetcher.close()
+
+    def not_ready_error(self) -> dict:
+        """
+        Build the error returned while the models are not loaded.
+
+        **Returns:**
+            dict: {"error_type": "model_not_ready", "details": "<reason>"}
+        """
+        if self.startup["state"] == "failed":
+            details = f"Model loading failed: {self.startup['error']}"
+        else:
+            details = "The models are still loading, retry shortly."
+        return {
+            "error_type": "model_not_ready",
+            "details": details
+        }
+
+    def should_profile(self, token: Optional[str]) -> bool:
+        """
+        Decide whether a request is profiled: the operator token was sent, or the request was sampled.
+
+        **Args:**
+            token (str, optional): Value of the X-Sticker-Profile header.
+
+        **Returns:**
+            bool: True if the request is profiled.
+        """
+        if token is not None and STICKER_PROFILE_TOKEN is not None:
+            if hmac.compare_digest(token, STICKER_PROFILE_TOKEN):
+                return True
+        return STICKER_PROFILE_SAMPLE_RATE > 0 and random.random() < STICKER_PROFILE_SAMPLE_RATE
+
+    def operator_error(self, token: Optional[str]) -> Optional[dict]:
+        """
+        Check the operator token of a profiling endpoint.
+
+        **Args:**
+            token (str, optional): Value of the X-Sticker-Profile header.
+
+        **Returns:**
+            dict: None if the token is valid, otherwise {"error_type": "profiling_disabled" | "forbidden", "details": "<reason>"}
+        """
+        if STICKER_PROFILE_TOKEN is None:
+            return {
+                "error_type": "profiling_disabled",
+                "details": "Set STICKER_PROFILE_TOKEN to enable the profiling endpoints."
+            }
+        if token is None or not hmac.compare_digest(token, STICKER_PROFILE_TOKEN):
+            return {
+                "error_type": "forbidden",
+                "details": "A valid operator token is required in the X-Sticker-Profile header."
+            }
+        return None
+
+    async def run(self, method: str, *args, profile: bool = False):
+        """
+        Run a processor method on the executor without blocking the event loop.
+
+        **Args:**
+            method (str): Name of the StickerProcessor method, e.g. "generate_sticker".
+            args: Arguments of the method.
+            profile (bool): Whether to capture Python and torch profiles of the call.
+
+        **Returns:**
+            The return value of the method, or a model_not_ready error dictionary while the models are loading.
+
+        **Raises:**
+            ExecutorBusyError: If the executor queue is full.
+        """
+        if not self.ready.is_set():
+            return self.not_ready_error()
+        if self.executor.mode == "process":
+            if profile:
+                return await self.executor.run(profile_processor, self.profile_settings, method, *args)
+            return await self.executor.run(call_processor, method, *args)
+        if profile:
+            return await self.executor.run(self.profiler.run, method, getattr(self.processor, method), *args)
+        return await self.executor.run(getattr(self.processor, method), *args)
+
+    def call(self, method: str, *args):
+        """
+        Run a processor method on the executor and wait for it; used off the event loop.
+
+        Waits for the models to finish loading first. Like :meth:`run`, the call takes a
+        worker of the executor, so jobs share the same concurrency limit as the endpoints.
+
+        **Args:**
+            method (str): Name of the StickerProcessor method, e.g. "generate_sticker".
+            args: Arguments of the method.
+
+        **Returns:**
+            The return value of the method, or a model_not_ready error dictionary if loading failed.
+
+        **Raises:**
+            ExecutorBusyError: If the executor queue is full.
+        """
+        while not self.ready.wait(timeout=1.0):
+            if self.startup["state"] == "failed":
+                return self.not_ready_error()
+        if self.executor.mode == "process":
+            return self.executor.submit(call_processor, method, *args).result()
+        return self.executor.submit(getattr(self.processor, method), *args).result()
+
+    def busy_response(self, endpoint: str, error: ExecutorBusyError) -> dict:
+        """
+        Build the error response returned when the executor cannot accept more work, and count the rejection.
+
+        **Args:**
+            endpoint (str): Name of the pipeline that was rejected.
+            error (ExecutorBusyError): The rejection raised by the executor.
+
+        **Returns:**
+            dict: {"status": 0, "detail": {"error_type": "server_busy", "details": "<reason>"}}
+        """
+        detail = {
+            "error_type": "server_busy",
+            "details": str(error)
+        }
+        self.metrics.observe(endpoint, detail)
+        return {
+            "status": 0,
+            "detail": detail
+        }
+
+    def record(self, endpoint: str, result: dict, response: Optional[Response] = None):
+        """
+        Record the metrics of a pipeline result and add its stage breakdown as a Server-Timing header.
+
+        **Args:**
+            endpoint (str): Name of the pipeline, e.g. "generate_sticker".
+            result (dict): The processor result or an error dictionary.
+            response (Response, optional): Response receiving the Server-Timing header.
+
+        **Returns:**
+            None
+        """
+        self.metrics.observe(endpoint, result)
+        if response is not None and result.get("timings"):
+            response.headers["Server-Timing"] = server_timing(result["timings"])
+
+    @staticmethod
+    def pipeline_response(result: dict, *url_keys: str) -> dict:
+        """
+        Build the API response from the result of a processor pipeline.
+
+        **Args:**
+            result (dict): The processor result, either the output URLs and timings or an error dictionary.
+            url_keys (str): Keys of the output URLs to return.
+
+        **Returns:**
+            dict: {"status": 1, "detail": {<url_key>: url, ..., "sam_model_type": ..., "encoded_bytes": {...}, "timings": {...}, "cache": "hit" | "miss" | "coalesced", "profile": {...}}} or {"status": 0, "detail": result}
+        """
+        # If there's an error during processing, return it
+        if isinstance(result, dict) and "error_type" in result:
+            return {
+                "status": 0,
+                "detail": result
+            }
+
+        detail = {key: result[key] for key in url_keys}
+        detail["sam_model_type"] = result.get("sam_model_type")
+        if "encoded_bytes" in result:
+            detail["encoded_bytes"] = result["encoded_bytes"]
+        detail["timings"] = result.get("timings", {})
+        if "cache" in result:
+            detail["cache"] = result["cache"]
+        if "profile" in result:
+            detail["profile"] = result["profile"]
+        return {
+            "status": 1,
+            "detail": detail
+        }
+
+    @staticmethod
+    def binary_response(result: dict, response: Response) -> Response:
+        """
+        Build the response carrying the encoded image of a binary-mode pipeline result.
+
+        **Args:**
+            result (dict): The processor result with the encoded image and its content type.
+            response (Response): Response holding the Server-Timing header set by record.
+
+        **Returns:**
+            Response: The image bytes with their Content-Type and Content-Length, the Server-Timing header, the SAM backbone in X-Sticker-Model and, for a profiled request, the capture id in X-Sticker-Profile-Id.
+        """
+        headers = {"X-Sticker-Model": result["sam_model_type"]}
+        if "server-timing" in response.headers:
+            headers["Server-Timing"] = response.headers["server-timing"]
+        if "profile" in result:
+            headers["X-Sticker-Profile-Id"] = result["profile"].get("id", "skipped")
+        return Response(content=result["content"], media_type=result["content_type"], headers=headers)
+
+    async def generate_sticker_api(self, image_request: SingleOutputRequest, response: Response,
+                                   x_sticker_profile: Optional[str] = Header(default=None)):
         """
         API endpoint to generate a sticker with the given image URL.
 
         **Args:**
-            image_request (ImageRequest): Request body containing the image URL.
+            image_request (SingleOutputRequest): Request body containing the image URL and the response mode.
+            response (Response): Response receiving the Server-Timing header with the stage breakdown.
+            x_sticker_profile (str, optional): Operator token requesting a profile of this request.
 
         **Returns:**
             dict: A dictionary with the status and either the sticker URL or error details.
 
-                - If successful, returns {"status": 1, "detail": {"sticker_url": sticker_url}}
+                - If successful, returns {"status": 1, "detail": {"sticker_url": sticker_url, "timings": {"fetch_ms": ...}}}
+
+                - If successful with response_mode "binary", returns the encoded sticker as the response body instead
 
-                - If the URL is invalid or inaccessible, returns {"status": 0, "detail": {"error_type": "InvalidURL", "details": "The provided image URL is not reachable or invalid."}}
+                - If the URL is invalid or inaccessible, returns {"status": 0, "detail": {"error_type": "invalid_url", "details": "The provided image URL is not reachable or invalid. <reason>"}}
 
                 - If there is an error during processing, returns {"status": 0, "detail": result}
 
                 - For unexpected exceptions, returns {"status": 0, "detail": {"error_type": "StickerGenerationError", "details": "<Exception message>"}}
         """
-        # Validate the image URL first
-        if not self.is_valid_url(image_request.image_url):
+        try:
+            result = await self.run(
+                "generate_sticker", image_request.image_url, image_request.tier, image_request.response_mode,
+                profile=self.should_profile(x_sticker_profile)
+            )
+        except ExecutorBusyError as e:
+            return self.busy_response("generate_sticker", e)
+
+        self.record("generate_sticker", result, response)
+        if "content" in result:
+            return self.binary_response(result, response)
+        return self.pipeline_response(result, "sticker_url")
+
+    async def remove_background_api(self, image_request: SingleOutputRequest, response: Response,
+                                    x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint to remove the background from the image with the given image URL.
+
+        **Args:**
+            image_request (SingleOutputRequest): Request body containing the image URL and the response mode.
+            response (Response): Response receiving the Server-Timing header with the stage breakdown.
+            x_sticker_profile (str, optional): Operator token requesting a profile of this request.
+
+        **Returns:**
+            dict: A dictionary with the status and either the background-removed URL or error details.
+
+                - If successful, returns {"status": 1, "detail": {"bg_removed_url": bg_removed_url, "timings": {"fetch_ms": ...}}}
+
+                - If successful with response_mode "binary", returns the encoded image as the response body instead
+
+                - If the URL is invalid or inaccessible, returns {"status": 0, "detail": {"error_type": "invalid_url", "details": "The provided image URL is not reachable or invalid. <reason>"}}
+
+                - If there is an error during processing, returns {"status": 0, "detail": result}
+
+                - For unexpected exceptions, returns {"status": 0, "detail": {"error_type": "BackgroundRemovalError", "details": "<Exception message>"}}
+        """
+        try:
+            result = await self.run(
+                "remove_background", image_request.image_url, image_request.tier, image_request.response_mode,
+                profile=self.should_profile(x_sticker_profile)
+            )
+        except ExecutorBusyError as e:
+            return self.busy_response("remove_background", e)
+
+        self.record("remove_background", result, response)
+        if "content" in result:
+            return self.binary_response(result, response)
+        return self.pipeline_response(result, "bg_removed_url")
+
+    async def generate_sticker_and_remove_background_api(self, image_request: ImageRequest, response: Response,
+                                                         x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint to generate the sticker and the background-removed image in a single pass.
+
+        The image is downloaded, detected and segmented once and both outputs are built
+        from the same mask.
+
+        **Args:**
+            image_request (ImageRequest): Request body containing the image URL.
+            response (Response): Response receiving the Server-Timing header with the stage breakdown.
+            x_sticker_profile (str, optional): Operator token requesting a profile of this request.
+
+        **Returns:**
+            dict: A dictionary with the status and either both URLs or error details.
+
+                - If successful, returns {"status": 1, "detail": {"sticker_url": sticker_url, "bg_removed_url": bg_removed_url, "timings": {...}}}
+
+                - If the URL is invalid or inaccessible, returns {"status": 0, "detail": {"error_type": "invalid_url", "details": "The provided image URL is not reachable or invalid. <reason>"}}
+
+                - If there is an error during processing, returns {"status": 0, "detail": result}
+        """
+        try:
+            result = await self.run(
+                "generate_sticker_and_remove_background", image_request.image_url, image_request.tier,
+                profile=self.should_profile(x_sticker_profile)
+            )
+        except ExecutorBusyError as e:
+            return self.busy_response("generate_sticker_and_remove_background", e)
+
+        self.record("generate_sticker_and_remove_background", result, response)
+        return self.pipeline_response(result, "sticker_url", "bg_removed_url")
+
+    async def generate_stickers_api(self, request: MultiStickerRequest, response: Response,
+                                    x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint to generate one sticker per object detected in the image with the given URL.
+
+        The image is encoded by SAM once and the masks of all objects are decoded from that
+        embedding in one batched prompt pass. Each ``bbox`` is in the coordinates of the original
+        image, or of the downsized output image when ``STICKER_MAX_OUTPUT_SIDE`` applies.
+
+        **Args:**
+            request (MultiStickerRequest): Request body containing the image URL and detection filters.
+            response (Response): Response receiving the Server-Timing header with the stage breakdown.
+            x_sticker_profile (str, optional): Operator token requesting a profile of this request.
+
+        **Returns:**
+            dict: A dictionary with the status and either the stickers or error details.
+
+                - If successful, returns {"status": 1, "detail": {"stickers": [{"sticker_url": ..., "bbox": [x1, y1, x2, y2], "class_name": ..., "confidence": ...}, ...], "sam_model_type": ..., "timings": {...}, "cache": ...}}
+
+                - If max_objects is out of range, returns {"status": 0, "detail": {"error_type": "invalid_max_objects", "details": "<reason>"}}
+
+                - If a class name is unknown, returns {"status": 0, "detail": {"error_type": "invalid_class", "details": "<reason>"}}
+
+                - If there is an error during processing, returns {"status": 0, "detail": result}
+        """
+        if not 1 <= request.max_objects <= STICKER_MAX_OBJECTS:
+            return {
+                "status": 0,
+                "detail": {
+                    "error_type": "invalid_max_objects",
+                    "details": f"max_objects must be between 1 and {STICKER_MAX_OBJECTS}, got {request.max_objects}."
+                }
+            }
+
+        try:
+            result = await self.run(
+                "generate_stickers", request.image_url, request.max_objects, request.classes,
+                request.min_confidence, request.tier, profile=self.should_profile(x_sticker_profile)
+            )
+        except ExecutorBusyError as e:
+            return self.busy_response("generate_stickers", e)
+
+        self.record("generate_stickers", result, response)
+        return self.pipeline_response(result, "stickers")
+
+    async def batch_api(self, batch_request: BatchRequest, response: Response,
+                        x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint to process many image URLs in one request.
+
+        Images are downloaded concurrently, run through batched YOLO and SAM encoder passes
+        and uploaded in parallel. Each item succeeds or fails on its own.
+
+        **Args:**
+            batch_request (BatchRequest): Request body containing the image URLs and operations.
+            response (Response): Response receiving the Server-Timing header with the batch timings.
+            x_sticker_profile (str, optional): Operator token requesting a profile of this batch.
+
+        **Returns:**
+            dict: A dictionary with the status and either the per-item results or error details.
+
+                - If the batch ran, returns {"status": 1, "detail": {"items": [{"image_url": ..., "status": 1, "detail": {"sticker_url": ..., "timings": {...}, "cache": ...}}, {"image_url": ..., "status": 0, "detail": {"error_type": ..., "details": ...}}, ...], "timings": {"total_ms": ...}}}
+
+                - If the batch is too large, returns {"status": 0, "detail": {"error_type": "batch_too_large", "details": "<reason>"}}
+
+                - If the operations are invalid, returns {"status": 0, "detail": {"error_type": "invalid_operation", "details": "<reason>"}}
+        """
+        if len(batch_request.image_urls) > STICKER_BULK_MAX_ITEMS:
             return {
                 "status": 0,
                 "detail": {
-                    "error_type": "invalid_url",
-                    "details": "The provided image URL is not reachable or invalid."
+                    "error_type": "batch_too_large",
+                    "details": f"A batch may contain at most {STICKER_BULK_MAX_ITEMS} image URLs, got {len(batch_request.image_urls)}."
                 }
             }
 
-        # If URL is valid, proceed to generate sticker
-        result = self.processor.generate_sticker(image_request.image_url)
+        try:
+            result = await self.run(
+                "process_batch", batch_request.image_urls, batch_request.operations, batch_request.tier,
+                profile=self.should_profile(x_sticker_profile)
+            )
+        except ExecutorBusyError as e:
+            return self.busy_response("batch", e)
 
-        # If there's an error during processing, return it
-        if isinstance(result, dict) and "error_type" in result:
+        if "error_type" in result:
+            self.metrics.observe("batch", result)
             return {
                 "status": 0,
                 "detail": result
             }
+        for item in result["items"]:
+            self.metrics.observe("batch", item["detail"])
+        if result.get("timings"):
+            response.headers["Server-Timing"] = server_timing(result["timings"])
 
         return {
             "status": 1,
-            "detail": {
-                "sticker_url": result["sticker_url"]
-            }
+            "detail": result
         }
 
-    async def remove_background_api(self, image_request: ImageRequest):
+    def run_job(self, operation: str, payload: dict) -> dict:
         """
-        API endpoint to remove the background from the image with the given image URL.
+        Run a queued job; called on a job queue worker.
 
         **Args:**
-            image_request (ImageRequest): Request body containing the image URL.
+            operation (str): Pipeline to run.
+            payload (dict): Arguments of the pipeline.
 
         **Returns:**
-            dict: A dictionary with the status and either the background-removed URL or error details.
+            dict: The pipeline result or an error dictionary.
+        """
+        if operation == "batch":
+            result = self.call("process_batch", payload["image_urls"], payload["operations"], payload["tier"])
+            for item in result.get("items", []):
+                self.metrics.observe("job_batch", item["detail"])
+            return result
+        result = self.call(self.job_pipelines[operation], payload["image_url"], payload["tier"])
+        self.metrics.observe(f"job_{self.job_pipelines[operation]}", result)
+        return result
 
-                - If successful, returns {"status": 1, "detail": {"bg_removed_url": bg_removed_url}}
+    async def submit_job_api(self, job_request: JobRequest):
+        """
+        API endpoint to submit a job and return immediately with its id.
 
-                - If the URL is invalid or inaccessible, returns {"status": 0, "detail": {"error_type": "InvalidURL", "details": "The provided image URL is not reachable or invalid."}}
+        **Args:**
+            job_request (JobRequest): Request body containing the operation, its inputs and an optional callback URL.
 
-                - If there is an error during processing, returns {"status": 0, "detail": result}
+        **Returns:**
+            dict: A dictionary with the status and either the job id or error details.
 
-                - For unexpected exceptions, returns {"status": 0, "detail": {"error_type": "BackgroundRemovalError", "details": "<Exception message>"}}
+                - If the job was queued, returns {"status": 1, "detail": {"job_id": job_id, "state": "queued"}}
+
+                - If the request is invalid, returns {"status": 0, "detail": {"error_type": "invalid_job", "details": "<reason>"}}
+
+                - If the queue is full, returns {"status": 0, "detail": {"error_type": "queue_full", "details": "<reason>"}}
         """
-        # Validate the image URL first
-        if not self.is_valid_url(image_request.image_url):
+        if job_request.operation == "batch":
+            if not job_request.image_urls:
+                error = "A batch job needs image_urls."
+            elif len(job_request.image_urls) > STICKER_BULK_MAX_ITEMS:
+                error = f"A batch may contain at most {STICKER_BULK_MAX_ITEMS} image URLs."
+            else:
+                error = None
+            payload = {"image_urls": job_request.image_urls, "operations": job_request.operations, "tier": job_request.tier}
+        elif job_request.operation in self.job_pipelines:
+            error = None if job_request.image_url else f"A {job_request.operation} job needs image_url."
+            payload = {"image_url": job_request.image_url, "tier": job_request.tier}
+        else:
+            error = f"Unknown operation {job_request.operation!r}, expected one of {[*self.job_pipelines, 'batch']}."
+            payload = None
+
+        if error:
             return {
                 "status": 0,
                 "detail": {
-                    "error_type": "invalid_url",
-                    "details": "The provided image URL is not reachable or invalid."
+                    "error_type": "invalid_job",
+                    "details": error
                 }
             }
 
-        # If URL is valid, proceed to remove background
-        result = self.processor.remove_background(image_request.image_url)
+        try:
+            job_id = self.jobs.submit(job_request.operation, payload, job_request.callback_url)
+        except QueueFullError as e:
+            return {
+                "status": 0,
+                "detail": {
+                    "error_type": "queue_full",
+                    "details": str(e)
+                }
+            }
 
-        # If there's an error during processing, return it
-        if isinstance(result, dict) and "error_type" in result:
+        return {
+            "status": 1,
+            "detail": {
+                "job_id": job_id,
+                "state": "queued"
+            }
+        }
+
+    async def job_status_api(self, job_id: str):
+        """
+        API endpoint to poll the state of a job.
+
+        **Args:**
+            job_id (str): Id returned when the job was submitted.
+
+        **Returns:**
+            dict: A dictionary with the status and either the job record or error details.
+
+                - If the job is known, returns {"status": 1, "detail": {"job_id": ..., "state": "queued" | "running" | "finished" | "failed", "result": {...}, ...}}
+
+                - If the job is unknown or expired, returns {"status": 0, "detail": {"error_type": "job_not_found", "details": "<reason>"}}
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
             return {
                 "status": 0,
-                "detail": result
+                "detail": {
+                    "error_type": "job_not_found",
+                    "details": f"No job with id {job_id}; it may have expired."
+                }
+            }
+
+        return {
+            "status": 1,
+            "detail": job
+        }
+
+    async def stats_api(self):
+        """
+        API endpoint reporting the load of the pipeline executor and the processor metrics.
+
+        In process mode each worker has its own processor and only the executor and job metrics are reported.
+
+        **Returns:**
+            dict: {"status": 1, "detail": {"executor": {"in_flight": ..., "queued": ..., ...}, "fetch": {...}, ...}}
+        """
+        detail = {
+            "startup": self.startup,
+            "executor": self.executor.stats(),
+            "jobs": self.jobs.stats()
+        }
+        if self.processor is not None:
+            detail.update(self.processor.stats())
+        return {
+            "status": 1,
+            "detail": detail
+        }
+
+    async def metrics_api(self):
+        """
+        API endpoint exposing the metrics in the Prometheus text exposition format.
+
+        Per-stage latency histograms, request and error counters by error_type, result cache
+        outcomes, and gauges of the readiness, the executor and job queue depths and the caches.
+
+        **Returns:**
+            Response: The metrics as text/plain in the Prometheus exposition format 0.0.4.
+        """
+        return Response(content=self.metrics_registry.render(), media_type=CONTENT_TYPE)
+
+    async def profiles_api(self, response: Response, x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint listing the saved profiles; requires the operator token.
+
+        **Args:**
+            response (Response): Response whose status code is set when the token is missing or invalid.
+            x_sticker_profile (str, optional): Operator token.
+
+        **Returns:**
+            dict: {"status": 1, "detail": {"profiles": [{"id": ..., "created_at": ..., "artifacts": {<file_name>: size, ...}}, ...]}} or {"status": 0, "detail": {"error_type": "profiling_disabled" | "forbidden", ...}}
+        """
+        error = self.operator_error(x_sticker_profile)
+        if error:
+            response.status_code = 403
+            return {
+                "status": 0,
+                "detail": error
             }
 
         return {
             "status": 1,
             "detail": {
-                "bg_removed_url": result["bg_removed_url"]
+                "profiles": self.profiler.list()
+            }
+        }
+
+    async def profile_artifact_api(self, file_name: str, response: Response,
+                                   x_sticker_profile: Optional[str] = Header(default=None)):
+        """
+        API endpoint downloading a profile artifact; requires the operator token.
+
+        **Args:**
+            file_name (str): Artifact file name as listed by GET /profiles/.
+            response (Response): Response whose status code is set on errors.
+            x_sticker_profile (str, optional): Operator token.
+
+        **Returns:**
+            FileResponse: The artifact, or {"status": 0, "detail": {"error_type": "profiling_disabled" | "forbidden" | "profile_not_found", ...}}
+        """
+        error = self.operator_error(x_sticker_profile)
+        if error:
+            response.status_code = 403
+            return {
+                "status": 0,
+                "detail": error
             }
+
+        path = self.profiler.path(file_name)
+        if path is None:
+            response.status_code = 404
+            return {
+                "status": 0,
+                "detail": {
+                    "error_type": "profile_not_found",
+                    "details": f"No profile artifact named {file_name}."
+                }
+            }
+
+        return FileResponse(path, filename=file_name)
+
+    async def healthz_api(self):
+        """
+        Liveness endpoint; answers as soon as the server runs, also while the models load.
+
+        **Returns:**
+            dict: {"status": 1, "detail": {"state": "loading" | "ready" | "failed"}}
+        """
+        return {
+            "status": 1,
+            "detail": {
+                "state": self.startup["state"]
+            }
+        }
+
+    async def readyz_api(self, response: Response):
+        """
+        Readiness endpoint; answers with HTTP 503 until the models are loaded and warmed up.
+
+        **Args:**
+            response (Response): Response whose status code is set while not ready.
+
+        **Returns:**
+            dict: {"status": 1, "detail": {"state": "ready", "time_to_ready_ms": ..., "phases": {...}}} or {"status": 0, "detail": {"state": "loading" | "failed", ...}}
+        """
+        if not self.ready.is_set():
+            response.status_code = 503
+            return {
+                "status": 0,
+                "detail": self.startup
+            }
+
+        return {
+            "status": 1,
+            "detail": self.startup
         }
 
 
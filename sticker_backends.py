@@ -0,0 +1,714 @@
+import ast
+import functools
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+import numpy as np
+import cv2
+from PIL import Image
+from sticker_acceleration import InferenceAccelerator
+from sticker_pool import PredictorPool
+
+# Output of the SAM image encoder for one image, with the sizes SamPredictor.set_image would record
+SamEmbedding = namedtuple("SamEmbedding", ["features", "original_size", "input_size"])
+
+# YOLO detections of one image, most confident first: boxes as [x1, y1, x2, y2], confidences and class ids
+Detections = namedtuple("Detections", ["xyxy", "confidence", "class_id"])
+
+# Side of the square SAM image encoder input and the normalization constants of SAM
+SAM_IMAGE_SIZE = 1024
+SAM_PIXEL_MEAN = np.array([123.675, 116.28, 103.53], dtype=np.float32)
+SAM_PIXEL_STD = np.array([58.395, 57.12, 57.375], dtype=np.float32)
+
+# Weight quantization modes of the SAM image encoder
+QUANTIZATION_MODES = ("int8",)
+
+# File names of the ONNX artifacts written by sticker_export.py
+ONNX_YOLO_FILE = "yolo.onnx"
+
+
+def onnx_sam_files(model_dir, sam_model_type, quantization=None):
+    """
+    Return the paths of the ONNX SAM image encoder and mask decoder of a backbone.
+
+    :param model_dir: Directory of the ONNX artifacts.
+    :type model_dir: str
+    :param sam_model_type: SAM backbone, e.g. ``vit_h``.
+    :type sam_model_type: str
+    :param quantization: Quantization mode of the encoder, None for float32.
+    :type quantization: str or None
+    :returns: Tuple of (encoder path, decoder path).
+    :rtype: tuple
+    """
+    suffix = f"_{quantization}" if quantization else ""
+    return (
+        os.path.join(model_dir, f"sam_{sam_model_type}_encoder{suffix}.onnx"),
+        os.path.join(model_dir, f"sam_{sam_model_type}_decoder.onnx"),
+    )
+
+
+def check_quantization(quantization):
+    """
+    Validate a quantization mode.
+
+    :param quantization: Mode from ``QUANTIZATION_MODES``, or None or an empty string for float32.
+    :type quantization: str or None
+    :returns: The mode, None for float32.
+    :rtype: str or None
+    """
+    if quantization and quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {list(QUANTIZATION_MODES)}")
+    return quantization or None
+
+
+def sam_preprocess_shape(height, width, long_side=SAM_IMAGE_SIZE):
+    """
+    Size of an image resized so its longest side is ``long_side``, as ``ResizeLongestSide`` computes it.
+
+    :rtype: tuple
+    """
+    scale = long_side / max(height, width)
+    return int(height * scale + 0.5), int(width * scale + 0.5)
+
+
+class InferenceBackend:
+    """
+    Interface of the engines running YOLO and the SAM image encoder and mask decoder.
+
+    :class:`StickerProcessor` only talks to the models through this interface, so the
+    engine can be swapped through configuration. Every backend records the latency of
+    its calls per operation.
+    """
+
+    name = None
+
+    def __init__(self):
+        """
+        Initialize the load timings and latency counters.
+        """
+        # SAM backbones the backend can run and YOLO class names by id, set by implementations
+        self.sam_model_types = []
+        self.class_names = {}
+        # CPU execution techniques of the torch backend, None for other backends
+        self.accelerator = None
+        # Weight quantization of the SAM image encoders, None for float32
+        self.quantization = None
+        self.load_timings = {}
+        self._latency_lock = threading.Lock()
+        self._latency = {}
+
+    @contextmanager
+    def _timed(self, operation, items=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            with self._latency_lock:
+                latency = self._latency.setdefault(operation, {"calls": 0, "items": 0, "total_ms": 0.0, "max_ms": 0.0})
+                latency["calls"] += 1
+                latency["items"] += items
+                latency["total_ms"] += elapsed_ms
+                latency["max_ms"] = max(latency["max_ms"], elapsed_ms)
+
+    @contextmanager
+    def _loading(self, phase):
+        start = time.perf_counter()
+        yield
+        self.load_timings[f"{phase}_ms"] = round((time.perf_counter() - start) * 1000.0, 2)
+
+    def detect(self, images, min_confidence=0.25, class_ids=None, max_det=300):
+        """
+        Run YOLO on a batch of images.
+
+        :param images: BGR images as HxWx3 uint8 arrays.
+        :type images: list
+        :param min_confidence: Minimum detection confidence.
+        :type min_confidence: float
+        :param class_ids: YOLO class ids to keep, None for all classes.
+        :type class_ids: list or None
+        :param max_det: Maximum number of detections per image.
+        :type max_det: int
+        :returns: One Detections per image, most confident first, in image coordinates.
+        :rtype: list[Detections]
+        """
+        raise NotImplementedError
+
+    def encode(self, images, sam_model_type, reference=False):
+        """
+        Run the SAM image encoder on a batch of images.
+
+        :param images: BGR images as HxWx3 uint8 arrays.
+        :type images: list
+        :param sam_model_type: SAM backbone to run.
+        :type sam_model_type: str
+        :param reference: Whether to run the default path of the backend, bypassing any acceleration.
+        :type reference: bool
+        :returns: One embedding per image.
+        :rtype: list[SamEmbedding]
+        """
+        raise NotImplementedError
+
+    def decode(self, embedding, bboxes, sam_model_type):
+        """
+        Run the SAM prompt encoder and mask decoder for boxes on one embedding.
+
+        :param embedding: SAM embedding of the image.
+        :type embedding: SamEmbedding
+        :param bboxes: Bounding boxes as [x1, y1, x2, y2] in image coordinates.
+        :type bboxes: list
+        :param sam_model_type: SAM backbone the embedding was computed with.
+        :type sam_model_type: str
+        :returns: One boolean mask per box, with the height and width of the image.
+        :rtype: list
+        """
+        raise NotImplementedError
+
+    def features_to_numpy(self, features):
+        """
+        Convert encoder features to a float32 array for the embedding cache.
+
+        :rtype: numpy.ndarray
+        """
+        return np.asarray(features)
+
+    def features_from_numpy(self, features, sam_model_type):
+        """
+        Convert cached features back into the form :meth:`decode` takes.
+
+        :param features: Cached features, possibly a read-only memory map.
+        :type features: numpy.ndarray
+        :param sam_model_type: SAM backbone the features belong to.
+        :type sam_model_type: str
+        """
+        return np.array(features)
+
+    def embedding_model_id(self, sam_model_type):
+        """
+        Return the model id under which the embeddings of a backbone are cached.
+
+        :param sam_model_type: SAM backbone computing the embedding.
+        :type sam_model_type: str
+        :rtype: str
+        """
+        model_id = f"{sam_model_type}+{self.name}"
+        return f"{model_id}+{self.quantization}" if self.quantization else model_id
+
+    def params(self):
+        """
+        Return the settings of the backend that affect the outputs, for use in cache keys.
+
+        :rtype: dict
+        """
+        params = {"backend": self.name}
+        if self.quantization:
+            params["quantization"] = self.quantization
+        return params
+
+    def stats(self):
+        """
+        Return the backend name and the latency of each operation.
+
+        :returns: Dictionary with the backend name and, per operation, calls, items, average and maximum latency in milliseconds.
+        :rtype: dict
+        """
+        with self._latency_lock:
+            return {
+                "name": self.name,
+                "latency": {
+                    operation: {
+                        "calls": latency["calls"],
+                        "items": latency["items"],
+                        "avg_ms": latency["total_ms"] / latency["calls"],
+                        "max_ms": latency["max_ms"],
+                    }
+                    for operation, latency in self._latency.items()
+                },
+                **self.params(),
+            }
+
+    @staticmethod
+    def create(name, **kwargs):
+        """
+        Build a backend from a configuration value.
+
+        :param name: ``torch`` or ``onnx``.
+        :type name: str
+        :returns: The backend with its models loaded.
+        :rtype: InferenceBackend
+        """
+        backends = {"torch": TorchBackend, "onnx": OnnxBackend}
+        if name not in backends:
+            raise ValueError(f"Unknown inference backend {name!r}, expected one of {list(backends)}")
+        return backends[name](**kwargs)
+
+
+class TorchBackend(InferenceBackend):
+    """
+    Eager PyTorch backend: ultralytics YOLO and segment_anything's SamPredictor.
+
+    :param yolo_model_path: Path to the YOLO model file.
+    :type yolo_model_path: str
+    :param sam_checkpoints: Checkpoint path of every SAM backbone to load, keyed by model type.
+    :type sam_checkpoints: dict
+    :param mmap_weights: Whether to memory-map the SAM checkpoints instead of copying them into process memory.
+    :type mmap_weights: bool
+    :param accelerator: CPU execution techniques, None for the stock eager path.
+    :type accelerator: InferenceAccelerator or None
+    :param quantization: Weight quantization of the SAM image encoders, ``int8`` or None for float32.
+    :type quantization: str or None
+    :param predictor_pool_size: SamPredictors per backbone, i.e. mask decodes of one backbone run at once.
+    :type predictor_pool_size: int
+    """
+
+    name = "torch"
+
+    def __init__(self, yolo_model_path, sam_checkpoints, mmap_weights=True, accelerator=None, quantization=None,
+                 predictor_pool_size=2):
+        """
+        Load YOLO and every SAM backbone.
+
+        :param yolo_model_path: Path to the YOLO model file.
+        :type yolo_model_path: str
+        :param sam_checkpoints: Checkpoint path of every SAM backbone to load, keyed by model type.
+        :type sam_checkpoints: dict
+        :param mmap_weights: Whether to memory-map the SAM checkpoints instead of copying them into process memory.
+        :type mmap_weights: bool
+        :param accelerator: CPU execution techniques, None for the stock eager path.
+        :type accelerator: InferenceAccelerator or None
+        :param quantization: Weight quantization of the SAM image encoders, ``int8`` or None for float32.
+        :type quantization: str or None
+        :param predictor_pool_size: SamPredictors per backbone, i.e. mask decodes of one backbone run at once.
+        :type predictor_pool_size: int
+        """
+        super().__init__()
+        # ultralytics and segment_anything pull in large dependency trees, so they are
+        # imported here rather than when this module is imported
+        from ultralytics import YOLO
+        from segment_anything import SamPredictor
+        from segment_anything.utils.transforms import ResizeLongestSide
+
+        # Inference mode, reduced precision, memory layout and compilation, applied as the models load
+        self.accelerator = accelerator if accelerator is not None else InferenceAccelerator()
+        self.quantization = check_quantization(quantization)
+        if self.quantization and self.accelerator.techniques & {"bf16", "compile"}:
+            raise ValueError("The bf16 and compile techniques do not apply to a quantized SAM image encoder")
+
+        with self._loading("yolo_load"):
+            self.model = self.accelerator.prepare_yolo(YOLO(yolo_model_path))
+        self.class_names = dict(self.model.names)
+
+        # SamPredictor keeps per-image state on the instance, so each backbone gets a pool of
+        # predictors over its one model; a decode checks one out for the duration of the call.
+        self.sams = {}
+        self.transforms = {}
+        self.predictor_pools = {}
+        for model_type, checkpoint_path in sam_checkpoints.items():
+            with self._loading(f"sam_{model_type}_load"):
+                if self.quantization:
+                    sam = self.load_quantized_sam(model_type, checkpoint_path, self.quantization)
+                else:
+                    sam = self.load_sam(model_type, checkpoint_path, mmap_weights)
+                sam = self.sams[model_type] = self.accelerator.prepare_sam(sam)
+            self.transforms[model_type] = ResizeLongestSide(sam.image_encoder.img_size)
+            self.predictor_pools[model_type] = PredictorPool(
+                functools.partial(SamPredictor, sam), predictor_pool_size, name=f"sam-{model_type}"
+            )
+        self.sam_model_types = list(self.sams)
+
+        # The YOLO predictor keeps per-image state on the instance, so concurrent callers
+        # must not interleave their calls.
+        self._yolo_lock = threading.Lock()
+
+    @staticmethod
+    def load_sam(sam_model_type, sam_checkpoint_path, mmap_weights=True):
+        """
+        Build a SAM model and load its checkpoint.
+
+        With ``mmap_weights`` the checkpoint is memory-mapped and the model parameters
+        point straight into the mapping. The weights then live in the OS page cache, which
+        every worker process that maps the same file shares, instead of in a private copy
+        per process. Inference never writes to the weights, so the pages stay shared.
+
+        :param sam_model_type: Type of the SAM model to build.
+        :type sam_model_type: str
+        :param sam_checkpoint_path: Path to the SAM model checkpoint file.
+        :type sam_checkpoint_path: str
+        :param mmap_weights: Whether to memory-map the checkpoint.
+        :type mmap_weights: bool
+        :returns: The SAM model in eval mode.
+        :rtype: segment_anything.modeling.Sam
+        """
+        import torch
+        from segment_anything import sam_model_registry
+
+        if not mmap_weights:
+            return sam_model_registry[sam_model_type](checkpoint=sam_checkpoint_path)
+
+        sam = sam_model_registry[sam_model_type](checkpoint=None)
+        try:
+            state_dict = torch.load(sam_checkpoint_path, map_location="cpu", mmap=True)
+        except RuntimeError as e:
+            # Checkpoints in the legacy (non-zip) format cannot be memory-mapped
+            print({"error_type": "Weights_Mmap_Error", "details": str(e)})
+            state_dict = torch.load(sam_checkpoint_path, map_location="cpu")
+        sam.load_state_dict(state_dict, assign=True)
+        return sam.eval()
+
+    @staticmethod
+    def quantized_checkpoint_path(sam_checkpoint_path, quantization):
+        """
+        Return the path of the quantized model built from a checkpoint, next to it.
+
+        :param sam_checkpoint_path: Path to the float32 SAM checkpoint.
+        :type sam_checkpoint_path: str
+        :param quantization: Quantization mode.
+        :type quantization: str
+        :rtype: str
+        """
+        return f"{os.path.splitext(sam_checkpoint_path)[0]}.{quantization}.pt"
+
+    @staticmethod
+    def quantize_sam(sam):
+        """
+        Quantize the linear layers of the SAM image encoder to int8, in place.
+
+        The ViT image encoder spends nearly all of its time and weights in the attention
+        and MLP linear layers. Dynamic quantization stores their weights as int8 and
+        quantizes the activations per call; the patch embedding, the neck, the prompt
+        encoder and the mask decoder stay float32.
+
+        :param sam: SAM model in eval mode.
+        :type sam: segment_anything.modeling.Sam
+        :returns: The same model.
+        :rtype: segment_anything.modeling.Sam
+        """
+        import torch
+
+        torch.ao.quantization.quantize_dynamic(sam.image_encoder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return sam
+
+    @classmethod
+    def load_quantized_sam(cls, sam_model_type, sam_checkpoint_path, quantization="int8"):
+        """
+        Load the quantized SAM model built from a checkpoint, building and saving it on first use.
+
+        The quantized model is saved whole, next to the checkpoint, so later startups load
+        the int8 weights directly without materializing the float32 encoder. The file is
+        a pickle: only load files this function wrote.
+
+        :param sam_model_type: Type of the SAM model.
+        :type sam_model_type: str
+        :param sam_checkpoint_path: Path to the float32 SAM checkpoint.
+        :type sam_checkpoint_path: str
+        :param quantization: Quantization mode.
+        :type quantization: str
+        :returns: The quantized SAM model in eval mode.
+        :rtype: segment_anything.modeling.Sam
+        """
+        import torch
+
+        path = cls.quantized_checkpoint_path(sam_checkpoint_path, quantization)
+        if os.path.isfile(path):
+            return torch.load(path, map_location="cpu", weights_only=False).eval()
+
+        sam = cls.quantize_sam(cls.load_sam(sam_model_type, sam_checkpoint_path))
+        # Worker processes may build it at the same time; each writes its own file and renames it
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(sam, temporary_path)
+        os.replace(temporary_path, path)
+        return sam
+
+    def detect(self, images, min_confidence=0.25, class_ids=None, max_det=300):
+        with self._timed("detect", len(images)):
+            with self._yolo_lock:
+                results = self.model.predict(
+                    images, save=False, verbose=False, conf=min_confidence, classes=class_ids, max_det=max_det
+                )
+        if len(results) != len(images):
+            raise Exception(f"Expected {len(images)} prediction results from the model, got {len(results)}")
+
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            order = boxes.conf.argsort(descending=True).tolist()
+            xyxy, confidences, classes = boxes.xyxy.tolist(), boxes.conf.tolist(), boxes.cls.tolist()
+            detections.append(Detections(
+                [xyxy[i] for i in order], [confidences[i] for i in order], [int(classes[i]) for i in order]
+            ))
+        return detections
+
+    def encode(self, images, sam_model_type, reference=False):
+        """
+        Run one batched SAM image encoder pass.
+
+        This does the work of ``SamPredictor.set_image`` for several images at once
+        without any predictor's per-image state.
+        """
+        import torch
+
+        sam = self.sams[sam_model_type]
+        transform = self.transforms[sam_model_type]
+        inputs = []
+        sizes = []
+        with self._timed(f"sam_{sam_model_type}_encode", len(images)):
+            for image in images:
+                # SAM expects RGB; flip the channels of the shared BGR array
+                input_image = transform.apply_image(np.ascontiguousarray(image[:, :, ::-1]))
+                input_image = torch.as_tensor(input_image, device=sam.device)
+                input_image = input_image.permute(2, 0, 1).contiguous()[None, :, :, :]
+                sizes.append((image.shape[:2], tuple(input_image.shape[-2:])))
+                inputs.append(sam.preprocess(input_image))
+
+            with self.accelerator.encoder_context(reference):
+                batch = self.accelerator.encoder_input(torch.cat(inputs, dim=0), reference)
+                # The mask decoder runs in float32 whatever the encoder precision
+                features = self.accelerator.image_encoder(sam, reference)(batch).float()
+
+        return [
+            SamEmbedding(features[i:i + 1], original_size, input_size)
+            for i, (original_size, input_size) in enumerate(sizes)
+        ]
+
+    def decode(self, embedding, bboxes, sam_model_type):
+        import torch
+
+        input_boxes = torch.as_tensor(bboxes, dtype=torch.float, device=self.sams[sam_model_type].device)
+        # Waiting for a free predictor is reported by the pool, not as decode latency
+        with self.predictor_pools[sam_model_type].checkout() as predictor:
+            with self._timed(f"sam_{sam_model_type}_decode", len(bboxes)):
+                predictor.features = embedding.features
+                predictor.original_size = embedding.original_size
+                predictor.input_size = embedding.input_size
+                predictor.is_image_set = True
+                try:
+                    transformed_boxes = predictor.transform.apply_boxes_torch(input_boxes, embedding.original_size)
+                    with self.accelerator.decoder_context():
+                        masks, _, _ = predictor.predict_torch(
+                            point_coords=None, point_labels=None, boxes=transformed_boxes, multimask_output=False
+                        )
+                finally:
+                    # An idle predictor must not keep the embedding alive
+                    predictor.reset_image()
+        return list(masks[:, 0].cpu().numpy())
+
+    def features_to_numpy(self, features):
+        return features.cpu().numpy()
+
+    def features_from_numpy(self, features, sam_model_type):
+        import torch
+
+        # np.array copies out of a memory-mapped disk entry into a writable buffer
+        return torch.from_numpy(np.array(features)).to(self.sams[sam_model_type].device)
+
+    def stats(self):
+        """
+        Return the backend stats, with the occupancy and wait time of each backbone's predictor pool.
+
+        :rtype: dict
+        """
+        stats = super().stats()
+        stats["predictor_pools"] = {model_type: pool.stats() for model_type, pool in self.predictor_pools.items()}
+        return stats
+
+    def embedding_model_id(self, sam_model_type):
+        model_id = self.accelerator.embedding_model_id(sam_model_type)
+        return f"{model_id}+{self.quantization}" if self.quantization else model_id
+
+    def params(self):
+        params = self.accelerator.params()
+        if self.quantization:
+            params["quantization"] = self.quantization
+        return params
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    ONNX Runtime backend running the artifacts written by ``sticker_export.py``.
+
+    YOLO runs on letterboxed images with non-maximum suppression in OpenCV; the SAM image
+    encoder and the prompt/mask decoder run as separate graphs. ONNX Runtime sessions can
+    be run from several threads at once, so no lock is taken around the models.
+
+    :param model_dir: Directory of the ONNX artifacts.
+    :type model_dir: str
+    :param sam_model_types: SAM backbones to load.
+    :type sam_model_types: list
+    :param intra_op_threads: Threads of each session, 0 for the ONNX Runtime default.
+    :type intra_op_threads: int
+    :param providers: ONNX Runtime execution providers, None for the CPU provider.
+    :type providers: list or None
+    :param nms_iou: IoU threshold of the YOLO non-maximum suppression.
+    :type nms_iou: float
+    :param quantization: Weight quantization of the SAM image encoders, ``int8`` or None for float32.
+    :type quantization: str or None
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir, sam_model_types, intra_op_threads=0, providers=None, nms_iou=0.7,
+                 quantization=None):
+        """
+        Open the YOLO session and the encoder and decoder sessions of every SAM backbone.
+
+        :param model_dir: Directory of the ONNX artifacts.
+        :type model_dir: str
+        :param sam_model_types: SAM backbones to load.
+        :type sam_model_types: list
+        :param intra_op_threads: Threads of each session, 0 for the ONNX Runtime default.
+        :type intra_op_threads: int
+        :param providers: ONNX Runtime execution providers, None for the CPU provider.
+        :type providers: list or None
+        :param nms_iou: IoU threshold of the YOLO non-maximum suppression.
+        :type nms_iou: float
+        :param quantization: Weight quantization of the SAM image encoders, ``int8`` or None for float32.
+        :type quantization: str or None
+        """
+        super().__init__()
+        import onnxruntime
+
+        self.quantization = check_quantization(quantization)
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        providers = providers or ["CPUExecutionProvider"]
+        self.nms_iou = nms_iou
+
+        def session(path):
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"{path} not found; build the ONNX artifacts with sticker_export.py")
+            return onnxruntime.InferenceSession(path, options, providers=providers)
+
+        with self._loading("yolo_load"):
+            self.yolo = session(os.path.join(model_dir, ONNX_YOLO_FILE))
+        # ultralytics stores the class names and input size in the model metadata
+        metadata = self.yolo.get_modelmeta().custom_metadata_map
+        self.class_names = {int(k): v for k, v in ast.literal_eval(metadata["names"]).items()}
+        imgsz = ast.literal_eval(metadata.get("imgsz", "[640, 640]"))
+        self.yolo_size = imgsz[0] if isinstance(imgsz, (list, tuple)) else imgsz
+
+        self.encoders = {}
+        self.decoders = {}
+        for model_type in sam_model_types:
+            encoder_path, decoder_path = onnx_sam_files(model_dir, model_type, self.quantization)
+            with self._loading(f"sam_{model_type}_load"):
+                self.encoders[model_type] = session(encoder_path)
+                self.decoders[model_type] = session(decoder_path)
+        self.sam_model_types = list(sam_model_types)
+        # Decoders exported with a fixed prompt batch decode one box per run
+        self._batched_decoders = {
+            model_type: not isinstance(decoder.get_inputs()[1].shape[0], int)
+            for model_type, decoder in self.decoders.items()
+        }
+
+    def _letterbox(self, image):
+        height, width = image.shape[:2]
+        size = self.yolo_size
+        scale = min(size / height, size / width)
+        new_height, new_width = round(height * scale), round(width * scale)
+        top, left = (size - new_height) // 2, (size - new_width) // 2
+        canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+        canvas[top:top + new_height, left:left + new_width] = cv2.resize(
+            image, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+        )
+        return canvas, scale, left, top
+
+    def detect(self, images, min_confidence=0.25, class_ids=None, max_det=300):
+        with self._timed("detect", len(images)):
+            letterboxed = [self._letterbox(image) for image in images]
+            # BGR HWC uint8 to RGB CHW float in [0, 1]
+            batch = np.stack([canvas[:, :, ::-1].transpose(2, 0, 1) for canvas, _, _, _ in letterboxed])
+            outputs = self.yolo.run(None, {self.yolo.get_inputs()[0].name: batch.astype(np.float32) / 255.0})[0]
+
+            detections = []
+            for image, prediction, (_, scale, left, top) in zip(images, outputs, letterboxed):
+                detections.append(self._postprocess(
+                    prediction.T, image.shape[:2], scale, left, top, min_confidence, class_ids, max_det
+                ))
+        return detections
+
+    def _postprocess(self, prediction, image_size, scale, left, top, min_confidence, class_ids, max_det):
+        # Rows of [cx, cy, w, h, score per class] in letterboxed pixels
+        scores = prediction[:, 4:]
+        classes = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), classes]
+        keep = confidences > min_confidence
+        if class_ids:
+            keep &= np.isin(classes, class_ids)
+        boxes, confidences, classes = prediction[keep, :4], confidences[keep], classes[keep]
+        if not len(boxes):
+            return Detections([], [], [])
+
+        xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+        indexes = cv2.dnn.NMSBoxesBatched(
+            xywh.tolist(), confidences.tolist(), classes.tolist(), min_confidence, self.nms_iou
+        )
+        indexes = sorted(np.asarray(indexes).reshape(-1).tolist(), key=lambda i: -confidences[i])[:max_det]
+
+        height, width = image_size
+        xyxy = []
+        for i in indexes:
+            x, y, w, h = xywh[i]
+            xyxy.append([
+                float(np.clip((x - left) / scale, 0, width)),
+                float(np.clip((y - top) / scale, 0, height)),
+                float(np.clip((x + w - left) / scale, 0, width)),
+                float(np.clip((y + h - top) / scale, 0, height)),
+            ])
+        return Detections(xyxy, [float(confidences[i]) for i in indexes], [int(classes[i]) for i in indexes])
+
+    @staticmethod
+    def _sam_input(image):
+        """
+        Resize, normalize and pad a BGR image like ``SamPredictor.set_image``.
+        """
+        height, width = image.shape[:2]
+        input_size = sam_preprocess_shape(height, width)
+        resized = Image.fromarray(np.ascontiguousarray(image[:, :, ::-1])).resize(
+            (input_size[1], input_size[0]), Image.BILINEAR
+        )
+        normalized = (np.asarray(resized, dtype=np.float32) - SAM_PIXEL_MEAN) / SAM_PIXEL_STD
+        padded = np.zeros((SAM_IMAGE_SIZE, SAM_IMAGE_SIZE, 3), dtype=np.float32)
+        padded[:input_size[0], :input_size[1]] = normalized
+        return padded.transpose(2, 0, 1), input_size
+
+    def encode(self, images, sam_model_type, reference=False):
+        encoder = self.encoders[sam_model_type]
+        with self._timed(f"sam_{sam_model_type}_encode", len(images)):
+            inputs = [self._sam_input(image) for image in images]
+            batch = np.stack([array for array, _ in inputs])
+            features = encoder.run(None, {encoder.get_inputs()[0].name: batch})[0]
+        return [
+            SamEmbedding(features[i:i + 1], image.shape[:2], input_size)
+            for i, (image, (_, input_size)) in enumerate(zip(images, inputs))
+        ]
+
+    def decode(self, embedding, bboxes, sam_model_type):
+        decoder = self.decoders[sam_model_type]
+        original_height, original_width = embedding.original_size
+        input_height, input_width = embedding.input_size
+        # Box corners in encoder input coordinates with the box labels 2 and 3
+        corners = np.asarray(bboxes, dtype=np.float32).reshape(-1, 2, 2)
+        corners = corners * np.array([input_width / original_width, input_height / original_height], dtype=np.float32)
+        labels = np.tile(np.array([[2, 3]], dtype=np.float32), (len(corners), 1))
+        feeds = {
+            "image_embeddings": np.ascontiguousarray(embedding.features, dtype=np.float32),
+            "mask_input": np.zeros((1, 1, 256, 256), dtype=np.float32),
+            "has_mask_input": np.zeros(1, dtype=np.float32),
+            "orig_im_size": np.array(embedding.original_size, dtype=np.float32),
+        }
+
+        with self._timed(f"sam_{sam_model_type}_decode", len(bboxes)):
+            if self._batched_decoders[sam_model_type]:
+                masks = decoder.run(["masks"], {**feeds, "point_coords": corners, "point_labels": labels})[0]
+            else:
+                masks = np.concatenate([
+                    decoder.run(["masks"], {
+                        **feeds, "point_coords": corners[i:i + 1], "point_labels": labels[i:i + 1]
+                    })[0]
+                    for i in range(len(corners))
+                ])
+        return list(masks[:, 0] > 0.0)
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Gather concurrent calls into batches and run them through a single batched function.
+
+    Items submitted from any thread are collected until either ``max_batch_size`` items
+    are waiting or the oldest item has waited ``max_wait_ms``. The batch is then passed to
+    ``batch_fn`` which must return one result per item, in order. A result that is an
+    exception instance is raised to the caller of that item only.
+
+    :param batch_fn: Callable taking a list of items and returning a list of results.
+    :type batch_fn: callable
+    :param max_batch_size: Maximum number of items run in one batch.
+    :type max_batch_size: int
+    :param max_wait_ms: Maximum time the first item of a batch waits for more items.
+    :type max_wait_ms: float
+    :param name: Name used for the background thread.
+    :type name: str
+    """
+
+    def __init__(self, batch_fn, max_batch_size=4, max_wait_ms=5.0, name="batcher"):
+        """
+        Initialize the batcher and start its background thread.
+
+        :param batch_fn: Callable taking a list of items and returning a list of results.
+        :type batch_fn: callable
+        :param max_batch_size: Maximum number of items run in one batch.
+        :type max_batch_size: int
+        :param max_wait_ms: Maximum time the first item of a batch waits for more items.
+        :type max_wait_ms: float
+        :param name: Name used for the background thread.
+        :type name: str
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._size_counts = {}
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch.
+
+        :param item: Item passed to ``batch_fn`` as part of a batch.
+        :returns: Future resolving to the result for this item.
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item):
+        """
+        Queue an item and wait for its result.
+
+        :param item: Item passed to ``batch_fn`` as part of a batch.
+        :returns: The result for this item.
+        """
+        return self.submit(item).result()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the deadline, still take whatever is already waiting.
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Put the shutdown sentinel back so the loop exits after this batch.
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            items = [entry[0] for entry in batch]
+            futures = [entry[1] for entry in batch]
+
+            started = time.perf_counter()
+            waits = [started - entry[2] for entry in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name} returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                results = [e] * len(items)
+            elapsed = time.perf_counter() - started
+
+            for future, result in zip(futures, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(items)
+                self._size_counts[len(items)] = self._size_counts.get(len(items), 0) + 1
+                self._wait_total += sum(waits)
+                self._wait_max = max(self._wait_max, max(waits))
+                self._run_total += elapsed
+
+    def stats(self):
+        """
+        Return batch size and wait time metrics.
+
+        :returns: Dictionary with batch counts, the batch size distribution and wait/run times in milliseconds.
+        :rtype: dict
+        """
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._size_counts.items())),
+                "avg_wait_ms": self._wait_total / self._items * 1000.0 if self._items else 0.0,
+                "max_wait_observed_ms": self._wait_max * 1000.0,
+                "avg_batch_run_ms": self._run_total / self._batches * 1000.0 if self._batches else 0.0,
+                "pending": self._queue.qsize(),
+            }
+
+    def close(self):
+        """
+        Stop the background thread once the queued items have been processed.
+        """
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,424 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of SAM image embeddings.
+
+    Embeddings are keyed by a hash of the decoded pixels and the SAM model type, so the
+    same image submitted to either endpoint or by a different client reuses the encoder
+    output. A memory tier holds the most recently used embeddings within a byte budget.
+    An optional disk tier keeps ``.npy`` files that are memory-mapped on load and survive
+    restarts.
+
+    :param max_bytes: Byte budget of the in-memory tier, 0 to disable it.
+    :type max_bytes: int
+    :param disk_dir: Directory of the on-disk tier, None to disable it.
+    :type disk_dir: str or None
+    :param disk_max_bytes: Byte budget of the on-disk tier.
+    :type disk_max_bytes: int
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None, disk_max_bytes=2 * 1024 * 1024 * 1024):
+        """
+        Initialize the cache and scan the on-disk tier, if any.
+
+        :param max_bytes: Byte budget of the in-memory tier, 0 to disable it.
+        :type max_bytes: int
+        :param disk_dir: Directory of the on-disk tier, None to disable it.
+        :type disk_dir: str or None
+        :param disk_max_bytes: Byte budget of the on-disk tier.
+        :type disk_max_bytes: int
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_evictions = 0
+        self._disk_bytes = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @staticmethod
+    def image_key(image, model_type):
+        """
+        Build the cache key of a decoded image.
+
+        :param image: Decoded image array.
+        :type image: numpy.ndarray
+        :param model_type: SAM model type the embedding is computed with.
+        :type model_type: str
+        :returns: Hex digest identifying the pixels, their layout and the model type.
+        :rtype: str
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{model_type}:{image.shape}:{image.dtype}:".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Look up an embedding.
+
+        :param key: Key built by :meth:`image_key`.
+        :type key: str
+        :returns: Tuple of (features, original_size, input_size), or None on a miss.
+        :rtype: tuple or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry
+
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._disk_hits += 1
+            self._store(key, entry)
+        return entry
+
+    def put(self, key, features, original_size, input_size):
+        """
+        Store an embedding in the memory tier and, if enabled, the disk tier.
+
+        :param key: Key built by :meth:`image_key`.
+        :type key: str
+        :param features: Image encoder output.
+        :type features: numpy.ndarray
+        :param original_size: Height and width of the original image.
+        :type original_size: tuple
+        :param input_size: Height and width of the resized encoder input.
+        :type input_size: tuple
+        """
+        entry = (features, tuple(original_size), tuple(input_size))
+        with self._lock:
+            self._store(key, entry)
+        if self.disk_dir:
+            try:
+                self._save_to_disk(key, entry)
+            except OSError as e:
+                print({"error_type": "Embedding_Cache_Error", "details": str(e)})
+
+    def _store(self, key, entry):
+        size = entry[0].nbytes
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[0].nbytes
+        self._entries[key] = entry
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[0].nbytes
+            self._evictions += 1
+
+    def _paths(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npy"), os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".npy"):
+                stat = os.stat(os.path.join(self.disk_dir, name))
+                files.append((name[:-4], stat.st_size, stat.st_mtime))
+        return files
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        array_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            features = np.load(array_path, mmap_mode="r")
+            # Refresh the modification time so disk eviction stays least-recently-used.
+            os.utime(array_path)
+        except (OSError, ValueError):
+            return None
+        return features, tuple(meta["original_size"]), tuple(meta["input_size"])
+
+    def _save_to_disk(self, key, entry):
+        array_path, meta_path = self._paths(key)
+        if os.path.exists(array_path):
+            return
+        features, original_size, input_size = entry
+
+        # Write the metadata first and the array last, each via an atomic rename,
+        # so a reader never sees an array without its metadata.
+        tmp_meta = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump({"original_size": original_size, "input_size": input_size}, f)
+        os.replace(tmp_meta, meta_path)
+
+        # Linking fails if the array exists, so when two threads store the same key
+        # only the one that created the file counts its bytes.
+        tmp_array = f"{array_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_array, "wb") as f:
+                np.save(f, np.ascontiguousarray(features))
+            size = os.path.getsize(tmp_array)
+            try:
+                os.link(tmp_array, array_path)
+            except FileExistsError:
+                return
+        finally:
+            os.remove(tmp_array)
+
+        with self._lock:
+            self._disk_bytes += size
+            over_budget = self._disk_bytes > self.disk_max_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        files = sorted(self._disk_files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for key, size, _ in files:
+            if total <= self.disk_max_bytes:
+                break
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            with self._lock:
+                self._disk_evictions += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        """
+        Return cache usage and hit counters.
+
+        :returns: Dictionary with entry and byte counts, hits, disk hits, misses and evictions.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "disk_enabled": bool(self.disk_dir),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+                "disk_evictions": self._disk_evictions,
+            }
+
+
+class ResultCache:
+    """
+    Cache of finished pipeline results with single-flight coalescing.
+
+    Results are keyed by the hash of the downloaded image content, the operation and
+    its processing parameters. Concurrent requests for a key that is being computed
+    wait for that computation instead of starting their own. Error results are shared
+    with the waiting requests but never cached.
+
+    :param max_entries: Maximum number of cached results, least recently used evicted first.
+    :type max_entries: int
+    :param ttl_seconds: Lifetime of a cached result in seconds, 0 to keep results until evicted.
+    :type ttl_seconds: float
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=0):
+        """
+        Initialize an empty result cache.
+
+        :param max_entries: Maximum number of cached results, least recently used evicted first.
+        :type max_entries: int
+        :param ttl_seconds: Lifetime of a cached result in seconds, 0 to keep results until evicted.
+        :type ttl_seconds: float
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(content, operation, params):
+        """
+        Build the cache key of a pipeline result.
+
+        :param content: Downloaded image bytes.
+        :type content: bytes
+        :param operation: Name of the pipeline, e.g. ``sticker``.
+        :type operation: str
+        :param params: Processing parameters that affect the output.
+        :type params: dict
+        :returns: Hex digest identifying the content, operation and parameters.
+        :rtype: str
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(content)
+        digest.update(f":{operation}:{sorted(params.items())}".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _cacheable(value):
+        return not (isinstance(value, dict) and "error_type" in value)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key):
+        """
+        Look up a cached result.
+
+        :param key: Key built by :meth:`make_key`.
+        :type key: str
+        :returns: The cached result, or None on a miss.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store a result unless it is an error dictionary.
+
+        :param key: Key built by :meth:`make_key`.
+        :type key: str
+        :param value: The result to cache.
+        """
+        if self._cacheable(value):
+            with self._lock:
+                self._store(key, value)
+
+    def claim(self, key):
+        """
+        Look up a key and, on a miss, register the caller as the one computing it.
+
+        A caller that gets ``miss`` must call :meth:`resolve` for the key, otherwise the
+        requests coalesced onto it wait forever.
+
+        :param key: Key built by :meth:`make_key`.
+        :type key: str
+        :returns: Tuple of (outcome, value): ``("hit", result)``, ``("coalesced", future)`` resolving to the result
+            computed by another caller, or ``("miss", None)``.
+        :rtype: tuple
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._hits += 1
+                return "hit", value
+            future = self._inflight.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return "coalesced", future
+            self._misses += 1
+            self._inflight[key] = Future()
+            return "miss", None
+
+    def resolve(self, key, value=None, error=None):
+        """
+        Publish the result of a claimed key to the requests waiting for it and cache it.
+
+        :param key: Key claimed with :meth:`claim`.
+        :type key: str
+        :param value: The computed result.
+        :param error: Exception raised by the computation instead of a result, never cached.
+        :type error: Exception or None
+        """
+        with self._lock:
+            if error is None and self._cacheable(value):
+                self._store(key, value)
+            future = self._inflight.pop(key)
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached result for a key, computing it at most once across concurrent callers.
+
+        :param key: Key built by :meth:`make_key`.
+        :type key: str
+        :param compute: Callable producing the result on a miss.
+        :type compute: callable
+        :returns: Tuple of (result, outcome) where outcome is ``hit``, ``miss`` or ``coalesced``.
+        :rtype: tuple
+        """
+        outcome, value = self.claim(key)
+        if outcome == "hit":
+            return value, outcome
+        if outcome == "coalesced":
+            return value.result(), outcome
+
+        try:
+            value = compute()
+        except Exception as e:
+            self.resolve(key, error=e)
+            raise
+        self.resolve(key, value)
+        return value, outcome
+
+    def stats(self):
+        """
+        Return cache usage and hit, miss and coalesced counters.
+
+        :returns: Dictionary with entry count, hits, misses, coalesced requests, evictions and in-flight computations.
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "in_flight": len(self._inflight),
+            }
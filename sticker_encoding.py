@@ -0,0 +1,117 @@
+import io
+import numpy as np
+from PIL import Image
+
+# Content type and file extension of each output format
+FORMATS = {
+    "png": ("image/png", "png"),
+    "webp": ("image/webp", "webp"),
+}
+
+
+class StickerEncoder:
+    """
+    Encode RGBA outputs in memory.
+
+    Stickers are mostly transparent, so the output can optionally be cropped to the
+    bounding box of its visible pixels plus some padding before encoding. The format is
+    PNG with a configurable zlib level, or WebP, lossless or lossy. Both keep the alpha
+    channel.
+
+    :param output_format: ``png`` or ``webp``.
+    :type output_format: str
+    :param png_compress_level: zlib level of PNG outputs, 0 (fastest) to 9 (smallest).
+    :type png_compress_level: int
+    :param webp_lossless: Whether WebP outputs are lossless.
+    :type webp_lossless: bool
+    :param webp_quality: Quality of lossy WebP outputs, or compression effort of lossless ones, 0 to 100.
+    :type webp_quality: int
+    :param crop: Whether to crop outputs to the bounding box of their non-transparent pixels.
+    :type crop: bool
+    :param crop_padding: Transparent pixels kept around the cropped object.
+    :type crop_padding: int
+    """
+
+    def __init__(self, output_format="png", png_compress_level=6, webp_lossless=True, webp_quality=90,
+                 crop=False, crop_padding=16):
+        """
+        Initialize the encoder.
+
+        :param output_format: ``png`` or ``webp``.
+        :type output_format: str
+        :param png_compress_level: zlib level of PNG outputs, 0 (fastest) to 9 (smallest).
+        :type png_compress_level: int
+        :param webp_lossless: Whether WebP outputs are lossless.
+        :type webp_lossless: bool
+        :param webp_quality: Quality of lossy WebP outputs, or compression effort of lossless ones, 0 to 100.
+        :type webp_quality: int
+        :param crop: Whether to crop outputs to the bounding box of their non-transparent pixels.
+        :type crop: bool
+        :param crop_padding: Transparent pixels kept around the cropped object.
+        :type crop_padding: int
+        """
+        if output_format not in FORMATS:
+            raise ValueError(f"output_format must be one of {list(FORMATS)}")
+        self.output_format = output_format
+        self.png_compress_level = png_compress_level
+        self.webp_lossless = webp_lossless
+        self.webp_quality = webp_quality
+        self.crop = crop
+        self.crop_padding = crop_padding
+        self.content_type, self.extension = FORMATS[output_format]
+
+    def params(self):
+        """
+        Return the settings that affect the encoded bytes, for use in cache keys.
+
+        :rtype: dict
+        """
+        params = {"output_format": self.output_format, "crop": self.crop}
+        if self.crop:
+            params["crop_padding"] = self.crop_padding
+        if self.output_format == "png":
+            params["png_compress_level"] = self.png_compress_level
+        else:
+            params["webp_lossless"] = self.webp_lossless
+            params["webp_quality"] = self.webp_quality
+        return params
+
+    def crop_to_alpha(self, rgba_image):
+        """
+        Crop an RGBA image to the bounding box of its non-transparent pixels plus padding.
+
+        :param rgba_image: RGBA image as an HxWx4 uint8 array.
+        :type rgba_image: numpy.ndarray
+        :returns: The cropped view, or the image unchanged if it is fully transparent.
+        :rtype: numpy.ndarray
+        """
+        alpha = rgba_image[:, :, 3]
+        rows = np.flatnonzero(alpha.any(axis=1))
+        if not rows.size:
+            return rgba_image
+        cols = np.flatnonzero(alpha.any(axis=0))
+        height, width = alpha.shape
+        pad = self.crop_padding
+        return rgba_image[
+            max(rows[0] - pad, 0):min(rows[-1] + 1 + pad, height),
+            max(cols[0] - pad, 0):min(cols[-1] + 1 + pad, width)
+        ]
+
+    def encode(self, rgba_image):
+        """
+        Encode an RGBA image.
+
+        :param rgba_image: RGBA image as an HxWx4 uint8 array.
+        :type rgba_image: numpy.ndarray
+        :returns: The encoded image.
+        :rtype: bytes
+        """
+        if self.crop:
+            rgba_image = self.crop_to_alpha(rgba_image)
+        image = Image.fromarray(np.ascontiguousarray(rgba_image), "RGBA")
+        buffer = io.BytesIO()
+        if self.output_format == "png":
+            image.save(buffer, format="PNG", compress_level=self.png_compress_level)
+        else:
+            image.save(buffer, format="WEBP", lossless=self.webp_lossless, quality=self.webp_quality)
+        return buffer.getvalue()
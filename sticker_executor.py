@@ -0,0 +1,199 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ExecutorBusyError(Exception):
+    """
+    Raised when the executor queue is full and a new call cannot be accepted.
+    """
+
+
+class StickerExecutor:
+    """
+    A bounded executor that runs the blocking sticker pipeline off the event loop.
+
+    Calls are handed to a fixed pool of worker threads. Calls that cannot start
+    immediately wait in a queue whose length is capped by ``max_queue``; once the
+    queue is full new calls are rejected with :class:`ExecutorBusyError` instead of
+    piling up behind a slow model inference.
+
+    In ``process`` mode the workers are separate processes started with ``spawn`` and
+    set up by ``initializer``; calls and their arguments must then be picklable. Since
+    a worker process cannot report back when it picks up a call, the in-flight and
+    queued counts are derived from the number of unfinished calls in that mode.
+
+    :param max_workers: Number of workers running pipeline calls.
+    :type max_workers: int
+    :param max_queue: Maximum number of calls waiting for a worker, 0 for unbounded.
+    :type max_queue: int
+    :param mode: ``thread`` or ``process``.
+    :type mode: str
+    :param initializer: Callable run once in every worker process, ``process`` mode only.
+    :type initializer: callable or None
+    :param initargs: Arguments of ``initializer``.
+    :type initargs: tuple
+    """
+
+    MODES = ("thread", "process")
+
+    def __init__(self, max_workers=2, max_queue=32, mode="thread", initializer=None, initargs=()):
+        """
+        Initialize the executor and its worker pool.
+
+        :param max_workers: Number of workers running pipeline calls.
+        :type max_workers: int
+        :param max_queue: Maximum number of calls waiting for a worker, 0 for unbounded.
+        :type max_queue: int
+        :param mode: ``thread`` or ``process``.
+        :type mode: str
+        :param initializer: Callable run once in every worker process, ``process`` mode only.
+        :type initializer: callable or None
+        :param initargs: Arguments of ``initializer``.
+        :type initargs: tuple
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = mode
+        if mode == "process":
+            # spawn rather than fork: torch thread pools and CUDA do not survive a fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+                initargs=initargs
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sticker-worker")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        # Calls submitted to worker processes and not finished yet, process mode only
+        self._unfinished = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Submit a blocking call to the worker pool.
+
+        :param func: Callable to run on a worker.
+        :type func: callable
+        :returns: Future resolving to the return value of ``func``.
+        :rtype: concurrent.futures.Future
+        :raises ExecutorBusyError: If the wait queue is full.
+        """
+        if self.mode == "process":
+            return self._submit_to_process(func, args, kwargs)
+
+        with self._lock:
+            if self.max_queue and self._queued >= self.max_queue:
+                self._rejected += 1
+                raise ExecutorBusyError(
+                    f"Executor queue is full ({self._queued} calls waiting, {self._in_flight} running)"
+                )
+            self._queued += 1
+
+        future = self._pool.submit(self._call, func, args, kwargs)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _submit_to_process(self, func, args, kwargs):
+        with self._lock:
+            if self.max_queue and self._unfinished >= self.max_queue + self.max_workers:
+                self._rejected += 1
+                raise ExecutorBusyError(
+                    f"Executor queue is full ({self._unfinished - self.max_workers} calls waiting, "
+                    f"{self.max_workers} running)"
+                )
+            self._unfinished += 1
+
+        future = self._pool.submit(func, *args, **kwargs)
+        future.add_done_callback(self._on_process_done)
+        return future
+
+    def _on_process_done(self, future):
+        with self._lock:
+            self._unfinished -= 1
+            if not future.cancelled():
+                self._completed += 1
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking call on the worker pool without blocking the event loop.
+
+        :param func: Callable to run on a worker.
+        :type func: callable
+        :returns: The return value of ``func``.
+        :raises ExecutorBusyError: If the wait queue is full.
+        """
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def _call(self, func, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+    def _on_done(self, future):
+        # A call cancelled before a worker picked it up never reaches _call.
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def stats(self):
+        """
+        Return a snapshot of the executor load.
+
+        :returns: Dictionary with worker, in-flight, queued, completed and rejected counts.
+        :rtype: dict
+        """
+        with self._lock:
+            if self.mode == "process":
+                in_flight = min(self._unfinished, self.max_workers)
+                queued = self._unfinished - in_flight
+            else:
+                in_flight, queued = self._in_flight, self._queued
+            return {
+                "mode": self.mode,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": in_flight,
+                "queued": queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def worker_pids(self):
+        """
+        Return the process ids of the live worker processes.
+
+        :returns: Sorted process ids, empty in ``thread`` mode.
+        :rtype: list
+        """
+        if self.mode != "process":
+            return []
+        processes = self._pool._processes or {}
+        return sorted(pid for pid, process in list(processes.items()) if process.is_alive())
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting calls and release the workers.
+
+        :param wait: Whether to wait for running calls to finish.
+        :type wait: bool
+        """
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,192 @@
+"""
+Export YOLO and the SAM image encoder and mask decoder to ONNX for the onnx inference backend.
+
+Writes ``yolo.onnx`` and, per backbone, ``sam_<model_type>_encoder.onnx`` and
+``sam_<model_type>_decoder.onnx`` to the output directory; point ``STICKER_ONNX_DIR`` at it
+and set ``STICKER_BACKEND=onnx``. The graphs take a dynamic batch of images (YOLO, SAM
+encoder) and of box prompts (SAM decoder).
+
+With ``--quantize int8`` the int8 SAM image encoders are built as well: the torch model
+next to each checkpoint (``<checkpoint>.int8.pt``) and ``sam_<model_type>_encoder_int8.onnx``.
+Set ``STICKER_SAM_QUANTIZATION=int8`` to serve them.
+
+Usage:
+    python sticker_export.py [--yolo yolov8n.pt] [--sam-checkpoints vit_h=sam_vit_h_4b8939.pth] [--output-dir onnx]
+        [--opset 17] [--quantize int8]
+"""
+import argparse
+import os
+import shutil
+import time
+from sticker_backends import ONNX_YOLO_FILE, QUANTIZATION_MODES, SAM_IMAGE_SIZE, TorchBackend, onnx_sam_files
+
+
+def export_yolo(yolo_model_path, output_dir, imgsz=640, opset=17):
+    """
+    Export YOLO with ultralytics, keeping the class names in the model metadata.
+
+    :param yolo_model_path: Path to the YOLO model file.
+    :type yolo_model_path: str
+    :param output_dir: Directory the artifact is written to.
+    :type output_dir: str
+    :param imgsz: Side of the square input.
+    :type imgsz: int
+    :param opset: ONNX opset version.
+    :type opset: int
+    :returns: Path of the exported model.
+    :rtype: str
+    """
+    from ultralytics import YOLO
+
+    exported = YOLO(yolo_model_path).export(format="onnx", dynamic=True, imgsz=imgsz, opset=opset, simplify=True)
+    path = os.path.join(output_dir, ONNX_YOLO_FILE)
+    shutil.move(exported, path)
+    return path
+
+
+def export_sam_encoder(sam, path, opset=17):
+    """
+    Export the SAM image encoder with a dynamic batch axis.
+
+    :param sam: SAM model in eval mode.
+    :type sam: segment_anything.modeling.Sam
+    :param path: Path of the artifact.
+    :type path: str
+    :param opset: ONNX opset version.
+    :type opset: int
+    :returns: The path.
+    :rtype: str
+    """
+    import torch
+
+    images = torch.randn(1, 3, SAM_IMAGE_SIZE, SAM_IMAGE_SIZE, dtype=torch.float)
+    with torch.no_grad():
+        torch.onnx.export(
+            sam.image_encoder, images, path,
+            input_names=["images"],
+            output_names=["image_embeddings"],
+            dynamic_axes={"images": {0: "batch"}, "image_embeddings": {0: "batch"}},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    return path
+
+
+def export_sam_decoder(sam, path, opset=17):
+    """
+    Export the SAM prompt encoder and mask decoder with a dynamic number of box prompts.
+
+    The graph returns the single mask SamPredictor returns with ``multimask_output=False``,
+    upscaled to ``orig_im_size``, as logits.
+
+    :param sam: SAM model in eval mode.
+    :type sam: segment_anything.modeling.Sam
+    :param path: Path of the artifact.
+    :type path: str
+    :param opset: ONNX opset version.
+    :type opset: int
+    :returns: The path.
+    :rtype: str
+    """
+    import torch
+    from segment_anything.utils.onnx import SamOnnxModel
+
+    class SingleMaskOnnxModel(SamOnnxModel):
+        # SamOnnxModel keeps the best of the multimask outputs; box prompts use the first mask token
+        def select_masks(self, masks, iou_preds, num_points):
+            return masks[:, :1], iou_preds[:, :1]
+
+    model = SingleMaskOnnxModel(sam, return_single_mask=True)
+    embed_dim = sam.prompt_encoder.embed_dim
+    embed_size = sam.prompt_encoder.image_embedding_size
+    mask_input_size = [4 * x for x in embed_size]
+    inputs = {
+        "image_embeddings": torch.randn(1, embed_dim, *embed_size, dtype=torch.float),
+        "point_coords": torch.randint(0, SAM_IMAGE_SIZE, (1, 2, 2), dtype=torch.float),
+        "point_labels": torch.tensor([[2, 3]], dtype=torch.float),
+        "mask_input": torch.zeros(1, 1, *mask_input_size, dtype=torch.float),
+        "has_mask_input": torch.zeros(1, dtype=torch.float),
+        "orig_im_size": torch.tensor([768, 1024], dtype=torch.float),
+    }
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(inputs.values()), path,
+            input_names=list(inputs),
+            output_names=["masks", "iou_predictions", "low_res_masks"],
+            dynamic_axes={
+                "point_coords": {0: "prompts", 1: "points"},
+                "point_labels": {0: "prompts", 1: "points"},
+                "masks": {0: "prompts", 2: "height", 3: "width"},
+                "iou_predictions": {0: "prompts"},
+                "low_res_masks": {0: "prompts"},
+            },
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+    return path
+
+
+def quantize_onnx_encoder(encoder_path, path):
+    """
+    Quantize the weights of the matrix multiplications of an exported SAM image encoder to int8.
+
+    Like :meth:`TorchBackend.quantize_sam`, only the attention and MLP projections are
+    quantized; activations are quantized per call by ONNX Runtime.
+
+    :param encoder_path: Path of the float32 encoder.
+    :type encoder_path: str
+    :param path: Path of the quantized encoder.
+    :type path: str
+    :returns: The path.
+    :rtype: str
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # The float32 ViT-H encoder keeps its weights as external data (above the 2 GB protobuf limit);
+    # the int8 encoder fits in a single file
+    quantize_dynamic(
+        encoder_path, path, op_types_to_quantize=["MatMul"], weight_type=QuantType.QInt8,
+        use_external_data_format=False
+    )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yolo", default="yolov8n.pt")
+    parser.add_argument("--sam-checkpoints", default="vit_h=sam_vit_h_4b8939.pth",
+                        help="comma-separated model_type=checkpoint pairs, as in SAM_CHECKPOINTS")
+    parser.add_argument("--output-dir", default="onnx")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--skip-yolo", action="store_true")
+    parser.add_argument("--quantize", choices=QUANTIZATION_MODES, help="also build the quantized SAM image encoders")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    if not args.skip_yolo:
+        start = time.perf_counter()
+        path = export_yolo(args.yolo, args.output_dir, opset=args.opset)
+        print(f"{path} written in {time.perf_counter() - start:.1f}s")
+
+    sam_checkpoints = dict(entry.split("=", 1) for entry in args.sam_checkpoints.split(",") if entry)
+    for model_type, checkpoint_path in sam_checkpoints.items():
+        sam = TorchBackend.load_sam(model_type, checkpoint_path, mmap_weights=False)
+        for export, path in zip((export_sam_encoder, export_sam_decoder), onnx_sam_files(args.output_dir, model_type)):
+            start = time.perf_counter()
+            export(sam, path, args.opset)
+            print(f"{path} written in {time.perf_counter() - start:.1f}s")
+        if args.quantize:
+            start = time.perf_counter()
+            TorchBackend.load_quantized_sam(model_type, checkpoint_path, args.quantize)
+            path = TorchBackend.quantized_checkpoint_path(checkpoint_path, args.quantize)
+            print(f"{path} written in {time.perf_counter() - start:.1f}s")
+            start = time.perf_counter()
+            path = quantize_onnx_encoder(
+                onnx_sam_files(args.output_dir, model_type)[0],
+                onnx_sam_files(args.output_dir, model_type, args.quantize)[0]
+            )
+            print(f"{path} written in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Content types accepted besides image/*; object stores often serve images as generic binary
+DEFAULT_ALLOWED_CONTENT_TYPES = ("image/", "application/octet-stream", "binary/octet-stream")
+
+
+class ImageFetcher:
+    """
+    Fetch images over a shared, keep-alive connection pool.
+
+    The URL is validated by the GET itself: the status code, content type and size are
+    checked while the body is streamed, so no separate HEAD request is needed. The body
+    is read in chunks and the download is aborted as soon as it exceeds ``max_bytes``.
+
+    :param max_bytes: Maximum size of a downloaded image in bytes.
+    :type max_bytes: int
+    :param timeout: Connect and read timeout in seconds.
+    :type timeout: float
+    :param pool_size: Maximum number of pooled connections per host.
+    :type pool_size: int
+    :param allowed_content_types: Accepted content type prefixes; a missing content type is accepted.
+    :type allowed_content_types: tuple
+    """
+
+    def __init__(self, max_bytes=20 * 1024 * 1024, timeout=5.0, pool_size=20,
+                 allowed_content_types=DEFAULT_ALLOWED_CONTENT_TYPES):
+        """
+        Initialize the fetcher and its connection pool.
+
+        :param max_bytes: Maximum size of a downloaded image in bytes.
+        :type max_bytes: int
+        :param timeout: Connect and read timeout in seconds.
+        :type timeout: float
+        :param pool_size: Maximum number of pooled connections per host.
+        :type pool_size: int
+        :param allowed_content_types: Accepted content type prefixes; a missing content type is accepted.
+        :type allowed_content_types: tuple
+        """
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.allowed_content_types = tuple(allowed_content_types)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self._fetches = 0
+        self._failures = 0
+        self._bytes = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @staticmethod
+    def _invalid_url(reason):
+        return {
+            "error_type": "invalid_url",
+            "details": f"The provided image URL is not reachable or invalid. {reason}"
+        }
+
+    def fetch(self, image_url):
+        """
+        Download an image into memory.
+
+        :param image_url: URL of the image to be downloaded.
+        :type image_url: str
+        :returns: The downloaded bytes or a dictionary with error details.
+        :rtype: bytes or dict
+        """
+        start = time.perf_counter()
+        result = self._fetch(image_url)
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._fetches += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            if isinstance(result, dict):
+                self._failures += 1
+            else:
+                self._bytes += len(result)
+        return result
+
+    def _fetch(self, image_url):
+        try:
+            with self.session.get(image_url, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    return self._invalid_url(f"HTTP Status Code: {response.status_code}")
+
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                if content_type and not content_type.startswith(self.allowed_content_types):
+                    return {
+                        "error_type": "invalid_content_type",
+                        "details": f"The provided URL does not point to an image (Content-Type: {content_type})."
+                    }
+
+                content_length = response.headers.get("Content-Length")
+                if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                    return self._too_large()
+
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    body.extend(chunk)
+                    if len(body) > self.max_bytes:
+                        return self._too_large()
+                return bytes(body)
+        except requests.exceptions.RequestException as e:
+            return self._invalid_url(str(e))
+        except Exception as e:
+            return {"error_type": "Download_Error", "details": str(e)}
+
+    def _too_large(self):
+        return {
+            "error_type": "image_too_large",
+            "details": f"The image exceeds the maximum allowed size of {self.max_bytes} bytes."
+        }
+
+    def fetch_many(self, image_urls, max_concurrency=8):
+        """
+        Download several images concurrently over the shared pool.
+
+        :param image_urls: URLs of the images to be downloaded.
+        :type image_urls: list
+        :param max_concurrency: Maximum number of downloads running at once.
+        :type max_concurrency: int
+        :returns: One result per URL, in order, each the bytes or an error dictionary.
+        :rtype: list
+        """
+        if not image_urls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(image_urls))) as pool:
+            return list(pool.map(self.fetch, image_urls))
+
+    def stats(self):
+        """
+        Return fetch counters and latency.
+
+        :returns: Dictionary with fetch and failure counts, bytes fetched and latency in milliseconds.
+        :rtype: dict
+        """
+        with self._stats_lock:
+            return {
+                "fetches": self._fetches,
+                "failures": self._failures,
+                "bytes": self._bytes,
+                "avg_latency_ms": self._latency_total / self._fetches * 1000.0 if self._fetches else 0.0,
+                "max_latency_ms": self._latency_max * 1000.0,
+                "max_bytes": self.max_bytes,
+                "pool_size": self.pool_size,
+            }
+
+    def close(self):
+        """
+        Close the pooled connections.
+        """
+        self.session.close()
@@ -151,7 +151,10 @@
 
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 import requests
 from urllib.parse import urlparse, unquote
@@ -160,6 +163,11 @@ import re
 # Load environment variables from .env file
 load_dotenv()
 
+# One long-lived S3 client and upload pool shared by every request; boto3 clients are thread-safe
+_s3_client = None
+_s3_client_lock = threading.Lock()
+_upload_pool = None
+
 class StickerManager:
     @staticmethod
     def get_timestamp():
@@ -172,6 +180,57 @@ class StickerManager:
         from datetime import datetime
         return datetime.now().strftime('%Y%m%d_%H%M%S')
 
+    @staticmethod
+    def get_s3_client():
+        """
+        Return the shared S3 client, creating it on first use.
+
+        Credentials and the region are resolved once. ``AWS_S3_ENDPOINT_URL`` points the
+        client at an S3-compatible stand-in such as MinIO or moto for local testing, and
+        ``S3_MAX_POOL_CONNECTIONS`` sizes its HTTP connection pool.
+
+        :returns: The shared boto3 S3 client.
+        :rtype: botocore.client.S3
+        """
+        global _s3_client
+        if _s3_client is None:
+            with _s3_client_lock:
+                if _s3_client is None:
+                    # A dedicated session: the default boto3 session is not thread-safe
+                    session = boto3.session.Session(
+                        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+                        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+                        region_name=os.getenv('AWS_REGION')
+                    )
+                    _s3_client = session.client(
+                        's3',
+                        endpoint_url=os.getenv('AWS_S3_ENDPOINT_URL') or None,
+                        config=Config(
+                            max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32')),
+                            retries={'max_attempts': 3, 'mode': 'standard'},
+                            tcp_keepalive=True
+                        )
+                    )
+        return _s3_client
+
+    @staticmethod
+    def _get_upload_pool():
+        """
+        Return the shared thread pool running concurrent uploads, creating it on first use.
+
+        :returns: The upload thread pool, sized by ``S3_UPLOAD_CONCURRENCY``.
+        :rtype: concurrent.futures.ThreadPoolExecutor
+        """
+        global _upload_pool
+        if _upload_pool is None:
+            with _s3_client_lock:
+                if _upload_pool is None:
+                    _upload_pool = ThreadPoolExecutor(
+                        max_workers=int(os.getenv('S3_UPLOAD_CONCURRENCY', '8')),
+                        thread_name_prefix="s3-upload"
+                    )
+        return _upload_pool
+
     @staticmethod
     def download_image(image_url, download_folder):
         """
@@ -234,12 +293,7 @@ class StickerManager:
         :raises FileNotFoundError: If the file does not exist.
         """
         try:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_REGION')
-            )
+            s3_client = StickerManager.get_s3_client()
 
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File {file_path} does not exist")
@@ -253,6 +307,58 @@ class StickerManager:
         except Exception as e:
             return {"error_type": "S3_Upload_Error", "details": str(e)}
 
+    @staticmethod
+    def upload_bytes_to_s3(data, s3_bucket, s3_key, content_type='image/png'):
+        """
+        Upload in-memory bytes to an S3 bucket in a single PUT, without a temporary file.
+
+        :param data: Encoded file content to upload.
+        :type data: bytes
+        :param s3_bucket: Name of the S3 bucket.
+        :type s3_bucket: str
+        :param s3_key: Key (path) for the file in the S3 bucket.
+        :type s3_key: str
+        :param content_type: MIME type of the file, defaults to 'image/png'.
+        :type content_type: str, optional
+        :returns: None or a dictionary with error details.
+        :rtype: None or dict
+        """
+        try:
+            s3_client = StickerManager.get_s3_client()
+
+            s3_client.put_object(
+                Body=data,
+                Bucket=s3_bucket,
+                Key=s3_key,
+                ContentType=content_type,
+                ACL='public-read'
+            )
+        except Exception as e:
+            return {"error_type": "S3_Upload_Error", "details": str(e)}
+
+    @staticmethod
+    def upload_many_to_s3(uploads, s3_bucket):
+        """
+        Upload several in-memory files to an S3 bucket concurrently.
+
+        :param uploads: Tuples of (data, s3_key, content_type) to upload.
+        :type uploads: list
+        :param s3_bucket: Name of the S3 bucket.
+        :type s3_bucket: str
+        :returns: One result per upload, in order, each None or a dictionary with error details.
+        :rtype: list
+        """
+        if len(uploads) == 1:
+            data, s3_key, content_type = uploads[0]
+            return [StickerManager.upload_bytes_to_s3(data, s3_bucket, s3_key, content_type)]
+
+        pool = StickerManager._get_upload_pool()
+        futures = [
+            pool.submit(StickerManager.upload_bytes_to_s3, data, s3_bucket, s3_key, content_type)
+            for data, s3_key, content_type in uploads
+        ]
+        return [future.result() for future in futures]
+
     @staticmethod
     def generate_presigned_url(s3_bucket, s3_key):
         """
@@ -266,12 +372,7 @@ class StickerManager:
         :rtype: str or dict
         """
         try:
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-                aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-                region_name=os.getenv('AWS_REGION')
-            )
+            s3_client = StickerManager.get_s3_client()
             response = s3_client.generate_presigned_url('get_object',
                                                         Params={'Bucket': s3_bucket, 'Key': s3_key})
             return response
@@ -0,0 +1,233 @@
+import importlib
+import queue
+import threading
+import time
+import uuid
+import requests
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the job queue is at capacity and a new job cannot be accepted.
+    """
+
+
+class JobQueue:
+    """
+    Interface of a submit-and-poll job queue.
+
+    A job queue accepts jobs, runs them through a handler and keeps their state for
+    polling. Implementations are constructed with the handler and the keyword arguments
+    of :class:`InProcessJobQueue`, so they can be swapped through configuration.
+    """
+
+    def submit(self, operation, payload, callback_url=None):
+        """
+        Queue a job.
+
+        :param operation: Name of the pipeline to run.
+        :type operation: str
+        :param payload: Arguments of the pipeline.
+        :type payload: dict
+        :param callback_url: URL notified with the job record when the job completes.
+        :type callback_url: str or None
+        :returns: The job id.
+        :rtype: str
+        :raises QueueFullError: If the queue is at capacity.
+        """
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """
+        Return the record of a job.
+
+        :param job_id: Id returned by :meth:`submit`.
+        :type job_id: str
+        :returns: The job record, or None if the job is unknown or expired.
+        :rtype: dict or None
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """
+        Return queue depth and job counters.
+
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def shutdown(self):
+        """
+        Stop processing jobs.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def load(spec, handler, **kwargs):
+        """
+        Build a job queue from a configuration value.
+
+        :param spec: ``inprocess`` or the dotted path ``package.module:ClassName`` of a JobQueue implementation.
+        :type spec: str
+        :param handler: Callable taking (operation, payload) and returning the job result.
+        :type handler: callable
+        :returns: The job queue.
+        :rtype: JobQueue
+        """
+        if spec in ("", "inprocess"):
+            return InProcessJobQueue(handler, **kwargs)
+        module_name, _, class_name = spec.partition(":")
+        queue_class = getattr(importlib.import_module(module_name), class_name)
+        return queue_class(handler, **kwargs)
+
+
+class InProcessJobQueue(JobQueue):
+    """
+    Job queue running jobs on worker threads of the current process.
+
+    Pending jobs are held in a bounded queue; once ``max_pending`` jobs are waiting new
+    submissions are rejected. Finished job records are kept for ``result_ttl`` seconds.
+
+    :param handler: Callable taking (operation, payload) and returning the job result.
+    :type handler: callable
+    :param max_pending: Maximum number of jobs waiting to run.
+    :type max_pending: int
+    :param workers: Number of worker threads running jobs.
+    :type workers: int
+    :param result_ttl: Seconds a finished job record is kept for polling.
+    :type result_ttl: float
+    :param webhook_timeout: Timeout of the completion callback request in seconds.
+    :type webhook_timeout: float
+    """
+
+    def __init__(self, handler, max_pending=100, workers=1, result_ttl=3600, webhook_timeout=5.0):
+        """
+        Initialize the queue and start its worker threads.
+
+        :param handler: Callable taking (operation, payload) and returning the job result.
+        :type handler: callable
+        :param max_pending: Maximum number of jobs waiting to run.
+        :type max_pending: int
+        :param workers: Number of worker threads running jobs.
+        :type workers: int
+        :param result_ttl: Seconds a finished job record is kept for polling.
+        :type result_ttl: float
+        :param webhook_timeout: Timeout of the completion callback request in seconds.
+        :type webhook_timeout: float
+        """
+        self.handler = handler
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.webhook_timeout = webhook_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._counts = {"submitted": 0, "rejected": 0, "finished": 0, "failed": 0, "callbacks_failed": 0}
+        self._session = requests.Session()
+        self._stopped = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"sticker-job-{n}", daemon=True)
+            for n in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, operation, payload, callback_url=None):
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "operation": operation,
+            "state": "queued",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+        }
+        self._expire()
+        with self._lock:
+            self._jobs[job_id] = job
+        try:
+            self._queue.put_nowait((job_id, payload, callback_url))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+                self._counts["rejected"] += 1
+            raise QueueFullError(f"Job queue is full ({self.max_pending} jobs waiting)")
+        with self._lock:
+            self._counts["submitted"] += 1
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] is not None and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _work(self):
+        while not self._stopped.is_set():
+            entry = self._queue.get()
+            if entry is None:
+                return
+            job_id, payload, callback_url = entry
+            with self._lock:
+                job = self._jobs[job_id]
+                job["state"] = "running"
+                job["started_at"] = time.time()
+                operation = job["operation"]
+
+            try:
+                result = self.handler(operation, payload)
+            except Exception as e:
+                result = {"error_type": "JobError", "details": str(e)}
+            failed = isinstance(result, dict) and "error_type" in result
+
+            with self._lock:
+                job["result"] = result
+                job["state"] = "failed" if failed else "finished"
+                job["finished_at"] = time.time()
+                self._counts["failed" if failed else "finished"] += 1
+                record = dict(job)
+
+            if callback_url:
+                self._notify(callback_url, record)
+
+    def _notify(self, callback_url, record):
+        try:
+            response = self._session.post(callback_url, json=record, timeout=self.webhook_timeout)
+            response.raise_for_status()
+        except Exception as e:
+            with self._lock:
+                self._counts["callbacks_failed"] += 1
+            print({"error_type": "Webhook_Error", "details": f"{callback_url}: {e}"})
+
+    def stats(self):
+        with self._lock:
+            states = {}
+            for job in self._jobs.values():
+                states[job["state"]] = states.get(job["state"], 0) + 1
+            return {
+                "pending": self._queue.qsize(),
+                "max_pending": self.max_pending,
+                "workers": len(self._workers),
+                "states": states,
+                **self._counts,
+            }
+
+    def shutdown(self):
+        self._stopped.set()
+        # Wake idle workers; busy ones see the stop flag after their current job
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        self._session.close()
@@ -0,0 +1,265 @@
+import bisect
+import threading
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """
+    Base of the labelled metrics; one series is kept per combination of label values.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        """
+        Render the metric in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count.
+    """
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [("_total", tuple(zip(self.labelnames, key)), value) for key, value in series]
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down, e.g. a queue depth.
+    """
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    def _samples(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        return [("", tuple(zip(self.labelnames, key)), value) for key, value in series]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values over cumulative buckets.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, list(entry["counts"]), entry["sum"]) for key, entry in self._series.items())
+        samples = []
+        for key, counts, total in series:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                samples.append(("_bucket", labels + (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together on a Prometheus-compatible endpoint.
+
+    Collectors registered with :meth:`add_collector` run before every render, so gauges
+    mirroring the state of other components (queue depths, cache sizes) are read at
+    scrape time rather than updated on every change.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self._metrics = []
+        self._collectors = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """
+        Create and register a counter.
+
+        :rtype: Counter
+        """
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        """
+        Create and register a gauge.
+
+        :rtype: Gauge
+        """
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        Create and register a histogram.
+
+        :rtype: Histogram
+        """
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """
+        Register a callable run before every render.
+
+        :param collector: Callable without arguments, typically setting gauges.
+        :type collector: callable
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        """
+        Run the collectors and render every metric in the Prometheus text exposition format.
+
+        :rtype: str
+        """
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print({"error_type": "Metrics_Collector_Error", "details": str(e)})
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+def server_timing(timings):
+    """
+    Format stage timings as a ``Server-Timing`` header value.
+
+    :param timings: Stage durations in milliseconds keyed ``<stage>_ms``.
+    :type timings: dict
+    :returns: Header value such as ``fetch;dur=12.5, detect;dur=30.1``.
+    :rtype: str
+    """
+    return ", ".join(
+        f"{stage[:-3]};dur={value}" for stage, value in timings.items() if stage.endswith("_ms")
+    )
+
+
+class PipelineMetrics:
+    """
+    Metrics of the sticker pipelines: request and error counters, cache outcomes and
+    per-stage latency histograms, fed from the results the processor returns.
+
+    The results carry their stage timings, so the metrics are recorded in the API
+    process in both the thread and the process worker mode.
+
+    :param registry: Registry the metrics are registered in.
+    :type registry: MetricsRegistry
+    """
+
+    def __init__(self, registry):
+        """
+        Create the pipeline metrics in the given registry.
+
+        :param registry: Registry the metrics are registered in.
+        :type registry: MetricsRegistry
+        """
+        self.registry = registry
+        self.requests = registry.counter(
+            "sticker_requests", "Pipeline requests by endpoint and outcome.", ("endpoint", "status")
+        )
+        self.errors = registry.counter(
+            "sticker_errors", "Failed pipeline requests by endpoint and error type.", ("endpoint", "error_type")
+        )
+        self.cache = registry.counter(
+            "sticker_result_cache", "Result cache outcome of successful requests.", ("endpoint", "outcome")
+        )
+        self.stages = registry.histogram(
+            "sticker_stage_duration_seconds", "Duration of each pipeline stage.", ("endpoint", "stage")
+        )
+
+    def observe(self, endpoint, result):
+        """
+        Record the outcome and the stage timings of a pipeline result.
+
+        :param endpoint: Name of the pipeline, e.g. ``generate_sticker``.
+        :type endpoint: str
+        :param result: Result returned by the processor, or an error dictionary.
+        :type result: dict
+        """
+        if "error_type" in result:
+            self.requests.inc(endpoint=endpoint, status="error")
+            self.errors.inc(endpoint=endpoint, error_type=result["error_type"])
+            return
+
+        self.requests.inc(endpoint=endpoint, status="ok")
+        if "cache" in result:
+            self.cache.inc(endpoint=endpoint, outcome=result["cache"])
+        for stage, value in result.get("timings", {}).items():
+            if stage.endswith("_ms"):
+                self.stages.observe(value / 1000.0, endpoint=endpoint, stage=stage[:-3])
@@ -0,0 +1,101 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PredictorPool:
+    """
+    Pool of interchangeable predictor objects with checkout/return semantics.
+
+    A predictor that keeps per-image state on the instance, like ``SamPredictor``, cannot
+    be shared by concurrent callers. The pool holds several of them built over the same
+    read-only model, so as many callers as there are predictors run at once; further
+    callers wait for one to be returned. The most recently returned predictor is handed
+    out first, keeping its buffers warm.
+
+    :param factory: Callable without arguments building one predictor.
+    :type factory: callable
+    :param size: Number of predictors.
+    :type size: int
+    :param name: Name reported in the stats.
+    :type name: str
+    """
+
+    def __init__(self, factory, size=2, name="pool"):
+        """
+        Build the predictors.
+
+        :param factory: Callable without arguments building one predictor.
+        :type factory: callable
+        :param size: Number of predictors.
+        :type size: int
+        :param name: Name reported in the stats.
+        :type name: str
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self.name = name
+        self._free = queue.LifoQueue()
+        for _ in range(size):
+            self._free.put(factory())
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._contended = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Take a predictor for the duration of the block and return it afterwards.
+
+        :param timeout: Longest time to wait for a free predictor in seconds, None to wait indefinitely.
+        :type timeout: float or None
+        :raises TimeoutError: If no predictor was returned within ``timeout``.
+        """
+        start = time.perf_counter()
+        try:
+            predictor = self._free.get_nowait()
+            contended = False
+        except queue.Empty:
+            contended = True
+            try:
+                predictor = self._free.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No {self.name} predictor free within {timeout}s") from None
+        wait = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._contended += contended
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        try:
+            yield predictor
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._free.put(predictor)
+
+    def stats(self):
+        """
+        Return the occupancy and wait-time metrics of the pool.
+
+        :returns: Dictionary with the pool size, predictors in use, checkouts, checkouts that had to wait,
+            and the average and maximum wait in milliseconds.
+        :rtype: dict
+        """
+        with self._stats_lock:
+            return {
+                "size": self.size,
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "contended": self._contended,
+                "avg_wait_ms": self._wait_total / self._checkouts * 1000.0 if self._checkouts else 0.0,
+                "max_wait_ms": self._wait_max * 1000.0,
+            }
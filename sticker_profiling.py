@@ -0,0 +1,170 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+# Only one capture runs at a time per process: cProfile and the torch profiler are process-wide
+_capture_lock = threading.Lock()
+
+# File names of artifacts, as produced by ProfileCapture
+ARTIFACT_NAME = re.compile(r"^[\w-]+\.(prof|txt|torch\.json|torch\.txt)$")
+
+
+class ProfileCapture:
+    """
+    Capture Python and torch operator profiles of single pipeline calls as files.
+
+    Nothing is hooked unless :meth:`run` is called, so requests that are not profiled
+    run at full speed. Each capture writes:
+
+    - ``<id>.prof``: the cProfile statistics, for ``snakeviz`` or ``pstats``
+    - ``<id>.txt``: the functions with the highest cumulative time
+    - ``<id>.torch.json``: the torch profiler trace, for ``chrome://tracing`` or Perfetto
+    - ``<id>.torch.txt``: the torch operators with the highest self CPU time
+
+    cProfile sees the calling thread only; the torch profiler also records the operators
+    run by the batching threads. Only one capture runs at a time per process; a call made
+    while another capture runs is executed without profiling.
+
+    :param directory: Directory the artifacts are written to.
+    :type directory: str
+    :param torch_profiler: Whether to record torch operators as well.
+    :type torch_profiler: bool
+    :param max_artifacts: Number of captures kept; the oldest are deleted first.
+    :type max_artifacts: int
+    :param top: Number of rows of the text summaries.
+    :type top: int
+    """
+
+    def __init__(self, directory="profiles", torch_profiler=True, max_artifacts=50, top=40):
+        """
+        Initialize the capture settings.
+
+        :param directory: Directory the artifacts are written to.
+        :type directory: str
+        :param torch_profiler: Whether to record torch operators as well.
+        :type torch_profiler: bool
+        :param max_artifacts: Number of captures kept; the oldest are deleted first.
+        :type max_artifacts: int
+        :param top: Number of rows of the text summaries.
+        :type top: int
+        """
+        self.directory = directory
+        self.torch_profiler = torch_profiler
+        self.max_artifacts = max_artifacts
+        self.top = top
+
+    def run(self, name, func, *args):
+        """
+        Call a function under the profilers and save the artifacts.
+
+        :param name: Label included in the capture id, e.g. the processor method.
+        :type name: str
+        :param func: Function to profile.
+        :type func: callable
+        :returns: The return value of the function; a dictionary result gets a ``profile`` entry with the capture id
+            and its artifact files, or ``{"skipped": "busy"}`` if another capture was running.
+        """
+        if not _capture_lock.acquire(blocking=False):
+            result = func(*args)
+            if isinstance(result, dict):
+                result["profile"] = {"skipped": "busy"}
+            return result
+
+        try:
+            capture_id = f"{time.strftime('%Y%m%d-%H%M%S')}_{name}_{uuid.uuid4().hex[:8]}"
+            torch_profile = self._start_torch()
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                result = func(*args)
+            finally:
+                profile.disable()
+                elapsed_ms = (time.perf_counter() - start) * 1000.0
+                if torch_profile is not None:
+                    torch_profile.__exit__(None, None, None)
+            artifacts = self._save(capture_id, profile, torch_profile)
+        finally:
+            _capture_lock.release()
+
+        self._prune()
+        if isinstance(result, dict):
+            result["profile"] = {"id": capture_id, "artifacts": artifacts, "profiled_ms": round(elapsed_ms, 2)}
+        return result
+
+    def _start_torch(self):
+        if not self.torch_profiler:
+            return None
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        torch_profile = profile(activities=activities, record_shapes=True)
+        torch_profile.__enter__()
+        return torch_profile
+
+    def _save(self, capture_id, profile, torch_profile):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, capture_id)
+        artifacts = [f"{capture_id}.prof", f"{capture_id}.txt"]
+        profile.dump_stats(f"{base}.prof")
+        summary = io.StringIO()
+        pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(self.top)
+        with open(f"{base}.txt", "w") as f:
+            f.write(summary.getvalue())
+
+        if torch_profile is not None:
+            torch_profile.export_chrome_trace(f"{base}.torch.json")
+            with open(f"{base}.torch.txt", "w") as f:
+                f.write(torch_profile.key_averages().table(sort_by="self_cpu_time_total", row_limit=self.top))
+            artifacts += [f"{capture_id}.torch.json", f"{capture_id}.torch.txt"]
+        return artifacts
+
+    def list(self):
+        """
+        List the saved captures, newest first.
+
+        :returns: One entry per capture with its id, creation time and artifact files with their sizes.
+        :rtype: list
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        captures = {}
+        for file_name in os.listdir(self.directory):
+            if not ARTIFACT_NAME.match(file_name):
+                continue
+            capture_id = file_name.split(".", 1)[0]
+            path = os.path.join(self.directory, file_name)
+            capture = captures.setdefault(capture_id, {"id": capture_id, "created_at": 0.0, "artifacts": {}})
+            capture["created_at"] = max(capture["created_at"], os.path.getmtime(path))
+            capture["artifacts"][file_name] = os.path.getsize(path)
+        return sorted(captures.values(), key=lambda capture: capture["created_at"], reverse=True)
+
+    def path(self, file_name):
+        """
+        Return the path of an artifact file.
+
+        :param file_name: Artifact file name as listed by :meth:`list`.
+        :type file_name: str
+        :returns: The path, or None if the name is not a saved artifact.
+        :rtype: str or None
+        """
+        if not ARTIFACT_NAME.match(file_name):
+            return None
+        path = os.path.join(self.directory, file_name)
+        return path if os.path.isfile(path) else None
+
+    def _prune(self):
+        for capture in self.list()[self.max_artifacts:]:
+            for file_name in capture["artifacts"]:
+                try:
+                    os.remove(os.path.join(self.directory, file_name))
+                except OSError:
+                    pass
@@ -0,0 +1,165 @@
+import os
+import time
+from sticker_cache import EmbeddingCache, ResultCache
+from sticker_fetcher import ImageFetcher
+from sticker_encoding import StickerEncoder
+from sticker_profiling import ProfileCapture
+from sticker_acceleration import InferenceAccelerator
+
+
+def build_backend(name, **kwargs):
+    """
+    Build the inference backend named in the settings, see :meth:`InferenceBackend.create`.
+
+    The backends module pulls in OpenCV and the model runtimes, so it is imported only in the worker.
+    """
+    from sticker_backends import InferenceBackend
+
+    return InferenceBackend.create(name, **kwargs)
+
+# Processor components that are passed as plain settings and built inside the worker,
+# since their locks and connection pools cannot be sent to another process
+COMPONENTS = {
+    "embedding_cache": EmbeddingCache,
+    "fetcher": ImageFetcher,
+    "result_cache": ResultCache,
+    "encoder": StickerEncoder,
+    "accelerator": InferenceAccelerator,
+    "backend": build_backend,
+}
+
+# The processor of the current worker process and its startup phases, set by init_worker
+_processor = None
+_startup = {}
+
+
+def build_processor(settings):
+    """
+    Build a StickerProcessor from plain settings.
+
+    :param settings: Keyword arguments of StickerProcessor; the ``embedding_cache``, ``fetcher``,
+        ``result_cache``, ``encoder``, ``accelerator`` and ``backend`` entries hold the keyword arguments of those
+        components.
+    :type settings: dict
+    :returns: The processor with its models loaded.
+    :rtype: StickerProcessor
+    """
+    from sticker import StickerProcessor
+
+    kwargs = dict(settings)
+    for name, component in COMPONENTS.items():
+        if kwargs.get(name) is not None:
+            kwargs[name] = component(**kwargs[name])
+    return StickerProcessor(**kwargs)
+
+
+def configure_torch_threads(threads):
+    """
+    Limit the intra-op thread pool of torch in the current process.
+
+    :param threads: Number of threads, 0 to keep the torch default.
+    :type threads: int
+    """
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def default_torch_threads(workers):
+    """
+    Split the available cores evenly across worker processes.
+
+    :param workers: Number of worker processes.
+    :type workers: int
+    :returns: Number of torch threads per worker, at least 1.
+    :rtype: int
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    return max(1, cores // workers)
+
+
+def load_processor(settings, warmup=True):
+    """
+    Import the pipeline, load its models and warm them up, timing each phase.
+
+    With acceleration techniques enabled, the accelerated masks are then checked against
+    the default path (see :meth:`StickerProcessor.verify_acceleration`).
+
+    The heavy imports (torch, ultralytics, segment_anything) happen here rather than at
+    import time of the API module, so the server can accept connections while loading.
+
+    :param settings: Processor settings, see :func:`build_processor`.
+    :type settings: dict
+    :param warmup: Whether to run a warmup inference on a synthetic image.
+    :type warmup: bool
+    :returns: Tuple of (processor, phases) where phases maps each phase to its duration in milliseconds.
+    :rtype: tuple
+    """
+    phases = {}
+    start = time.perf_counter()
+    from sticker import stage_timer
+    phases["import_ms"] = (time.perf_counter() - start) * 1000.0
+
+    processor = build_processor(settings)
+    phases.update(processor.load_timings)
+    if warmup:
+        phases.update(processor.warmup())
+    if processor.accelerator is not None and processor.accelerator.techniques:
+        with stage_timer(phases, "acceleration_check"):
+            processor.verify_acceleration()
+        phases["acceleration"] = processor.acceleration_check
+    phases["total_ms"] = (time.perf_counter() - start) * 1000.0
+    return processor, phases
+
+
+def init_worker(settings, torch_threads, warmup=True):
+    """
+    Set up a worker process: size its torch thread pool, then load and warm up its processor.
+
+    The SAM checkpoint is memory-mapped (see :meth:`TorchBackend.load_sam`), so all
+    workers share one copy of the weights in the page cache.
+
+    :param settings: Processor settings, see :func:`build_processor`.
+    :type settings: dict
+    :param torch_threads: Number of torch threads of this worker, 0 to keep the torch default.
+    :type torch_threads: int
+    :param warmup: Whether to run a warmup inference on a synthetic image.
+    :type warmup: bool
+    """
+    global _processor, _startup
+    configure_torch_threads(torch_threads)
+    _processor, _startup = load_processor(settings, warmup)
+
+
+def worker_startup():
+    """
+    Return the startup phases of the current worker process.
+
+    :returns: Dictionary with the process id and the duration of each startup phase in milliseconds.
+    :rtype: dict
+    """
+    return {"pid": os.getpid(), **_startup}
+
+
+def call_processor(method, *args):
+    """
+    Call a method of the processor of the current worker process.
+
+    :param method: Name of the StickerProcessor method, e.g. ``generate_sticker``.
+    :type method: str
+    :returns: The return value of the method.
+    """
+    return getattr(_processor, method)(*args)
+
+
+def profile_processor(capture, method, *args):
+    """
+    Call a method of the processor of the current worker process under the profilers.
+
+    :param capture: Keyword arguments of :class:`ProfileCapture`.
+    :type capture: dict
+    :param method: Name of the StickerProcessor method, e.g. ``generate_sticker``.
+    :type method: str
+    :returns: The return value of the method, with the capture details under ``profile``.
+    """
+    return ProfileCapture(**capture).run(method, getattr(_processor, method), *args)